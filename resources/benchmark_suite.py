@@ -0,0 +1,442 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import metadata
+
+# Offline performance benchmark for the caption (blip/bridge.py), summarization
+# (python/flan_bridge.py) and health-scoring (hardware-monitor/health_scoring.py)
+# paths.
+#
+# Nothing is downloaded: tiny randomly initialized BLIP and T5 models (same
+# architectures, a few hidden units) are exported to ONNX the way
+# setup_models.py exports the real ones, with tokenizers built locally, and run
+# on synthetic photos, documents and SMART tables. The numbers therefore track
+# the cost of the code paths (preprocessing, session setup, decode loops,
+# batching, threading), not the quality or absolute speed of the real models.
+#
+# Each suite runs in its own child process so cold start and peak RSS belong to
+# that suite alone. Reported per suite:
+#   cold_start   seconds to import the bridge, load the models and produce the first result
+#   runs         for every batch size x concurrency: items/s, p50/p99 latency of the
+#                call that produced each item, and ms per item
+#   peak_rss_mb  peak resident memory of the suite process
+# Results are printed and optionally written as JSON (--output) for comparison
+# between releases.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BLIP_DIR = os.path.join(BASE_DIR, "blip")
+PYTHON_DIR = os.path.join(BASE_DIR, "python")
+HW_MONITOR_DIR = os.path.join(BASE_DIR, "hardware-monitor")
+sys.path.insert(0, HW_MONITOR_DIR)
+sys.path.insert(0, PYTHON_DIR)
+sys.path.insert(0, BLIP_DIR)
+
+SUITES = ("blip", "flan", "health")
+BATCH_SIZES = {"blip": [1, 4, 8], "flan": [1, 4, 8], "health": [1, 16, 256]}
+# Items per configuration (images, summary chunks, disks)
+ITEMS = {"blip": 16, "flan": 16, "health": 1024}
+# Up to CONCURRENCY_LIMIT in src/server/services/captionQueue.js
+CONCURRENCY = [1, 2, 3]
+BENCH_VERSION = 1
+PACKAGES = ("onnxruntime", "numpy", "transformers", "optimum", "torch", "tokenizers", "Pillow")
+
+# Tiny model configurations. BLIP keeps the real vocabulary size (the export
+# traces with its BOS and a sample token id) and image size (bridge.py
+# preprocesses to 384x384).
+BLIP_CONFIG = {
+    "vision_config": {
+        "hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2, "num_attention_heads": 2,
+        "image_size": 384, "patch_size": 32,
+    },
+    "text_config": {
+        "vocab_size": 30524, "hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2,
+        "num_attention_heads": 2, "max_position_embeddings": 64, "encoder_hidden_size": 32,
+    },
+    "projection_dim": 32,
+}
+BLIP_BOS_TOKEN_ID = 30522
+T5_CONFIG = {
+    "d_model": 32, "d_kv": 8, "d_ff": 64, "num_layers": 2, "num_decoder_layers": 2, "num_heads": 4,
+    "pad_token_id": 0, "eos_token_id": 1, "decoder_start_token_id": 0,
+}
+HEALTH_FEATURES = 14
+IMAGE_SIZE = (1280, 960)
+DOCUMENT_CHARS = 2000
+
+def log(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def default_work_dir():
+    return os.path.join(tempfile.gettempdir(), "nas-ai-bench")
+
+def suite_dir(work_dir, suite):
+    return os.path.join(work_dir, suite)
+
+def blip_files(work_dir):
+    directory = suite_dir(work_dir, "blip")
+    return {
+        "vision": os.path.join(directory, "vision_model.onnx"),
+        "text": os.path.join(directory, "text_decoder_model.onnx"),
+        "init": os.path.join(directory, "text_decoder_init.onnx"),
+        "past": os.path.join(directory, "text_decoder_with_past.onnx"),
+    }
+
+def image_paths(work_dir):
+    directory = os.path.join(work_dir, "images")
+    return [os.path.join(directory, n) for n in sorted(os.listdir(directory))]
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def peak_rss_mb():
+    # Linux: the high-water mark of this process image (ru_maxrss would also count
+    # the parent's memory, it survives fork + exec)
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows: psutil reports the peak working set
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+    # Bytes on macOS
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20, 1)
+
+# --- Building the tiny models (parent process) ---
+
+def build_blip(work_dir):
+    import torch
+    import export_blip_onnx
+    from transformers import BertTokenizerFast, BlipConfig, BlipForConditionalGeneration, BlipImageProcessor, BlipProcessor
+
+    directory = suite_dir(work_dir, "blip")
+    torch.manual_seed(0)
+    model = BlipForConditionalGeneration(BlipConfig(**BLIP_CONFIG)).eval()
+    pixel_values = torch.randn(1, 3, 384, 384)
+    files = blip_files(work_dir)
+    export_blip_onnx.export_blip_base(model, pixel_values, files["vision"], files["text"])
+    export_blip_onnx.export_blip_cached_decoder(model, pixel_values, files["init"], files["past"])
+
+    # BERT-style vocabulary with the real special token ids; [DEC] is BLIP's BOS
+    vocab_size = BLIP_CONFIG["text_config"]["vocab_size"]
+    special = {0: "[PAD]", 100: "[UNK]", 101: "[CLS]", 102: "[SEP]", 103: "[MASK]", BLIP_BOS_TOKEN_ID: "[DEC]"}
+    vocab_path = os.path.join(directory, "vocab.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        f.writelines(special.get(i, f"w{i}") + "\n" for i in range(vocab_size))
+    tokenizer = BertTokenizerFast(vocab_path, bos_token="[DEC]")
+    BlipProcessor(BlipImageProcessor(), tokenizer).save_pretrained(directory)
+
+def build_flan(work_dir):
+    import torch
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from tokenizers import Tokenizer, decoders, models, normalizers, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast, T5Config, T5ForConditionalGeneration
+    import bench_summarize
+    import flan_bridge
+
+    directory = suite_dir(work_dir, "flan")
+    # Word-level vocabulary over the synthetic documents, with T5's special token ids
+    tokenizer = Tokenizer(models.WordLevel(unk_token="<unk>"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Sequence([pre_tokenizers.Metaspace(), pre_tokenizers.Punctuation()])
+    tokenizer.decoder = decoders.Metaspace()
+    corpus = [bench_summarize.synthetic_document(DOCUMENT_CHARS, seed) for seed in range(4)] + [flan_bridge.PROMPT_PREFIX]
+    tokenizer.train_from_iterator(corpus, trainers.WordLevelTrainer(special_tokens=["<pad>", "</s>", "<unk>"]))
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>")
+
+    torch.manual_seed(0)
+    pt_dir = os.path.join(work_dir, "flan_pt")
+    T5ForConditionalGeneration(T5Config(vocab_size=len(fast), **T5_CONFIG)).save_pretrained(pt_dir)
+    model = ORTModelForSeq2SeqLM.from_pretrained(pt_dir, export=True)
+    model.save_pretrained(directory)
+    fast.save_pretrained(directory)
+    shutil.rmtree(pt_dir, ignore_errors=True)
+
+def build_health(work_dir):
+    import torch
+    from export_model import Autoencoder
+
+    torch.manual_seed(0)
+    model = Autoencoder(HEALTH_FEATURES).eval()
+    torch.onnx.export(
+        model,
+        torch.rand(1, HEALTH_FEATURES),
+        os.path.join(suite_dir(work_dir, "health"), "health_model.onnx"),
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": {0: "batch_size"}, "output": {0: "batch_size"}},
+        opset_version=12
+    )
+
+def build_images(work_dir, count):
+    import verify_preprocess
+    directory = os.path.join(work_dir, "images")
+    os.makedirs(directory, exist_ok=True)
+    for seed in range(count):
+        verify_preprocess.synthetic_image(*IMAGE_SIZE, seed).save(os.path.join(directory, f"photo_{seed}.jpg"), "JPEG", quality=90)
+
+BUILDERS = {"blip": build_blip, "flan": build_flan, "health": build_health}
+
+def ensure_built(work_dir, suites, rebuild=False):
+    """Builds the tiny models once per work directory; a marker file records a finished build."""
+    for suite in suites:
+        directory = suite_dir(work_dir, suite)
+        marker = os.path.join(directory, "built.json")
+        if os.path.exists(marker) and not rebuild:
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        log(f"Building tiny {suite} model in {directory}...")
+        start = time.perf_counter()
+        BUILDERS[suite](work_dir)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump({"version": BENCH_VERSION, "seconds": round(time.perf_counter() - start, 1)}, f)
+
+    images = os.path.join(work_dir, "images")
+    if "blip" in suites and (rebuild or not os.path.isdir(images) or len(os.listdir(images)) < ITEMS["blip"]):
+        shutil.rmtree(images, ignore_errors=True)
+        build_images(work_dir, ITEMS["blip"])
+
+# --- Running a suite (child process) ---
+
+def run_config(workers, call, items, batch_size):
+    """Runs items in batches shared out between the workers (one thread each); returns throughput and latency."""
+    batches = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+    latencies = []
+
+    def work(worker, assigned):
+        for batch in assigned:
+            start = time.perf_counter()
+            call(worker, batch)
+            # Every item of the batch waits for the whole call
+            latencies.extend([time.perf_counter() - start] * len(batch))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+        futures = [pool.submit(work, worker, batches[i::len(workers)]) for i, worker in enumerate(workers)]
+        for future in futures:
+            future.result()
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "batch_size": batch_size,
+        "concurrency": len(workers),
+        "items": len(items),
+        "seconds": round(seconds, 4),
+        "items_per_s": round(len(items) / seconds, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "ms_per_item": round(seconds / len(items) * 1000, 3),
+    }
+
+def blip_suite(work_dir):
+    import_start = time.perf_counter()
+    import bridge
+    from transformers import BlipProcessor
+    imported = time.perf_counter()
+
+    files = blip_files(work_dir)
+    processor = BlipProcessor.from_pretrained(suite_dir(work_dir, "blip"))
+
+    def load(count):
+        return [bridge.load_models(files=files, processor=processor) for _ in range(count)]
+
+    def call(models, paths):
+        return bridge.caption_images(models, paths, batch_size=len(paths))
+
+    return load, call, image_paths(work_dir), import_start, imported
+
+def flan_suite(work_dir):
+    import_start = time.perf_counter()
+    import flan_bridge
+    import bench_summarize
+    imported = time.perf_counter()
+
+    model_dir = suite_dir(work_dir, "flan")
+    tokenizers = []
+
+    def load(count):
+        models, tokenizer = flan_bridge.load_models(model_dir, count)
+        tokenizers.append(tokenizer)
+        return models
+
+    def call(model, chunk_ids):
+        return flan_bridge.generate_summaries(chunk_ids, model, tokenizers[-1], batch_size=len(chunk_ids))
+
+    def items():
+        # Chunks of synthetic documents, prompt prefix and EOS included
+        chunk_ids = []
+        seed = 0
+        while len(chunk_ids) < ITEMS["flan"]:
+            text = bench_summarize.synthetic_document(DOCUMENT_CHARS, seed)
+            chunk_ids.extend(c["input_ids"] for c in flan_bridge.chunk_text(text, tokenizers[-1]))
+            seed += 1
+        return chunk_ids[:ITEMS["flan"]]
+
+    return load, call, items, import_start, imported
+
+def synthetic_disks(count, seed=0):
+    """SMART tables shaped like smartctl -j output, a mix of SATA and NVMe drives, and their I/O metrics."""
+    import random
+    import health_scoring
+    rng = random.Random(seed)
+    disks = []
+    disk_io = {}
+    for i in range(count):
+        device = f"/dev/sd{i}"
+        rows = [{"id": attr_id, "raw": {"value": rng.choice([0, 0, 0, rng.randint(1, 50)])}} for attr_id in health_scoring.SMART_IDS]
+        rows[health_scoring.SMART_IDS.index(9)]["raw"]["value"] = rng.randint(100, 60000)
+        rows[health_scoring.SMART_IDS.index(194)]["raw"]["value"] = rng.randint(25, 60)
+        disk = {"device": device, "smart_attributes": rows}
+        if i % 3 == 0:
+            disk["nvme_attributes"] = {"percentage_used": rng.randint(0, 100), "critical_warning": 0, "media_errors": rng.choice([0, 0, 1])}
+        disks.append(disk)
+        disk_io[f"sd{i}"] = {"busy_percent": rng.uniform(0, 100), "smart_device": device}
+    return disks, {"disk_io": disk_io}
+
+def health_suite(work_dir):
+    import_start = time.perf_counter()
+    import health_scoring
+    imported = time.perf_counter()
+
+    model_path = os.path.join(suite_dir(work_dir, "health"), "health_model.onnx")
+    disks, metrics = synthetic_disks(ITEMS["health"])
+
+    def load(count):
+        return [health_scoring.load_session(model_path) for _ in range(count)]
+
+    def call(session, batch):
+        return health_scoring.predictions(batch, metrics, session)
+
+    return load, call, disks, import_start, imported
+
+SUITE_RUNNERS = {"blip": blip_suite, "flan": flan_suite, "health": health_suite}
+
+def run_suite(suite, work_dir, concurrency):
+    """Cold start, then every batch size x concurrency, in this process."""
+    import ort_session
+
+    load, call, items, import_start, imported = SUITE_RUNNERS[suite](work_dir)
+    ort_session.configure(workers=1)
+    workers = load(1)
+    loaded = time.perf_counter()
+    if callable(items):
+        items = items()
+    call(workers[0], items[:1])
+    first = time.perf_counter()
+    result = {
+        "cold_start": {
+            "import_s": round(imported - import_start, 4),
+            "load_s": round(loaded - imported, 4),
+            "first_result_s": round(first - loaded, 4),
+            "total_s": round(first - import_start, 4),
+        },
+        "rss_after_load_mb": peak_rss_mb(),
+        "runs": [],
+    }
+
+    for count in concurrency:
+        if count != len(workers):
+            # One model per worker, splitting the thread budget like the bridges' parallel modes
+            workers = None  # release the previous sessions first
+            ort_session.configure(workers=count)
+            workers = load(count)
+        for worker in workers:
+            call(worker, items[:1])
+        for batch_size in BATCH_SIZES[suite]:
+            run = run_config(workers, call, items, batch_size)
+            log(f"{suite}: batch {batch_size} x {count} workers: {run['items_per_s']} items/s, p99 {run['p99_ms']} ms")
+            result["runs"].append(run)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def run_child(suite, work_dir, concurrency):
+    """Runs one suite in a fresh interpreter with an empty optimized-graph cache."""
+    optimized_dir = os.path.join(work_dir, "ort_optimized", suite)
+    shutil.rmtree(optimized_dir, ignore_errors=True)
+    env = dict(os.environ, NAS_ORT_OPTIMIZED_DIR=optimized_dir)
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--suite", suite, "--work_dir", work_dir,
+                   "--result", result_path, "--concurrency", *map(str, concurrency)]
+        process = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if process.returncode != 0 or not os.path.exists(result_path):
+            log(process.stderr[-4000:])
+            raise RuntimeError(f"{suite} suite failed (exit code {process.returncode})")
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+def package_versions():
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the caption, summarization and health-scoring paths")
+    parser.add_argument("--suites", type=str, nargs="+", default=list(SUITES), choices=SUITES, help="Suites to run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY, help="Concurrent workers to measure")
+    parser.add_argument("--work_dir", type=str, default=default_work_dir(), help="Where the tiny models and synthetic inputs are kept")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the tiny models even if they exist")
+    parser.add_argument("--output", type=str, default=None, help="Also write the report to this JSON file")
+    # Internal: run one suite in this process and write its result
+    parser.add_argument("--suite", type=str, default=None, choices=SUITES, help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Everything is local; never reach for the Hugging Face hub
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+    if args.suite:
+        result = run_suite(args.suite, args.work_dir, args.concurrency)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        sys.exit(0)
+
+    try:
+        ensure_built(args.work_dir, args.suites, args.rebuild)
+        suites = {}
+        for suite in args.suites:
+            log(f"Running {suite} suite...")
+            suites[suite] = run_child(suite, args.work_dir, args.concurrency)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report = {
+        "version": BENCH_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "packages": package_versions(),
+        "models": {"blip": BLIP_CONFIG, "flan": T5_CONFIG, "health": {"input_dim": HEALTH_FEATURES}},
+        "inputs": {"image_size": list(IMAGE_SIZE), "document_chars": DOCUMENT_CHARS, "items": ITEMS},
+        "suites": suites,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,114 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+import bridge
+
+# Compares the per-token latency of the full-prefix decoder against the KV-cached
+# decoder. EOS is ignored so both run for the same number of steps.
+
+def time_full_prefix(models, image_embeds, steps):
+    text_sess = models["text_sess"]
+    encoder_attention_mask = np.ones(image_embeds.shape[:-1], dtype=np.int64)
+    sequences, _ = bridge.new_sequences(models, image_embeds.shape[0])
+    timings = []
+    for step in range(steps):
+        start = time.perf_counter()
+        logits = text_sess.run(None, bridge.graph_feeds(text_sess, {
+            "input_ids": sequences[:, :step + 1],
+            "attention_mask": np.ones((sequences.shape[0], step + 1), dtype=np.int64),
+            "encoder_hidden_states": image_embeds,
+            "encoder_attention_mask": encoder_attention_mask
+        }))[0]
+        sequences[:, step + 1] = np.argmax(logits[:, -1, :], axis=-1)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def time_cached(models, image_embeds, steps):
+    init_sess = models["init_sess"]
+    past_sess = models["past_sess"]
+    encoder_attention_mask = np.ones(image_embeds.shape[:-1], dtype=np.int64)
+    sequences, _ = bridge.new_sequences(models, image_embeds.shape[0])
+    timings = []
+
+    start = time.perf_counter()
+    outputs = init_sess.run(None, bridge.graph_feeds(init_sess, {
+        "input_ids": sequences[:, :1],
+        "encoder_hidden_states": image_embeds,
+        "encoder_attention_mask": encoder_attention_mask
+    }))
+    names = [o.name for o in init_sess.get_outputs()]
+    caches = dict(zip(names[1:], outputs[1:]))
+    sequences[:, 1] = np.argmax(outputs[0][:, -1, :], axis=-1)
+    timings.append(time.perf_counter() - start)
+
+    for step in range(1, steps):
+        start = time.perf_counter()
+        feeds = {
+            "input_ids": sequences[:, step:step + 1],
+            "position_ids": np.full((sequences.shape[0], 1), step, dtype=np.int64),
+            "attention_mask": np.ones((sequences.shape[0], step + 1), dtype=np.int64),
+            "encoder_attention_mask": encoder_attention_mask
+        }
+        for name, value in caches.items():
+            feeds[name.replace("present.", "past.")] = value
+        outputs = past_sess.run(None, bridge.graph_feeds(past_sess, feeds))
+        for output, value in zip(past_sess.get_outputs()[1:], outputs[1:]):
+            caches[output.name] = value
+        sequences[:, step + 1] = np.argmax(outputs[0][:, -1, :], axis=-1)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def window_mean_ms(timings, start, end):
+    window = timings[start:end]
+    return round(1000 * sum(window) / len(window), 2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-token latency: full-prefix vs KV-cached BLIP decoder")
+    parser.add_argument("--image", type=str, default=None, help="Image to caption (random noise if omitted)")
+    parser.add_argument("--steps", type=int, default=bridge.MAX_CAPTION_LENGTH, help="Tokens to decode")
+    parser.add_argument("--batch_size", type=int, default=1)
+    args = parser.parse_args()
+
+    models = bridge.load_models()
+    if models["past_sess"] is None:
+        print("Error: KV-cached decoder not found. Run setup_models.py first.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.image:
+        image = Image.open(args.image).convert('RGB')
+    else:
+        image = Image.fromarray(np.random.randint(0, 255, (384, 384, 3), dtype=np.uint8))
+    pixel_values = models["processor"](images=[image] * args.batch_size, return_tensors="np")["pixel_values"]
+    image_embeds = bridge.run_vision(models, pixel_values)
+
+    # Warm up both graphs once
+    time_full_prefix(models, image_embeds, 2)
+    time_cached(models, image_embeds, 2)
+
+    full = time_full_prefix(models, image_embeds, args.steps)
+    cached = time_cached(models, image_embeds, args.steps)
+
+    tail = max(1, args.steps // 5)
+    report = {
+        "steps": args.steps,
+        "batch_size": args.batch_size,
+        "full_prefix": {
+            "total_ms": round(1000 * sum(full), 2),
+            "first_tokens_ms": window_mean_ms(full, 1, 1 + tail),
+            "last_tokens_ms": window_mean_ms(full, args.steps - tail, args.steps),
+        },
+        "kv_cached": {
+            "total_ms": round(1000 * sum(cached), 2),
+            "first_tokens_ms": window_mean_ms(cached, 1, 1 + tail),
+            "last_tokens_ms": window_mean_ms(cached, args.steps - tail, args.steps),
+        },
+        "per_step_ms": [
+            {"step": i, "full_prefix": round(1000 * f, 3), "kv_cached": round(1000 * c, 3)}
+            for i, (f, c) in enumerate(zip(full, cached))
+        ],
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,279 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import numpy as np
+
+# Near-duplicate lookup for captions. Bursts, edits and re-exports of a photo
+# hash differently but land very close together in BLIP's vision embedding
+# space (pooler_output), so a cosine match above the threshold can reuse the
+# neighbour's caption and skip the text decoder entirely.
+#
+# Reuse is lossy: a different photo with a similar composition can clear the
+# threshold and inherit the wrong caption, and DEFAULT_THRESHOLD has not been
+# calibrated on labelled pairs. It is therefore off unless a caller opts in
+# (--dedup), and a reused caption is never written to the result cache under
+# the new image's key, so clearing the index undoes it.
+#
+# Layout of an index directory:
+#   meta.json     embedding size, storage dtype and the model identity
+#   vectors.bin   L2-normalized embeddings, one row per captioned image (np.memmap)
+#   ids.jsonl     one line per row: {"id": source path or null, "caption": ...}
+#   index.lock    taken by every process while it opens or appends to the index
+# ids.jsonl is appended after its vector row is written, so its line count is
+# the number of valid rows; a torn last line from a crash is dropped on open.
+# The worker and bridge.py runs (--bulk, one-shot) share the default index, so
+# a writer re-reads the row count and capacity from disk under index.lock
+# before appending, instead of trusting its own copy.
+
+DEFAULT_THRESHOLD = 0.95
+DTYPES = ("int8", "float16")
+INT8_SCALE = 127.0
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 65536
+
+def default_index_dir():
+    import result_cache
+    return os.path.join(os.path.dirname(result_cache.default_cache_path()), "blip_embeddings")
+
+class EmbeddingIndex:
+    """Memory-mapped store of normalized vision embeddings with their captions."""
+
+    def __init__(self, path=None, identity=None, threshold=DEFAULT_THRESHOLD, dtype="int8"):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+        self.path = path or default_index_dir()
+        self.identity = identity
+        self.threshold = threshold
+        self.dtype = dtype
+        self.dim = None
+        self.count = 0
+        self.capacity = 0
+        self.vectors = None
+        self.entries = []
+        # How much of ids.jsonl (which file, how many bytes) is in self.entries
+        self.ids_inode = None
+        self.ids_offset = 0
+        # Reentrant so lookup can hold it across search and reading the entries
+        self.lock = threading.RLock()
+
+        os.makedirs(self.path, exist_ok=True)
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.vectors_path = os.path.join(self.path, "vectors.bin")
+        self.ids_path = os.path.join(self.path, "ids.jsonl")
+        self.lock_path = os.path.join(self.path, "index.lock")
+        with self.lock, file_lock(self.lock_path):
+            self._open()
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _open(self):
+        meta = self._read_meta()
+        missing = not (os.path.exists(self.ids_path) and os.path.exists(self.vectors_path))
+        if missing or meta is None or meta.get("identity") != self.identity or meta.get("dtype") != self.dtype:
+            # Embeddings from another model (or another storage format) are not comparable
+            if meta is not None and not missing:
+                print("Embedding index belongs to another model export; starting a new one.", file=sys.stderr)
+            self._reset()
+            return
+        self._sync()
+        # Writers hold index.lock, so anything after the last complete line is a crash leftover
+        if self.ids_offset != os.path.getsize(self.ids_path):
+            with open(self.ids_path, "r+b") as f:
+                f.truncate(self.ids_offset)
+
+    def _sync(self):
+        """Catches up with rows appended (or a reset done) by another process since the last call.
+
+        Returns False, with nothing loaded, when the files on disk are not this
+        model's index (not started yet, or taken over by another export). Call
+        with both locks held when the result is used for writing.
+        """
+        meta = self._read_meta()
+        if meta is None or meta.get("identity") != self.identity or meta.get("dtype") != self.dtype:
+            self.dim = None
+            self.entries = []
+            self.ids_inode = None
+            self.ids_offset = 0
+            self.count = 0
+            self.capacity = 0
+            self.vectors = None
+            return False
+        self.dim = meta.get("dim")
+        inode = os.stat(self.ids_path).st_ino
+        if inode != self.ids_inode or os.path.getsize(self.ids_path) < self.ids_offset:
+            self.entries = []
+            self.ids_inode = inode
+            self.ids_offset = 0
+            self.vectors = None
+            self.capacity = 0
+        with open(self.ids_path, "rb") as f:
+            f.seek(self.ids_offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        break
+                    self.entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+                self.ids_offset += len(line)
+        self.count = len(self.entries)
+
+        if self.dim is None:
+            return True
+        capacity = os.path.getsize(self.vectors_path) // (self.dim * np.dtype(self.dtype).itemsize)
+        if capacity != self.capacity:
+            self.vectors = None
+            if capacity:
+                self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+            self.capacity = capacity
+        return True
+
+    def _reset(self):
+        for path in (self.vectors_path, self.ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+        open(self.ids_path, "w").close()
+        open(self.vectors_path, "wb").close()
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
+        self.dim = None
+        self.entries = []
+        self.ids_inode = os.stat(self.ids_path).st_ino
+        self.ids_offset = 0
+        self.count = 0
+        self.capacity = 0
+        self.vectors = None
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype, "identity": self.identity}, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _grow(self, needed):
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        with open(self.vectors_path, "r+b") as f:
+            f.truncate(capacity * self.dim * np.dtype(self.dtype).itemsize)
+        self.vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def _encode(self, normalized):
+        if self.dtype == "int8":
+            return np.round(normalized * INT8_SCALE).astype(np.int8)
+        return normalized.astype(np.float16)
+
+    def search(self, embeddings):
+        """Best match per query row as (row, cosine similarity); row is -1 when the index is empty."""
+        queries = normalize(embeddings)
+        best_rows = np.full(len(queries), -1, dtype=np.int64)
+        best_scores = np.full(len(queries), -1.0, dtype=np.float32)
+        with self.lock:
+            # Rows another process appended are readable without index.lock: ids.jsonl lines
+            # are only written after their rows
+            self._sync()
+            count = self.count
+            scale = INT8_SCALE if self.dtype == "int8" else 1.0
+            # Blocks keep the float32 working copy small however large the index gets
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                block = self.vectors[start:min(start + SEARCH_BLOCK_ROWS, count)].astype(np.float32)
+                scores = queries @ block.T / scale
+                rows = np.argmax(scores, axis=1)
+                top = scores[np.arange(len(queries)), rows]
+                better = top > best_scores
+                best_rows[better] = rows[better] + start
+                best_scores[better] = top[better]
+        return best_rows, best_scores
+
+    def lookup(self, embeddings):
+        """Caption of the nearest neighbour for each row, or None when nothing is close enough."""
+        with self.lock:
+            rows, scores = self.search(embeddings)
+            return [
+                self.entries[row]["caption"] if row >= 0 and score >= self.threshold else None
+                for row, score in zip(rows, scores)
+            ]
+
+    def batch_duplicates(self, embeddings):
+        """For each row, the earlier row of the same batch it is a near-duplicate of, or -1.
+
+        Lets a burst captioned in one batch decode only one image of each group.
+        """
+        queries = normalize(embeddings)
+        scores = queries @ queries.T
+        leaders = []
+        duplicate_of = []
+        for i in range(len(queries)):
+            best = max(leaders, key=lambda j: scores[i, j], default=-1)
+            if best >= 0 and scores[i, best] >= self.threshold:
+                duplicate_of.append(best)
+            else:
+                duplicate_of.append(-1)
+                leaders.append(i)
+        return duplicate_of
+
+    def add(self, embeddings, captions, ids=None):
+        vectors = self._encode(normalize(embeddings))
+        ids = ids or [None] * len(captions)
+        with self.lock, file_lock(self.lock_path):
+            # Another process may have appended, grown or restarted the index since we last looked
+            if not self._sync():
+                self._reset()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._write_meta()
+            if self.count + len(vectors) > self.capacity:
+                self._grow(self.count + len(vectors))
+            self.vectors[self.count:self.count + len(vectors)] = vectors
+            self.vectors.flush()
+            lines = "".join(json.dumps({"id": source_id, "caption": caption}) + "\n"
+                            for source_id, caption in zip(ids, captions))
+            with open(self.ids_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._sync()
+
+    def stats(self):
+        return {"path": self.path, "entries": self.count, "dim": self.dim, "dtype": self.dtype,
+                "threshold": self.threshold}
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock on path across processes; blocks until it is free."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after about 10 seconds; keep waiting
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
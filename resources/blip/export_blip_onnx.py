@@ -0,0 +1,226 @@
+import math
+import torch
+
+# ONNX export of the BLIP captioning model as used by bridge.py: the vision
+# encoder, the full-prefix text decoder, and the KV-cached decoder pair.
+# Called by setup_models.py, and by benchmark_suite.py for its tiny model.
+
+def export_blip_base(model, pixel_values, vision_path, text_path):
+    # 1. Export Vision Model
+    print("Exporting Vision Model to ONNX...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model.vision_model, 
+            pixel_values, 
+            vision_path, 
+            input_names=["pixel_values"],
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={"pixel_values": {0: "batch_size"}},
+            opset_version=18
+        )
+
+    # 2. Export Text Decoder
+    print("Exporting Text Decoder to ONNX...")
+    text_decoder = model.text_decoder
+    text_decoder.config.use_cache = False
+    
+    # Dummy inputs for decoder
+    vision_outputs = model.vision_model(pixel_values)
+    image_embeds = vision_outputs[0]
+    image_attention_mask = torch.ones(image_embeds.size()[:-1], dtype=torch.long)
+    image_attention_mask = torch.ones(image_embeds.size()[:-1], dtype=torch.long)
+    # Trace with a sequence length > 1 to avoid hardcoding shapes for length 1
+    input_ids = torch.tensor([[30522, 101, 102, 103, 104]], dtype=torch.long) # Length 5
+    attention_mask = torch.ones(input_ids.shape, dtype=torch.long)
+    
+    # Wrapper for export
+    class TextDecoderWrapper(torch.nn.Module):
+        def __init__(self, decoder):
+            super().__init__()
+            self.decoder = decoder
+        
+        def forward(self, input_ids, attention_mask, encoder_hidden_states, encoder_attention_mask):
+            return self.decoder(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                encoder_hidden_states=encoder_hidden_states,
+                encoder_attention_mask=encoder_attention_mask
+            )
+    
+    wrapper = TextDecoderWrapper(text_decoder)
+    
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (input_ids, attention_mask, image_embeds, image_attention_mask),
+            text_path,
+            input_names=["input_ids", "attention_mask", "encoder_hidden_states", "encoder_attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch_size", 1: "seq_len"},
+                "attention_mask": {0: "batch_size", 1: "seq_len"},
+                "encoder_hidden_states": {0: "batch_size", 1: "seq_len_img"},
+                "encoder_attention_mask": {0: "batch_size", 1: "seq_len_img"}
+            },
+            opset_version=18
+        )
+
+class CachedTextDecoder(torch.nn.Module):
+    """BLIP text decoder re-expressed with explicit key/value caches.
+
+    Uses the weights of the HF text decoder but computes attention by hand so
+    that self-attention keys/values and the cross-attention keys/values over
+    the image embeddings can be passed in and returned as plain tensors.
+    """
+
+    def __init__(self, text_decoder):
+        super().__init__()
+        self.embeddings = text_decoder.bert.embeddings
+        self.layers = text_decoder.bert.encoder.layer
+        self.cls = text_decoder.cls
+        attention = self.layers[0].attention.self
+        self.num_heads = attention.num_attention_heads
+        self.head_size = attention.attention_head_size
+
+    def split_heads(self, x):
+        batch, seq, _ = x.shape
+        return x.view(batch, seq, self.num_heads, self.head_size).transpose(1, 2)
+
+    def attend(self, query, key, value, mask):
+        # mask: (batch, kv_len) of 1/0 -> additive bias broadcast over heads and queries
+        bias = (1.0 - mask[:, None, None, :].to(query.dtype)) * -10000.0
+        scores = torch.matmul(query, key.transpose(-1, -2)) / math.sqrt(self.head_size) + bias
+        context = torch.matmul(torch.softmax(scores, dim=-1), value)
+        batch, _, seq, _ = context.shape
+        return context.transpose(1, 2).reshape(batch, seq, self.num_heads * self.head_size)
+
+    def cross_cache(self, encoder_hidden_states):
+        cross = []
+        for layer in self.layers:
+            attention = layer.crossattention.self
+            cross.append(self.split_heads(attention.key(encoder_hidden_states)))
+            cross.append(self.split_heads(attention.value(encoder_hidden_states)))
+        return cross
+
+    def decode(self, input_ids, position_ids, attention_mask, encoder_attention_mask, past, cross):
+        hidden = self.embeddings.word_embeddings(input_ids) + self.embeddings.position_embeddings(position_ids)
+        hidden = self.embeddings.LayerNorm(hidden)
+
+        present = []
+        for i, layer in enumerate(self.layers):
+            attention = layer.attention.self
+            key = self.split_heads(attention.key(hidden))
+            value = self.split_heads(attention.value(hidden))
+            if past is not None:
+                key = torch.cat([past[2 * i], key], dim=2)
+                value = torch.cat([past[2 * i + 1], value], dim=2)
+            present.extend([key, value])
+
+            context = self.attend(self.split_heads(attention.query(hidden)), key, value, attention_mask)
+            attention_output = layer.attention.output(context, hidden)
+
+            cross_attention = layer.crossattention.self
+            context = self.attend(
+                self.split_heads(cross_attention.query(attention_output)),
+                cross[2 * i], cross[2 * i + 1], encoder_attention_mask
+            )
+            cross_output = layer.crossattention.output(context, attention_output)
+
+            hidden = layer.output(layer.intermediate(cross_output), cross_output)
+
+        return self.cls(hidden), present
+
+class CachedDecoderInit(torch.nn.Module):
+    """First decoding step: consumes the BOS token and builds every cache."""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+
+    def forward(self, input_ids, encoder_hidden_states, encoder_attention_mask):
+        cross = self.decoder.cross_cache(encoder_hidden_states)
+        position_ids = torch.zeros_like(input_ids)
+        attention_mask = torch.ones_like(input_ids)
+        logits, present = self.decoder.decode(input_ids, position_ids, attention_mask, encoder_attention_mask, None, cross)
+        return (logits, *present, *cross)
+
+class CachedDecoderWithPast(torch.nn.Module):
+    """Later decoding steps: one new token per row on top of the cached keys/values."""
+
+    def __init__(self, decoder):
+        super().__init__()
+        self.decoder = decoder
+        self.num_layers = len(decoder.layers)
+
+    def forward(self, input_ids, position_ids, attention_mask, encoder_attention_mask, *caches):
+        past = list(caches[:2 * self.num_layers])
+        cross = list(caches[2 * self.num_layers:])
+        logits, present = self.decoder.decode(input_ids, position_ids, attention_mask, encoder_attention_mask, past, cross)
+        return (logits, *present)
+
+def export_blip_cached_decoder(model, pixel_values, init_path, past_path):
+    print("Exporting KV-cached Text Decoder to ONNX...")
+    decoder = CachedTextDecoder(model.text_decoder).eval()
+    num_layers = len(decoder.layers)
+
+    cache_names = []
+    cross_names = []
+    for i in range(num_layers):
+        cache_names.extend([f"past.{i}.key", f"past.{i}.value"])
+        cross_names.extend([f"cross.{i}.key", f"cross.{i}.value"])
+    present_names = [name.replace("past.", "present.") for name in cache_names]
+
+    with torch.no_grad():
+        image_embeds = model.vision_model(pixel_values)[0]
+        encoder_attention_mask = torch.ones(image_embeds.size()[:-1], dtype=torch.long)
+        bos = torch.tensor([[model.config.text_config.bos_token_id]], dtype=torch.long)
+
+        init = CachedDecoderInit(decoder)
+        outputs = init(bos, image_embeds, encoder_attention_mask)
+        kv_axes = {0: "batch_size", 2: "past_len"}
+        cross_axes = {0: "batch_size", 2: "seq_len_img"}
+
+        axes = {
+            "input_ids": {0: "batch_size"},
+            "encoder_hidden_states": {0: "batch_size", 1: "seq_len_img"},
+            "encoder_attention_mask": {0: "batch_size", 1: "seq_len_img"},
+            "logits": {0: "batch_size"},
+        }
+        axes.update({name: kv_axes for name in present_names})
+        axes.update({name: cross_axes for name in cross_names})
+        torch.onnx.export(
+            init,
+            (bos, image_embeds, encoder_attention_mask),
+            init_path,
+            input_names=["input_ids", "encoder_hidden_states", "encoder_attention_mask"],
+            output_names=["logits", *present_names, *cross_names],
+            dynamic_axes=axes,
+            opset_version=18
+        )
+
+        # Trace the incremental graph with a non-empty past so the past length stays dynamic
+        past = list(outputs[1:1 + 2 * num_layers])
+        cross = list(outputs[1 + 2 * num_layers:])
+        next_ids = torch.tensor([[1037]], dtype=torch.long)
+        position_ids = torch.ones_like(next_ids)
+        attention_mask = torch.ones((1, 2), dtype=torch.long)
+
+        axes = {
+            "input_ids": {0: "batch_size"},
+            "position_ids": {0: "batch_size"},
+            "attention_mask": {0: "batch_size", 1: "total_len"},
+            "encoder_attention_mask": {0: "batch_size", 1: "seq_len_img"},
+            "logits": {0: "batch_size"},
+        }
+        axes.update({name: kv_axes for name in cache_names})
+        axes.update({name: cross_axes for name in cross_names})
+        axes.update({name: {0: "batch_size", 2: "total_len"} for name in present_names})
+        torch.onnx.export(
+            CachedDecoderWithPast(decoder),
+            (next_ids, position_ids, attention_mask, encoder_attention_mask, *past, *cross),
+            past_path,
+            input_names=["input_ids", "position_ids", "attention_mask", "encoder_attention_mask", *cache_names, *cross_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=axes,
+            opset_version=18
+        )
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import numpy as np
+from PIL import Image, ImageDraw
+
+import bridge
+
+# Checks that bridge.preprocess_images produces the same tensors as BlipProcessor, within
+# the tolerances documented next to bridge.load_image (EXACT_MAX_DIFF, DRAFT_MAX_DIFF,
+# DRAFT_MEAN_DIFF). Exits with status 1 when any image is outside them.
+
+# (width, height, format) of the synthetic images used when no paths are given
+SYNTHETIC_IMAGES = [
+    (8000, 6000, "JPEG"),  # 48MP phone photo
+    (4032, 3024, "JPEG"),  # 12MP phone photo
+    (1000, 1000, "JPEG"),
+    (300, 200, "JPEG"),    # smaller than the model input, no draft scaling
+    (4032, 3024, "PNG"),
+]
+
+def synthetic_image(width, height, seed=0):
+    """Gradients, sensor-like noise and hard-edged shapes."""
+    rng = np.random.RandomState(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    pixels += rng.randn(height, width, 3) * 8
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x0, y0 = rng.randint(0, width), rng.randint(0, height)
+        x1, y1 = x0 + rng.randint(20, width // 4), y0 + rng.randint(20, height // 4)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(rng.randint(0, 255, 3).tolist()))
+    return image
+
+def load_reference_processor():
+    try:
+        from transformers import BlipProcessor
+        return BlipProcessor.from_pretrained(bridge.MODEL_ID).image_processor
+    except Exception as e:
+        # Offline: the library defaults are the same settings the model ships with
+        from transformers import BlipImageProcessor
+        print(f"Could not load {bridge.MODEL_ID} processor ({e}); using BlipImageProcessor defaults.", file=sys.stderr)
+        return BlipImageProcessor()
+
+def used_draft(image_path):
+    with Image.open(image_path) as image:
+        if image.format != "JPEG":
+            return False
+        full_size = image.size
+        image.draft("RGB", (2 * bridge.IMAGE_SIZE, 2 * bridge.IMAGE_SIZE))
+        return image.size != full_size
+
+def verify(image_paths):
+    processor = load_reference_processor()
+    results = []
+    for image_path in image_paths:
+        reference = processor(images=Image.open(image_path).convert('RGB'), return_tensors="np")["pixel_values"]
+        fast = bridge.preprocess_images([image_path])
+        diff = np.abs(reference - fast)
+
+        draft = used_draft(image_path)
+        if draft:
+            passed = diff.max() <= bridge.DRAFT_MAX_DIFF and diff.mean() <= bridge.DRAFT_MEAN_DIFF
+        else:
+            passed = diff.max() <= bridge.EXACT_MAX_DIFF
+        results.append({
+            "image": os.path.basename(image_path),
+            "draft_decode": draft,
+            "shape_match": reference.shape == fast.shape and fast.dtype == np.float32,
+            "max_abs_diff": float(diff.max()),
+            "mean_abs_diff": float(diff.mean()),
+            "passed": bool(passed and reference.shape == fast.shape),
+        })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fast BLIP preprocessing path with BlipProcessor")
+    parser.add_argument("image_paths", type=str, nargs="*", help="Images to check (synthetic images if omitted)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        image_paths = args.image_paths
+        if not image_paths:
+            for width, height, fmt in SYNTHETIC_IMAGES:
+                path = os.path.join(tmp, f"synthetic_{width}x{height}.{fmt.lower()}")
+                synthetic_image(width, height).save(path, fmt, quality=90)
+                image_paths.append(path)
+
+        results = verify(image_paths)
+
+    print(json.dumps(results, indent=2))
+    if not all(r["passed"] for r in results):
+        print("Error: fast preprocessing is outside the stated tolerance.", file=sys.stderr)
+        sys.exit(1)
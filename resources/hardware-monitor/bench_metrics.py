@@ -0,0 +1,66 @@
+import argparse
+import json
+import sys
+import time
+
+import proc_metrics
+
+# Per-sample cost of the /proc collector against the psutil calls it replaces
+# (cpu_percent, virtual_memory, disk_io_counters(perdisk=True)). Both sources
+# are sampled back to back in a loop; the report also shows how far their
+# memory and disk counters agree.
+
+def time_samples(sample, samples):
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        sample()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "mean_us": round(sum(timings) / len(timings) * 1e6, 1),
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+        "p99_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-sample cost of /proc vs psutil system metrics")
+    parser.add_argument("--samples", type=int, default=2000, help="Samples per source")
+    args = parser.parse_args()
+
+    if not proc_metrics.available():
+        print("Error: /proc metrics are only available on Linux.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        import psutil
+    except ImportError:
+        print("Error: psutil is required for the comparison.", file=sys.stderr)
+        sys.exit(1)
+
+    collector = proc_metrics.ProcCollector()
+
+    def proc_sample():
+        return collector.cpu_percent(), collector.memory_percent(), collector.disk_counters()
+
+    def psutil_sample():
+        return psutil.cpu_percent(interval=None), psutil.virtual_memory().percent, psutil.disk_io_counters(perdisk=True)
+
+    # Warm up (first calls also read /sys/block queue attributes and prime the CPU counters)
+    proc_sample()
+    psutil_sample()
+
+    proc_timing = time_samples(proc_sample, args.samples)
+    psutil_timing = time_samples(psutil_sample, args.samples)
+
+    _, proc_memory, proc_disks = proc_sample()
+    _, psutil_memory, psutil_disks = psutil_sample()
+    shared = [name for name in proc_disks if name in psutil_disks]
+    print(json.dumps({
+        "samples": args.samples,
+        "proc": proc_timing,
+        "psutil": psutil_timing,
+        "speedup": round(psutil_timing["mean_us"] / proc_timing["mean_us"], 2),
+        "disks": {"proc": len(proc_disks), "psutil": len(psutil_disks)},
+        "memory_percent": {"proc": proc_memory, "psutil": psutil_memory},
+        "matching_read_bytes": sum(proc_disks[name].read_bytes == psutil_disks[name].read_bytes for name in shared),
+    }, indent=2))
@@ -1,8 +1,16 @@
 import subprocess
+import hashlib
 import json
 import os
 import platform
 import logging
+import re
+import argparse
+import time
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,16 +23,43 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     logging.info("psutil is not available. Using fallback metrics.")
 
-def run_command(command, ignore_errors=False):
-    """Runs a shell command and returns the output."""
+# Per-device smartctl timeout (seconds), devices queried at once, and the CPU sampling window
+SMART_TIMEOUT = 20
+SMART_WORKERS = 8
+CPU_SAMPLE_SECONDS = 1.0
+# Daemon mode defaults (seconds): cheap metrics, SMART polls, and device re-discovery
+DAEMON_INTERVAL = 5
+DAEMON_SMART_INTERVAL = 300
+DAEMON_RESCAN_INTERVAL = 3600
+# Device cache: the scan and each disk's identity are reused for this long (seconds)
+# unless the machine reboots, the block devices change or a disk stops answering
+DEVICE_CACHE_MAX_AGE = 6 * 3600
+DEVICE_CACHE_VERSION = 1
+# A disk in standby is not woken up unless its last sample is older than this (0 = never)
+STANDBY_MAX_DEFER = 7 * 86400
+# Exit status smartctl is told to use (-n standby,N) when it skips a sleeping disk.
+# Bits 0 and 1 (bad command line, open failed) never occur together otherwise.
+STANDBY_EXIT_STATUS = 3
+# Block devices that are never SMART disks (ignored when fingerprinting /sys/block)
+BLOCK_SKIP_PREFIXES = ("loop", "ram", "zram", "dm-", "sr")
+
+def run_command(command, ignore_errors=False, timeout=None):
+    """Runs a command (shell string or argument list) and returns the output.
+
+    Raises subprocess.TimeoutExpired if it runs longer than timeout seconds.
+    """
     try:
-        result = subprocess.run(command, capture_output=True, text=True, shell=True)
+        # Argument lists run without a shell, so a timeout kills the command itself, not just the shell
+        result = subprocess.run(command, capture_output=True, text=True, shell=isinstance(command, str), timeout=timeout)
         # smartctl returns non-zero even on success to report status bits
-        is_smartctl = "smartctl" in command
+        command_text = command if isinstance(command, str) else " ".join(command)
+        is_smartctl = "smartctl" in command_text
         if result.returncode != 0 and not is_smartctl and not ignore_errors:
-            logging.debug(f"Command failed: {command}\nError: {result.stderr.strip()}")
+            logging.debug(f"Command failed: {command_text}\nError: {result.stderr.strip()}")
             return None
         return result.stdout.strip()
+    except subprocess.TimeoutExpired:
+        raise
     except Exception as e:
         logging.error(f"Error running command '{command}': {e}")
         return None
@@ -71,7 +106,11 @@ def get_smart_scan():
     """Scans for devices using smartctl."""
     if not SMARTCTL_BIN:
         return None
-    output = run_command(f'{SMARTCTL_BIN} --scan -j')
+    try:
+        output = run_command([SMARTCTL_BIN.strip('"'), '--scan', '-j'], timeout=SMART_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logging.warning(f"smartctl --scan did not finish within {SMART_TIMEOUT}s")
+        return None
     if output:
         try:
             return json.loads(output)
@@ -79,15 +118,22 @@ def get_smart_scan():
             return None
     return None
 
-def get_smart_attributes_smartctl(device_name, device_type=None):
-    """Fetch all attributes for a specific device."""
+def get_smart_attributes_smartctl(device_name, device_type=None, timeout=SMART_TIMEOUT, identify=True, standby_ok=False):
+    """Fetch health status and attributes (plus identity with identify) for a specific device.
+
+    With standby_ok a disk that is spun down is left asleep; see in_standby().
+    Raises subprocess.TimeoutExpired if the device does not answer within timeout seconds.
+    """
     if not SMARTCTL_BIN:
         return None
-    cmd = f'{SMARTCTL_BIN} -a -j {device_name}'
+    cmd = [SMARTCTL_BIN.strip('"'), '-i', '-H', '-A', '-j', device_name] if identify else \
+          [SMARTCTL_BIN.strip('"'), '-H', '-A', '-j', device_name]
+    if standby_ok:
+        cmd += ['-n', f'standby,{STANDBY_EXIT_STATUS}']
     if device_type:
-        cmd += f' -d {device_type}'
+        cmd += ['-d', device_type]
     
-    output = run_command(cmd)
+    output = run_command(cmd, timeout=timeout)
     if output:
         try:
             return json.loads(output)
@@ -95,6 +141,12 @@ def get_smart_attributes_smartctl(device_name, device_type=None):
             return None
     return None
 
+def in_standby(smart_data):
+    """True when smartctl skipped the device because it is in standby or sleep."""
+    exit_status = smart_data.get("smartctl", {}).get("exit_status")
+    has_data = "ata_smart_attributes" in smart_data or "nvme_smart_health_information_log" in smart_data
+    return exit_status == STANDBY_EXIT_STATUS and not has_data
+
 def get_wmic_status():
     """Fallback: Get simple status from WMIC."""
     output = run_command('wmic diskdrive get DeviceID,Caption,Status') 
@@ -145,71 +197,253 @@ def get_system_metrics_fallback():
         
     return metrics
 
-def collect_system_metrics():
-    """Collects CPU, RAM, and Disk I/O usage."""
+class PsutilMetrics:
+    """psutil behind the same calls as proc_metrics.ProcCollector."""
+
+    def cpu_percent(self):
+        return psutil.cpu_percent(interval=None)
+
+    def memory_percent(self):
+        return psutil.virtual_memory().percent
+
+    def disk_counters(self):
+        try:
+            return psutil.disk_io_counters(perdisk=True) or {}
+        except Exception:
+            return {}
+
+def open_metrics_source(backend="auto"):
+    """Reads /proc directly on Linux, psutil elsewhere; None means the WMIC fallback."""
+    if backend in ("auto", "proc"):
+        try:
+            import proc_metrics
+            if proc_metrics.available():
+                return proc_metrics.ProcCollector()
+        except (ImportError, OSError) as e:
+            logging.debug(f"/proc metrics unavailable: {e}")
+        if backend == "proc":
+            logging.warning("/proc metrics unavailable, using psutil.")
+    if PSUTIL_AVAILABLE:
+        return PsutilMetrics()
+    return None
+
+def start_cpu_sample(source):
+    """Starts a non-blocking CPU utilization window (sources measure since their previous call)."""
+    if source is not None:
+        source.cpu_percent()
+    return time.monotonic()
+
+def disk_rates(prev, counters, elapsed):
+    """Interval rates of one disk from two counter samples taken elapsed seconds apart."""
+    def delta(field):
+        # Counters restart when a device is re-attached; never report negative load
+        return max(0, getattr(counters, field, 0) - getattr(prev, field, 0))
+
+    ios = delta("read_count") + delta("write_count")
+    rates = {
+        "read_iops": round(delta("read_count") / elapsed, 1),
+        "write_iops": round(delta("write_count") / elapsed, 1),
+        "read_bytes_per_s": round(delta("read_bytes") / elapsed, 1),
+        "write_bytes_per_s": round(delta("write_bytes") / elapsed, 1),
+        # busy_time is in ms (Linux only), so ms busy per second / 10 is a percentage
+        "busy_percent": round(min(100.0, delta("busy_time") / (elapsed * 10.0)), 1),
+        # Mean time each completed request spent queued plus in service
+        "await_ms": round((delta("read_time") + delta("write_time")) / ios, 2) if ios else 0.0,
+    }
+    if hasattr(counters, "weighted_time"):
+        # Time-weighted requests in flight (/proc/diskstats field 11), i.e. the average queue depth
+        rates["avg_queue_depth"] = round(delta("weighted_time") / (elapsed * 1000.0), 2)
+    return rates
+
+def collect_system_metrics(cpu_window_start=None, source=None, io_start=None):
+    """Collects CPU, RAM, and Disk I/O usage.
+
+    With cpu_window_start (from start_cpu_sample), CPU usage covers the time since
+    then, topped up to CPU_SAMPLE_SECONDS, instead of blocking for a fresh second.
+    With io_start (disk counters taken at cpu_window_start) every disk also gets
+    its I/O rates over the same window.
+    """
     metrics = {
         "cpu_percent": 0.0,
         "memory_percent": 0.0,
         "disk_io": {}
     }
     
-    if PSUTIL_AVAILABLE:
-        metrics["cpu_percent"] = psutil.cpu_percent(interval=1)
-        metrics["memory_percent"] = psutil.virtual_memory().percent
-        
-        # Disk I/O
-        try:
-            io_counters = psutil.disk_io_counters(perdisk=True)
-            for disk, counters in io_counters.items():
-                metrics["disk_io"][disk] = {
-                    "read_bytes": counters.read_bytes,
-                    "write_bytes": counters.write_bytes,
-                    "busy_time": getattr(counters, "busy_time", 0) # Only available on Linux
-                }
-        except:
-            pass
-        return metrics
-    else:
+    if source is None:
         fallback = get_system_metrics_fallback()
         metrics.update(fallback)
         return metrics
 
-def main():
-    logging.info("Starting Hardware Monitor...")
-    
-    report = {
-        "system": platform.system(),
-        "metrics": collect_system_metrics(),
-        "disks": []
+    if cpu_window_start is None:
+        cpu_window_start = start_cpu_sample(source)
+    remaining = CPU_SAMPLE_SECONDS - (time.monotonic() - cpu_window_start)
+    if remaining > 0:
+        time.sleep(remaining)
+    metrics["cpu_percent"] = source.cpu_percent()
+    metrics["memory_percent"] = source.memory_percent()
+    elapsed = time.monotonic() - cpu_window_start
+
+    # Disk I/O
+    for disk, counters in source.disk_counters().items():
+        entry = {
+            "read_bytes": counters.read_bytes,
+            "write_bytes": counters.write_bytes,
+            "busy_time": getattr(counters, "busy_time", 0) # Only available on Linux
+        }
+        prev = (io_start or {}).get(disk)
+        if prev is not None:
+            entry.update(disk_rates(prev, counters, elapsed))
+        metrics["disk_io"][disk] = entry
+    return metrics
+
+def kernel_disk_name(device, disk_names):
+    """The name a smartctl device has in the OS disk counters (sda, nvme0n1, PhysicalDrive0), or None."""
+    if not device:
+        return None
+    # Resolves /dev/disk/by-id style links to the kernel name
+    name = os.path.basename(os.path.realpath(device) if device.startswith("/dev/") else device)
+    if name in disk_names:
+        return name
+    if re.fullmatch(r"nvme\d+", name):
+        # smartctl addresses the NVMe controller, the counters its namespaces
+        namespaces = sorted(n for n in disk_names if re.fullmatch(name + r"n\d+", n))
+        return namespaces[0] if namespaces else None
+    match = re.fullmatch(r"sd([a-z]+)", name)
+    if match:
+        # On Windows smartctl's /dev/sda, /dev/sdb, ... are PhysicalDrive0, 1, ...
+        index = 0
+        for letter in match.group(1):
+            index = index * 26 + ord(letter) - ord("a") + 1
+        drive = f"PhysicalDrive{index - 1}"
+        return drive if drive in disk_names else None
+    return None
+
+def attach_disk_io(disks, disk_io):
+    """Joins SMART disks to their I/O counters: disk["io"] and disk_io[name]["smart_device"]."""
+    for disk in disks:
+        name = kernel_disk_name(disk.get("device"), disk_io)
+        if name is None:
+            continue
+        disk_io[name]["smart_device"] = disk["device"]
+        disk["io"] = dict(disk_io[name], kernel_name=name)
+
+def static_info(smart_data):
+    """Identity fields of a smartctl -i answer; they only change when the disk itself does."""
+    capacity = smart_data.get("user_capacity", {}).get("bytes") or smart_data.get("nvme_total_capacity")
+    return {
+        "model": smart_data.get("model_name", "Unknown"),
+        "serial": smart_data.get("serial_number"),
+        "firmware": smart_data.get("firmware_version"),
+        "capacity_bytes": capacity,
+        "rotation_rate": smart_data.get("rotation_rate"),
+        "protocol": smart_data.get("device", {}).get("protocol"),
+    }
+
+def current_temperature(smart_data, attributes):
+    temperature = smart_data.get("temperature", {}).get("current")
+    if temperature is None:
+        # Attribute 194/190 keeps the current temperature in the low byte of the raw value
+        row = next((r for r in attributes if r.get("id") in (194, 190)), None)
+        if row and (row.get("raw") or {}).get("value") is not None:
+            temperature = row["raw"]["value"] & 0xFF
+    return temperature
+
+def volatile_fingerprint(disk):
+    """Changes whenever a health status, attribute raw value or NVMe log field does."""
+    attributes = [(row.get("id"), (row.get("raw") or {}).get("value")) for row in disk["smart_attributes"]]
+    payload = json.dumps([disk["smart_status"], attributes, disk["nvme_attributes"]], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def collect_disk(dev, timeout=SMART_TIMEOUT, entry=None, max_defer=STANDBY_MAX_DEFER):
+    """Polls one device from the smartctl scan; returns (disk_info or None, status, updated cache entry).
+
+    status is "ok", "standby", "timeout" or "failed". Identity (-i) is only read
+    when the cache entry lacks it; a disk in standby is left asleep unless its
+    last sample is older than max_defer seconds, and is reported from that sample.
+    """
+    name = dev.get('name')
+    dtype = dev.get('type')
+    entry = dict(entry or {})
+    identify = entry.get("identity") is None or entry.get("needs_identify", False)
+    last = entry.get("last")
+    wake = bool(max_defer) and last is not None and time.time() - last["disk"]["sampled_at"] >= max_defer
+    logging.info(f"Processing device: {name} (type: {dtype})")
+    try:
+        smart_data = get_smart_attributes_smartctl(name, dtype, timeout, identify=identify, standby_ok=not wake)
+    except subprocess.TimeoutExpired:
+        logging.warning(f"Timed out after {timeout}s waiting for SMART data from {name}")
+        return None, "timeout", entry
+
+    if not smart_data:
+        logging.warning(f"Failed to get SMART data for {name}")
+        return None, "failed", entry
+
+    if in_standby(smart_data):
+        logging.info(f"{name} is in standby, not waking it up.")
+        if last is None:
+            return None, "standby", entry
+        return dict(last["disk"], power_mode="standby", stale=True, changed=False), "standby", entry
+
+    logging.info(f"Successfully got SMART data for {name}")
+    if identify:
+        entry["identity"] = static_info(smart_data)
+        entry["needs_identify"] = False
+    identity = entry["identity"]
+    attributes = smart_data.get("ata_smart_attributes", {}).get("table", [])
+    # Normalize essential data
+    disk = {
+        "device": name,
+        "model": identity["model"],
+        "serial": identity["serial"],
+        "smart_status": smart_data.get("smart_status", {}).get("passed"),
+        "temperature": current_temperature(smart_data, attributes),
+        "smart_attributes": attributes,
+        # NVMe stores attributes differently
+        "nvme_attributes": smart_data.get("nvme_smart_health_information_log", {}),
+        "sampled_at": time.time(),
+    }
+    fingerprint = volatile_fingerprint(disk)
+    unchanged = last is not None and last.get("fingerprint") == fingerprint
+    entry["last"] = {
+        "fingerprint": fingerprint,
+        "disk": disk,
+        # The previous score still describes identical attributes
+        "prediction": last.get("prediction") if unchanged else None,
     }
+    return dict(disk, power_mode="active", changed=not unchanged), "ok", entry
+
+def collect_disks(devices, timeout=SMART_TIMEOUT, workers=SMART_WORKERS, cache=None, max_defer=STANDBY_MAX_DEFER):
+    """Queries devices concurrently.
+
+    Returns (disk infos in scan order, names of devices that timed out, names of
+    devices in standby); the cache entries are updated as a side effect.
+    """
+    devices = [dev for dev in devices if dev.get('name')]
+    if not devices:
+        return [], [], []
+    cache = cache or DeviceCache()
+    entries = [cache.entry(dev['name']) for dev in devices]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(devices)))) as pool:
+        results = list(pool.map(lambda job: collect_disk(job[0], timeout, job[1], max_defer), zip(devices, entries)))
+
+    for dev, (_, status, entry) in zip(devices, results):
+        cache.update(dev['name'], entry)
+        if status == "failed":
+            cache.invalidate()
+    disks = [info for info, _, _ in results if info]
+    timed_out = [dev['name'] for dev, (_, status, _) in zip(devices, results) if status == "timeout"]
+    standby = [dev['name'] for dev, (_, status, _) in zip(devices, results) if status == "standby"]
+    return disks, timed_out, standby
+
+def collect_smart(scan_result, timeout=SMART_TIMEOUT, workers=SMART_WORKERS, cache=None, max_defer=STANDBY_MAX_DEFER):
+    """SMART data for every scanned device, or the WMIC fallback when smartctl is unusable."""
+    result = {"disks": [], "timed_out_devices": [], "standby_devices": []}
 
     # 1. Try smartctl first
-    scan_result = get_smart_scan()
-    smart_available = scan_result is not None
-    
-    if smart_available and 'devices' in scan_result:
+    if scan_result is not None and 'devices' in scan_result:
         logging.info(f"Found {len(scan_result['devices'])} devices via smartctl.")
-        for dev in scan_result['devices']:
-            name = dev.get('name')
-            dtype = dev.get('type')
-            logging.info(f"Processing device: {name} (type: {dtype})")
-            if name:
-                smart_data = get_smart_attributes_smartctl(name, dtype)
-                if smart_data:
-                    logging.info(f"Successfully got SMART data for {name}")
-                    # Normalize essential data
-                    disk_info = {
-                        "device": name,
-                        "model": smart_data.get("model_name", "Unknown"),
-                        "smart_status": smart_data.get("smart_status", {}).get("passed"),
-                        "temperature": smart_data.get("temperature", {}).get("current"),
-                        "smart_attributes": smart_data.get("ata_smart_attributes", {}).get("table", []),
-                        # NVMe stores attributes differently
-                        "nvme_attributes": smart_data.get("nvme_smart_health_information_log", {})
-                    }
-                    report["disks"].append(disk_info)
-                else:
-                    logging.warning(f"Failed to get SMART data for {name}")
+        result["disks"], result["timed_out_devices"], result["standby_devices"] = \
+            collect_disks(scan_result['devices'], timeout, workers, cache, max_defer)
     
     else:
         if not SMARTCTL_BIN:
@@ -218,16 +452,412 @@ def main():
             logging.warning("smartctl failed to scan devices. Falling back to WMIC.")
         
         wmic_data = get_wmic_status()
-        report["wmic_fallback"] = wmic_data
+        result["wmic_fallback"] = wmic_data
         
         # Parse WMIC roughly
         for entry in wmic_data:
-             report["disks"].append({
+             result["disks"].append({
                  "raw_wmic": entry["raw"],
                  "status": "Unknown (WMIC Fallback)"
              })
+    return result
+
+def boot_id():
+    """Changes on every boot, so a scan from before a reboot is never trusted."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id", "r") as f:
+            return f.read().strip()
+    except OSError:
+        pass
+    return str(int(psutil.boot_time())) if PSUTIL_AVAILABLE else None
+
+def block_fingerprint():
+    """Names and sizes of the block devices (Linux only); adding, removing or swapping a disk changes it."""
+    if not os.path.isdir("/sys/block"):
+        return None
+    parts = []
+    for name in sorted(os.listdir("/sys/block")):
+        if name.startswith(BLOCK_SKIP_PREFIXES):
+            continue
+        try:
+            with open(os.path.join("/sys/block", name, "size"), "r") as f:
+                parts.append(f"{name}:{f.read().strip()}")
+        except OSError:
+            parts.append(name)
+    return "|".join(parts)
+
+class DeviceCache:
+    """The smartctl device scan and each device's identity and last sample, kept between runs.
+
+    The scan is reused until it is max_age seconds old, the machine reboots,
+    the block devices change or a device stops answering. After a rescan every
+    device's identity is read again on its next poll. Without a path the cache
+    only lives as long as the process.
+    """
+
+    def __init__(self, path=None, max_age=DEVICE_CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == DEVICE_CACHE_VERSION:
+                    return data
+            except (OSError, json.JSONDecodeError):
+                pass
+        return {"version": DEVICE_CACHE_VERSION, "scan": None, "devices": {}}
+
+    def stale_reason(self):
+        data = self.data
+        if data.get("scan") is None:
+            return "no cached scan"
+        if data.get("invalidated"):
+            return "a device stopped answering"
+        if data.get("smartctl") != SMARTCTL_BIN:
+            return "smartctl changed"
+        if time.time() - data.get("scanned_at", 0) >= self.max_age:
+            return "scan expired"
+        if data.get("boot_id") != boot_id():
+            return "reboot"
+        if data.get("block_devices") != block_fingerprint():
+            return "block devices changed"
+        return None
+
+    def scan(self, force=False):
+        """The device scan, from the cache while it is still valid."""
+        reason = "rescan requested" if force else self.stale_reason()
+        if reason is None:
+            return self.data["scan"]
+        logging.info(f"Scanning devices ({reason}).")
+        scan_result = get_smart_scan()
+        if scan_result is None or 'devices' not in scan_result:
+            return scan_result
+        names = {dev.get('name') for dev in scan_result['devices']}
+        with self.lock:
+            devices = {}
+            for name, entry in self.data["devices"].items():
+                if name in names:
+                    # Same name, but possibly another disk: confirm on the next answer
+                    devices[name] = dict(entry, needs_identify=True)
+            self.data = {
+                "version": DEVICE_CACHE_VERSION,
+                "smartctl": SMARTCTL_BIN,
+                "scanned_at": time.time(),
+                "boot_id": boot_id(),
+                "block_devices": block_fingerprint(),
+                "scan": scan_result,
+                "devices": devices,
+            }
+        return scan_result
+
+    def invalidate(self):
+        with self.lock:
+            self.data["invalidated"] = True
+
+    def entry(self, name):
+        with self.lock:
+            return self.data["devices"].get(name)
+
+    def update(self, name, entry):
+        with self.lock:
+            old = (self.data["devices"].get(name) or {}).get("last") or {}
+            last = entry.get("last")
+            if last and not last.get("prediction") and old.get("fingerprint") == last.get("fingerprint"):
+                # A prediction stored while this poll was running still applies
+                last["prediction"] = old.get("prediction")
+            self.data["devices"][name] = entry
+
+    def sync_predictions(self, disks):
+        """Stores the predictions of changed disks and reuses the stored one for unchanged disks."""
+        with self.lock:
+            for disk in disks:
+                last = (self.data["devices"].get(disk.get("device")) or {}).get("last")
+                if last is None:
+                    continue
+                if disk.get("changed", True):
+                    if disk.get("prediction") and last["fingerprint"] == volatile_fingerprint(disk):
+                        last["prediction"] = disk["prediction"]
+                elif last.get("prediction") and "prediction" not in disk:
+                    disk["prediction"] = last["prediction"]
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            encoded = json.dumps(self.data)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(encoded)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save device cache: {e}")
+
+def default_device_cache_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "device_cache.json")
+
+def open_store(store_path):
+    """History store (numpy-backed, so only imported when asked for)."""
+    if not store_path:
+        return None
+    try:
+        import health_store
+    except ImportError as e:
+        logging.warning(f"History store unavailable ({e}); install numpy to record history.")
+        return None
+    return health_store.HealthStore(store_path)
+
+def default_history_path():
+    # Same file monitor.js keeps its delta history in
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "health_history.json")
+
+def open_scoring(model_path=None):
+    """Health model session for --score, or None (with a warning) when numpy/onnxruntime or the model is missing."""
+    try:
+        import health_scoring
+        import ort_session
+        # The collector only runs the tiny health model, which gains nothing from a
+        # thread pool: one thread (as in monitor.js) unless a budget is set explicitly
+        if not os.environ.get("NAS_ORT_THREAD_BUDGET"):
+            ort_session.configure(thread_budget=1)
+        return health_scoring.load_session(model_path)
+    except Exception as e:
+        logging.warning(f"Health scoring unavailable: {e}")
+        return None
+
+def add_predictions(report, session, history_path=None):
+    """Scores the SMART disks whose attributes changed in one model call and attaches the result as disk["prediction"]."""
+    import health_scoring
+    disks = [disk for disk in report["disks"] if disk.get("device") and disk.get("changed", True)]
+    if not disks:
+        return
+    results = health_scoring.predictions(disks, report["metrics"], session, history_path, int(time.time() * 1000))
+    for disk, prediction in zip(disks, results):
+        disk["prediction"] = prediction
+
+def score_history(store_path, series, level, model_path=None):
+    store = open_store(store_path)
+    session = open_scoring(model_path)
+    if store is None or session is None:
+        print("Error: --score_history needs --store, numpy and onnxruntime.", file=sys.stderr)
+        sys.exit(1)
+    import health_scoring
+    try:
+        print(json.dumps(health_scoring.score_series(session, store, series, level)))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+def record_smart(store, timestamp, disks):
+    # Disks reported from their last sample (in standby) add nothing new to the history
+    store.record_smart(timestamp, [disk for disk in disks if not disk.get("stale")])
 
+def main(timeout=SMART_TIMEOUT, workers=SMART_WORKERS, store_path=None, score=False, model_path=None, history_path=None,
+         cache_path=None, cache_max_age=DEVICE_CACHE_MAX_AGE, rescan=False, max_defer=STANDBY_MAX_DEFER,
+         metrics_backend="auto"):
+    logging.info("Starting Hardware Monitor...")
+    
+    # The CPU sampling window runs while the disks are being queried
+    source = open_metrics_source(metrics_backend)
+    cpu_window_start = start_cpu_sample(source)
+    io_start = source.disk_counters() if source is not None else None
+    cache = DeviceCache(cache_path, cache_max_age)
+    report = {
+        "system": platform.system(),
+        "metrics": None,
+    }
+    report.update(collect_smart(cache.scan(force=rescan), timeout, workers, cache, max_defer))
+    report["metrics"] = collect_system_metrics(cpu_window_start, source, io_start)
+    attach_disk_io(report["disks"], report["metrics"]["disk_io"])
+
+    store = open_store(store_path)
+    if store is not None:
+        record_smart(store, time.time(), report["disks"])
+        store.flush()
+    session = open_scoring(model_path) if score else None
+    if session is not None:
+        add_predictions(report, session, history_path)
+    cache.sync_predictions(report["disks"])
+    cache.save()
     print(json.dumps(report, indent=2))
 
+# --- Daemon mode ---
+# One long-lived process instead of a fresh interpreter per check. Cheap metrics
+# (CPU, RAM, disk I/O) are computed from counter deltas every interval without
+# blocking; SMART is polled on its own slower cadence on a background thread and
+# attached to the next record once it finishes. Each record is one JSON line.
+
+class MetricsSampler:
+    """Non-blocking system metrics: every value covers the time since the previous sample."""
+
+    def __init__(self, source):
+        self.source = source
+        self.prev_io = None
+        self.prev_time = None
+        self.sample()
+
+    def sample(self):
+        if self.source is None:
+            metrics = {"cpu_percent": 0.0, "memory_percent": 0.0, "disk_io": {}}
+            metrics.update(get_system_metrics_fallback())
+            return metrics
+
+        now = time.monotonic()
+        metrics = {
+            "cpu_percent": self.source.cpu_percent(),
+            "memory_percent": self.source.memory_percent(),
+            "disk_io": {},
+        }
+        io_counters = self.source.disk_counters()
+
+        elapsed = now - self.prev_time if self.prev_time is not None else None
+        for disk, counters in io_counters.items():
+            busy_time = getattr(counters, "busy_time", 0) # Only available on Linux
+            entry = {
+                "read_bytes": counters.read_bytes,
+                "write_bytes": counters.write_bytes,
+                "busy_time": busy_time,
+            }
+            prev = (self.prev_io or {}).get(disk)
+            if prev is not None and elapsed:
+                entry.update(disk_rates(prev, counters, elapsed))
+            metrics["disk_io"][disk] = entry
+
+        self.prev_io = io_counters
+        self.prev_time = now
+        return metrics
+
+class SmartPoller:
+    """Runs SMART collection on a background thread, keeping the device scan between polls."""
+
+    def __init__(self, timeout, workers, cache, max_defer=STANDBY_MAX_DEFER):
+        self.timeout = timeout
+        self.workers = workers
+        self.cache = cache
+        self.max_defer = max_defer
+        self.thread = None
+        self.result = None
+        self.lock = threading.Lock()
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.busy():
+            return
+        self.thread = threading.Thread(target=self._poll, daemon=True)
+        self.thread.start()
+
+    def _poll(self):
+        result = collect_smart(self.cache.scan(), self.timeout, self.workers, self.cache, self.max_defer)
+        with self.lock:
+            self.result = result
+
+    def take(self):
+        """The latest finished poll, once."""
+        with self.lock:
+            result, self.result = self.result, None
+        return result
+
+def watch_stdin(stop):
+    """Stops the daemon when the parent closes our stdin (e.g. the Node process exited)."""
+    for _ in sys.stdin:
+        pass
+    logging.info("stdin closed, stopping daemon.")
+    stop.set()
+
+def run_daemon(interval=DAEMON_INTERVAL, smart_interval=DAEMON_SMART_INTERVAL, timeout=SMART_TIMEOUT,
+               workers=SMART_WORKERS, rescan_interval=DAEMON_RESCAN_INTERVAL, watch_input=True, store_path=None,
+               score=False, model_path=None, history_path=None, cache_path=None, max_defer=STANDBY_MAX_DEFER,
+               rescan=False, metrics_backend="auto"):
+    logging.info(f"Starting Hardware Monitor daemon (metrics every {interval}s, SMART every {smart_interval}s)...")
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    if watch_input:
+        threading.Thread(target=watch_stdin, args=(stop,), daemon=True).start()
+
+    store = open_store(store_path)
+    session = open_scoring(model_path) if score else None
+    sampler = MetricsSampler(open_metrics_source(metrics_backend))
+    cache = DeviceCache(cache_path, rescan_interval)
+    if rescan:
+        cache.invalidate()
+    poller = SmartPoller(timeout, workers, cache, max_defer)
+    poller.start()
+    last_smart = time.monotonic()
+    smart_disks = []
+
+    while not stop.wait(interval):
+        now = time.monotonic()
+        if now - last_smart >= smart_interval and not poller.busy():
+            poller.start()
+            last_smart = now
+
+        record = {
+            "timestamp": time.time(),
+            "system": platform.system(),
+            "metrics": sampler.sample(),
+        }
+        smart = poller.take()
+        if smart is not None:
+            smart_disks = smart["disks"]
+            record.update(smart)
+        # Every record maps its disk counters to the disks of the latest SMART poll
+        attach_disk_io(smart_disks, record["metrics"]["disk_io"])
+        if smart is not None:
+            if session is not None:
+                add_predictions(record, session, history_path)
+            cache.sync_predictions(record["disks"])
+            cache.save()
+        if store is not None:
+            store.record_io(record["timestamp"], record["metrics"]["disk_io"])
+            if smart is not None:
+                record_smart(store, record["timestamp"], smart["disks"])
+            store.flush()
+        try:
+            sys.stdout.write(json.dumps(record) + "\n")
+            sys.stdout.flush()
+        except BrokenPipeError:
+            break
+    logging.info("Hardware Monitor daemon stopped.")
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Collect system metrics and SMART data as JSON")
+    parser.add_argument("--timeout", type=float, default=SMART_TIMEOUT, help="Seconds to wait for each device's SMART data")
+    parser.add_argument("--workers", type=int, default=SMART_WORKERS, help="Devices queried concurrently")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and print one JSON line per interval")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL, help="Daemon mode: seconds between metric records")
+    parser.add_argument("--smart_interval", type=float, default=DAEMON_SMART_INTERVAL, help="Daemon mode: seconds between SMART polls")
+    parser.add_argument("--rescan_interval", type=float, default=None,
+                        help=f"Seconds a device scan is reused (default: {DEVICE_CACHE_MAX_AGE}, daemon mode {DAEMON_RESCAN_INTERVAL})")
+    parser.add_argument("--rescan", action="store_true", help="Ignore the cached device scan and identities")
+    parser.add_argument("--device_cache", type=str, default=default_device_cache_path(), help="Device scan/identity cache file")
+    parser.add_argument("--no_device_cache", action="store_true", help="Do not read or write the device cache file")
+    parser.add_argument("--max_standby_defer", type=float, default=STANDBY_MAX_DEFER,
+                        help="Seconds a disk in standby is left asleep before it is polled anyway (0 = never wake)")
+    parser.add_argument("--store", type=str, default=None, help="Append SMART (and, in daemon mode, I/O) history to this health store directory")
+    parser.add_argument("--score", action="store_true", help="Add a health model prediction to every disk (one batched model call)")
+    parser.add_argument("--model", type=str, default=None, help="--score: health model (default: health_model.onnx)")
+    parser.add_argument("--history", type=str, default=None, help="--score: delta history file shared with monitor.js (default: health_history.json)")
+    parser.add_argument("--score_history", type=str, default=None, help='Score every stored sample of a series (e.g. "smart:/dev/sda") and exit')
+    parser.add_argument("--level", type=str, default="raw", choices=("raw", "hourly", "daily"), help="--score_history: resolution to score")
+    parser.add_argument("--metrics", type=str, default="auto", choices=("auto", "proc", "psutil"),
+                        help="System metrics source: /proc and /sys directly (Linux), or psutil")
+    parser.add_argument("--ignore_stdin", action="store_true", help="Daemon mode: keep running when stdin is closed")
+    args = parser.parse_args()
+    cache_path = None if args.no_device_cache else args.device_cache
+    if args.score_history:
+        score_history(args.store, args.score_history, args.level, args.model)
+    elif args.daemon:
+        run_daemon(args.interval, args.smart_interval, args.timeout, args.workers, args.rescan_interval or DAEMON_RESCAN_INTERVAL,
+                   not args.ignore_stdin, args.store, args.score, args.model, args.history or default_history_path(),
+                   cache_path, args.max_standby_defer, args.rescan, args.metrics)
+    else:
+        main(args.timeout, args.workers, args.store, args.score, args.model, args.history or default_history_path(),
+             cache_path, args.rescan_interval or DEVICE_CACHE_MAX_AGE, args.rescan, args.max_standby_defer, args.metrics)
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import sys
+import numpy as np
+
+# Sessions come from the shared helpers in the sibling python folder (ort_session.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python"))
+
+# Batch health scoring with the autoencoder from export_model.py.
+#
+# Builds the same 14 features as HardwareMonitor.normalizeData in monitor.js for
+# every disk at once (busy is the disk's own utilization, see attach_disk_io in
+# hardware_monitor.py), runs the model once over the whole matrix (its batch axis
+# is dynamic) and computes reconstruction error and per-feature contributions
+# with array operations instead of one session.run and JS loop per disk.
+
+SMART_IDS = [5, 9, 10, 187, 194, 197, 198, 199]
+FEATURE_NAMES = [f"smart_{i}" for i in SMART_IDS] + [
+    "nvme_percentage_used", "nvme_critical_warning", "nvme_media_errors",
+    "busy", "delta_reallocated", "delta_pending",
+]
+POWER_ON_HOURS_CAP = 43800.0  # 5 years
+ANOMALY_THRESHOLD = 0.05
+HISTORY_LENGTH = 10
+
+def default_model_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "health_model.onnx")
+
+def default_history_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "health_history.json")
+
+def load_session(model_path=None):
+    """Session from ort_session, so the thread budget, optimization level and optimized-graph cache apply."""
+    import ort_session
+    return ort_session.create_session(model_path or default_model_path())
+
+def smart_matrix(disks):
+    """Raw values of SMART_IDS, one row per disk (0 when an attribute is missing)."""
+    raw = np.zeros((len(disks), len(SMART_IDS)), dtype=np.float64)
+    column = {attr_id: j for j, attr_id in enumerate(SMART_IDS)}
+    for i, disk in enumerate(disks):
+        for row in disk.get("smart_attributes") or []:
+            j = column.get(row.get("id"))
+            if j is not None:
+                raw[i, j] = (row.get("raw") or {}).get("value") or 0
+    return raw
+
+def normalize_smart(raw):
+    """Same scaling as normalizeData: temperature /100, power-on hours /5 years, everything else 'non-zero'."""
+    features = (raw > 0).astype(np.float32)
+    features[:, SMART_IDS.index(194)] = np.clip(raw[:, SMART_IDS.index(194)], 0, 100) / 100.0
+    features[:, SMART_IDS.index(9)] = np.minimum(raw[:, SMART_IDS.index(9)], POWER_ON_HOURS_CAP) / POWER_ON_HOURS_CAP
+    return features
+
+def device_busy(disk, metrics):
+    """Utilization (0-1) of the disk's own I/O counters over the last interval; 0 when unknown."""
+    disk_io = (metrics or {}).get("disk_io") or {}
+    io = next((entry for entry in disk_io.values() if entry.get("smart_device") == disk.get("device")), None)
+    io = io or disk.get("io") or {}
+    return min(max(io.get("busy_percent", 0.0) / 100.0, 0.0), 1.0)
+
+def previous_values(history, device):
+    """Attributes 5 and 197 from the device's last history entry; without history nothing counts as an increase."""
+    entries = history.get(device) or []
+    if not entries:
+        return [np.inf, np.inf]
+    return [entries[-1].get(key) or 0 for key in ("5", "197")]
+
+def build_features(disks, metrics, history=None):
+    """(disks x 14) feature matrix plus the raw SMART values (for the delta history)."""
+    raw = smart_matrix(disks)
+    features = np.zeros((len(disks), len(FEATURE_NAMES)), dtype=np.float32)
+    features[:, :len(SMART_IDS)] = normalize_smart(raw)
+
+    nvme = np.array([
+        [(d.get("nvme_attributes") or {}).get(key) or 0 for key in ("percentage_used", "critical_warning", "media_errors")]
+        for d in disks
+    ], dtype=np.float64).reshape(len(disks), 3)
+    features[:, 8] = nvme[:, 0] / 100.0
+    features[:, 9:11] = nvme[:, 1:] > 0
+
+    features[:, 11] = [device_busy(d, metrics) for d in disks]
+
+    # Reallocated (5) / pending (197) went up since the device's previous sample
+    history = history or {}
+    previous = np.array([previous_values(history, d.get("device")) for d in disks], dtype=np.float64).reshape(len(disks), 2)
+    features[:, 12] = raw[:, SMART_IDS.index(5)] > previous[:, 0]
+    features[:, 13] = raw[:, SMART_IDS.index(197)] > previous[:, 1]
+    return features, raw
+
+def score(session, features):
+    """Runs the model once over every row; returns (mse per row, squared error contribution per feature)."""
+    if len(features) == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+    reconstructed = session.run(None, {session.get_inputs()[0].name: features.astype(np.float32)})[0]
+    squared = (features - reconstructed) ** 2
+    contributions = squared / features.shape[1]
+    return contributions.sum(axis=1), contributions
+
+def load_history(history_path):
+    if history_path and os.path.exists(history_path):
+        try:
+            with open(history_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            pass
+    return {}
+
+def save_history(history_path, history, disks, raw, timestamp_ms):
+    """Appends this sample to the JSON history monitor.js keeps (same layout, last HISTORY_LENGTH entries)."""
+    for disk, values in zip(disks, raw):
+        device = disk.get("device")
+        if not device:
+            continue
+        entry = {str(attr_id): int(v) if float(v).is_integer() else float(v) for attr_id, v in zip(SMART_IDS, values)}
+        entry["timestamp"] = timestamp_ms
+        history[device] = (history.get(device) or [])[-(HISTORY_LENGTH - 1):] + [entry]
+    try:
+        with open(history_path, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2)
+    except OSError as e:
+        logging.warning(f"Could not save health history: {e}")
+
+def predictions(disks, metrics, session, history_path=None, timestamp_ms=None):
+    """One prediction dict per disk (same fields as monitor.js predict) plus per-feature contributions."""
+    history = load_history(history_path)
+    features, raw = build_features(disks, metrics, history)
+    mse, contributions = score(session, features)
+    if history_path and timestamp_ms is not None:
+        save_history(history_path, history, disks, raw, timestamp_ms)
+
+    results = []
+    for i in range(len(disks)):
+        results.append({
+            "anomaly_score": round(float(mse[i]), 4),
+            "status": "Warning: Anomaly Detected" if mse[i] > ANOMALY_THRESHOLD else "Healthy",
+            "input_vector": features[i].tolist(),
+            "feature_contributions": {name: round(float(c), 6) for name, c in zip(FEATURE_NAMES, contributions[i])},
+        })
+    return results
+
+def score_series(session, store, series, level="raw", start=None, end=None):
+    """Scores every stored sample of a smart:<device> series in one model call.
+
+    Deltas compare each sample with the one before it. The busy feature is
+    not part of SMART history and is left at 0.
+    """
+    result = store.query(series, start, end, level)
+    fields = result["fields"]
+    values = np.nan_to_num(result["mean"].astype(np.float64), nan=0.0)
+
+    raw = np.zeros((len(values), len(SMART_IDS)), dtype=np.float64)
+    for j, attr_id in enumerate(SMART_IDS):
+        name = f"smart_{attr_id}"
+        if name in fields:
+            raw[:, j] = values[:, fields.index(name)]
+
+    features = np.zeros((len(values), len(FEATURE_NAMES)), dtype=np.float32)
+    features[:, :len(SMART_IDS)] = normalize_smart(raw)
+    for column, name in ((8, "nvme_percentage_used"), (9, "nvme_critical_warning"), (10, "nvme_media_errors")):
+        if name in fields:
+            features[:, column] = values[:, fields.index(name)]
+    features[:, 8] /= 100.0
+    features[:, 9:11] = features[:, 9:11] > 0
+    if len(values) > 1:
+        features[1:, 12] = np.diff(raw[:, SMART_IDS.index(5)]) > 0
+        features[1:, 13] = np.diff(raw[:, SMART_IDS.index(197)]) > 0
+
+    mse, contributions = score(session, features)
+    return {
+        "series": series,
+        "level": result["level"],
+        "t": result["t"].tolist(),
+        "anomaly_score": [round(float(v), 4) for v in mse],
+        "top_feature": [FEATURE_NAMES[j] for j in np.argmax(contributions, axis=1)] if len(mse) else [],
+    }
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import numpy as np
+
+# Compact, fixed-size history of per-device health attributes.
+#
+# Each series (e.g. "smart:/dev/sda" or "io:sda") is a directory holding three
+# ring buffers as memory-mapped .npy files, one per resolution:
+#   raw     every sample as it arrives
+#   hourly  one row per hour  (mean / max / sample count)
+#   daily   one row per day   (mean / max / sample count)
+# Appends write a single row per level in place; nothing is ever re-serialized,
+# so the cost of a sample does not grow with history or device count. The
+# write position is recovered on open from the newest timestamp, so there is no
+# separate index file to keep in sync. Missing values are stored as NaN.
+
+LEVELS = {
+    # name: (bucket seconds, rows kept)
+    "raw": (None, 2016),          # e.g. one week at 5-minute samples
+    "hourly": (3600, 24 * 90),    # 90 days
+    "daily": (86400, 3 * 365),    # 3 years
+}
+LEVEL_ORDER = ("raw", "hourly", "daily")
+
+SMART_FIELDS = [
+    "smart_5", "smart_9", "smart_10", "smart_187", "smart_194", "smart_197", "smart_198", "smart_199",
+    "nvme_percentage_used", "nvme_critical_warning", "nvme_media_errors", "temperature",
+]
+# Existing series keep the fields they were created with (series.json)
+IO_FIELDS = ["read_bytes_per_s", "write_bytes_per_s", "busy_percent", "read_iops", "write_iops", "await_ms", "avg_queue_depth"]
+SERIES_FIELDS = {"smart": SMART_FIELDS, "io": IO_FIELDS}
+# Kernel block devices that are never physical disks
+VIRTUAL_DISK_PREFIXES = ("loop", "ram", "zram")
+
+def row_dtype(n_fields):
+    return np.dtype([("t", "f8"), ("count", "u4"), ("mean", "f4", (n_fields,)), ("max", "f4", (n_fields,))])
+
+def series_dirname(series):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", series)
+
+class Series:
+    """The three ring buffers of one series."""
+
+    def __init__(self, path, name, fields):
+        self.path = path
+        self.name = name
+        self.fields = list(fields)
+        self.rings = {}
+        self.heads = {}
+        os.makedirs(path, exist_ok=True)
+
+        info_path = os.path.join(path, "series.json")
+        if os.path.exists(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                self.fields = json.load(f)["fields"]
+        else:
+            with open(info_path, "w", encoding="utf-8") as f:
+                json.dump({"series": name, "fields": self.fields}, f)
+
+        dtype = row_dtype(len(self.fields))
+        for level, (_, capacity) in LEVELS.items():
+            ring_path = os.path.join(path, f"{level}.npy")
+            if os.path.exists(ring_path):
+                ring = np.load(ring_path, mmap_mode="r+")
+            else:
+                ring = np.lib.format.open_memmap(ring_path, mode="w+", dtype=dtype, shape=(capacity,))
+                ring["t"] = 0.0
+                ring["count"] = 0
+                ring["mean"] = np.nan
+                ring["max"] = np.nan
+                ring.flush()
+            self.rings[level] = ring
+            # Newest row is the write head; an empty ring (all t == 0) starts at row 0
+            self.heads[level] = int(np.argmax(ring["t"])) if ring["t"].any() else -1
+
+    def append(self, timestamp, values):
+        vector = np.array([values.get(name, np.nan) for name in self.fields], dtype=np.float32)
+        vector[~np.isfinite(vector)] = np.nan
+        for level, (bucket, capacity) in LEVELS.items():
+            ring = self.rings[level]
+            head = self.heads[level]
+            start = timestamp if bucket is None else timestamp - timestamp % bucket
+            if bucket is not None and head >= 0 and ring["t"][head] == start:
+                # Still inside the current bucket: fold the sample into the running mean/max
+                row = ring[head]
+                count = int(row["count"]) + 1
+                mean, peak = row["mean"], row["max"]
+                updated = np.where(np.isnan(mean), vector, mean + (vector - mean) / count)
+                ring["mean"][head] = np.where(np.isnan(vector), mean, updated)
+                ring["max"][head] = np.fmax(peak, vector)
+                ring["count"][head] = count
+            else:
+                head = (head + 1) % capacity
+                ring["t"][head] = start
+                ring["count"][head] = 1
+                ring["mean"][head] = vector
+                ring["max"][head] = vector
+                self.heads[level] = head
+
+    def flush(self):
+        for ring in self.rings.values():
+            ring.flush()
+
+    def oldest(self, level):
+        times = self.rings[level]["t"]
+        filled = times[times > 0]
+        return float(filled.min()) if len(filled) else None
+
+    def query(self, start=None, end=None, level="auto", fields=None):
+        """Rows with start <= t < end in time order, as {"t", "count", "mean", "max"} arrays."""
+        if level == "auto":
+            level = self.pick_level(start)
+        ring = self.rings[level]
+        head = self.heads[level]
+        if head < 0:
+            rows = ring[:0]
+        else:
+            # Unroll the ring so rows are in time order, then cut the range with binary search
+            rows = np.concatenate([ring[head + 1:], ring[:head + 1]])
+            rows = rows[rows["t"] > 0]
+            lo = 0 if start is None else np.searchsorted(rows["t"], start, side="left")
+            hi = len(rows) if end is None else np.searchsorted(rows["t"], end, side="left")
+            rows = rows[lo:hi]
+
+        columns = slice(None) if fields is None else [self.fields.index(name) for name in fields]
+        return {
+            "level": level,
+            "fields": self.fields if fields is None else list(fields),
+            "t": np.array(rows["t"]),
+            "count": np.array(rows["count"]),
+            "mean": np.array(rows["mean"][:, columns]),
+            "max": np.array(rows["max"][:, columns]),
+        }
+
+    def pick_level(self, start):
+        """Finest level that still reaches back to start."""
+        if start is None:
+            return "daily"
+        for level in LEVEL_ORDER:
+            oldest = self.oldest(level)
+            if oldest is not None and oldest <= start:
+                return level
+        return "daily"
+
+class HealthStore:
+    """All series under one directory, opened lazily."""
+
+    def __init__(self, path):
+        self.path = path
+        self.series = {}
+        os.makedirs(path, exist_ok=True)
+
+    def get(self, series):
+        if series not in self.series:
+            kind = series.split(":", 1)[0]
+            if kind not in SERIES_FIELDS:
+                raise ValueError(f"Unknown series kind: {kind}")
+            self.series[series] = Series(os.path.join(self.path, series_dirname(series)), series, SERIES_FIELDS[kind])
+        return self.series[series]
+
+    def append(self, series, timestamp, values):
+        self.get(series).append(timestamp, values)
+
+    def flush(self):
+        for series in self.series.values():
+            series.flush()
+
+    def list_series(self):
+        names = []
+        for name in sorted(os.listdir(self.path)):
+            info_path = os.path.join(self.path, name, "series.json")
+            if os.path.exists(info_path):
+                with open(info_path, "r", encoding="utf-8") as f:
+                    names.append(json.load(f)["series"])
+        return names
+
+    def query(self, series, start=None, end=None, level="auto", fields=None):
+        return self.get(series).query(start, end, level, fields)
+
+    def record_smart(self, timestamp, disks):
+        """Appends the attributes of every disk in a report's "disks" list."""
+        for disk in disks:
+            if disk.get("device"):
+                self.append(f"smart:{disk['device']}", timestamp, smart_values(disk))
+
+    def record_io(self, timestamp, disk_io):
+        """Appends the per-disk rates of a daemon metrics record."""
+        for name, entry in disk_io.items():
+            if "busy_percent" in entry and not name.startswith(VIRTUAL_DISK_PREFIXES):
+                self.append(f"io:{name}", timestamp, entry)
+
+def smart_values(disk):
+    """Flattens one disk entry of the report into SMART_FIELDS."""
+    values = {}
+    for row in disk.get("smart_attributes") or []:
+        values[f"smart_{row.get('id')}"] = (row.get("raw") or {}).get("value")
+    nvme = disk.get("nvme_attributes") or {}
+    values["nvme_percentage_used"] = nvme.get("percentage_used")
+    values["nvme_critical_warning"] = nvme.get("critical_warning")
+    values["nvme_media_errors"] = nvme.get("media_errors")
+    values["temperature"] = disk.get("temperature")
+    return {name: float(value) for name, value in values.items() if isinstance(value, (int, float))}
+
+def default_store_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "health_store")
+
+def to_json(result):
+    return {
+        "level": result["level"],
+        "fields": result["fields"],
+        "t": result["t"].tolist(),
+        "count": result["count"].tolist(),
+        # NaN is not valid JSON
+        "mean": [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in result["mean"]],
+        "max": [[None if np.isnan(v) else round(float(v), 4) for v in row] for row in result["max"]],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the per-device health history")
+    parser.add_argument("series", type=str, nargs="?", help='Series name, e.g. "smart:/dev/sda" or "io:sda"')
+    parser.add_argument("--store", type=str, default=default_store_path(), help="Store directory")
+    parser.add_argument("--since", type=float, default=None, help="Start of the range, seconds ago")
+    parser.add_argument("--level", type=str, default="auto", choices=("auto",) + LEVEL_ORDER)
+    parser.add_argument("--fields", type=str, nargs="*", default=None, help="Only these attributes")
+    args = parser.parse_args()
+
+    store = HealthStore(args.store)
+    if not args.series:
+        print(json.dumps(store.list_series(), indent=2))
+        sys.exit(0)
+
+    start = time.time() - args.since if args.since is not None else None
+    try:
+        print(json.dumps(to_json(store.query(args.series, start, None, args.level, args.fields))))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
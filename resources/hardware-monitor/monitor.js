@@ -1,4 +1,5 @@
-const { execSync } = require('child_process');
+const { execFile, spawn } = require('child_process');
+const readline = require('readline');
 const fs = require('fs');
 const path = require('path');
 const ort = require('onnxruntime-node');
@@ -11,8 +12,64 @@ class HardwareMonitor {
         this.reportPath = path.resolve(options.reportPath || path.join(baseDir, 'health_report.json'));
         this.pythonPath = options.pythonPath || 'python';
         this.scriptPath = path.join(baseDir, 'hardware_monitor.py');
+        // Per-device SMART timeout passed to the collector, plus a ceiling for the whole run
+        this.smartTimeout = options.smartTimeout || 20;
+        this.reportTimeoutMs = options.reportTimeoutMs || 120000;
+        // Long-term SMART/IO history kept by the collector (ring buffers, see health_store.py)
+        this.storePath = path.resolve(options.storePath || path.join(baseDir, 'health_store'));
         this.history = this._loadHistory();
         this.session = null;
+        this.daemon = null;
+        this.latest = null;
+    }
+
+    /**
+     * Starts hardware_monitor.py in daemon mode. It keeps running, streaming one JSON
+     * line per interval; SMART data arrives on its own slower cadence. While it runs,
+     * getReport() answers from the latest records instead of spawning the script.
+     * @param {object} options - { interval, smartInterval } in seconds, onRecord callback
+     */
+    startDaemon(options = {}) {
+        if (this.daemon) return this.daemon;
+        const args = [
+            this.scriptPath, '--daemon',
+            '--interval', String(options.interval || 5),
+            '--smart_interval', String(options.smartInterval || 300),
+            '--timeout', String(this.smartTimeout),
+            '--store', this.storePath,
+            ...this._scoreArgs()
+        ];
+        const child = spawn(this.pythonPath, args);
+        child.on('error', (err) => {
+            console.error(`Failed to start hardware monitor daemon: ${err.message}`);
+            if (this.daemon === child) this.daemon = null;
+        });
+        const rl = readline.createInterface({ input: child.stdout });
+        rl.on('line', (line) => {
+            let record;
+            try {
+                record = JSON.parse(line);
+            } catch (e) {
+                return;
+            }
+            // Metrics come with every record, SMART fields only when a poll finished
+            this.latest = { ...(this.latest || {}), ...record };
+            if (options.onRecord) options.onRecord(record);
+        });
+        child.stderr.on('data', () => {}); // collector logs; drained so the pipe never fills
+        child.on('close', () => {
+            if (this.daemon === child) this.daemon = null;
+        });
+        this.daemon = child;
+        return child;
+    }
+
+    stopDaemon() {
+        if (this.daemon) {
+            // Closing stdin is the daemon's signal to exit cleanly
+            this.daemon.stdin.end();
+            this.daemon = null;
+        }
     }
 
     async init() {
@@ -23,13 +80,31 @@ class HardwareMonitor {
             return;
         }
         try {
-            this.session = await ort.InferenceSession.create(this.modelPath);
+            this.session = await ort.InferenceSession.create(this.modelPath, this._sessionOptions());
         } catch (e) {
             console.error(`Failed to initialize AI model session: ${e.message}`);
             this.loadFailed = true;
         }
     }
 
+    _sessionOptions() {
+        // Same knobs as resources/python/ort_session.py. The health model is tiny,
+        // so it takes a single thread instead of a pool sized to every core.
+        const levels = { disable: 'disabled', basic: 'basic', extended: 'extended', all: 'all' };
+        return {
+            intraOpNumThreads: 1,
+            interOpNumThreads: 1,
+            executionMode: process.env.NAS_ORT_EXECUTION_MODE || 'sequential',
+            graphOptimizationLevel: levels[process.env.NAS_ORT_OPT_LEVEL] || 'all'
+        };
+    }
+
+    _scoreArgs() {
+        // The collector scores every disk in one batched model call and keeps the
+        // delta history in the same file predict() uses (see health_scoring.py)
+        return ['--score', '--model', this.modelPath, '--history', this.historyPath];
+    }
+
     _loadHistory() {
         if (fs.existsSync(this.historyPath)) {
             try {
@@ -92,11 +167,12 @@ class HardwareMonitor {
         let mediaErrors = (nvmeData?.media_errors || 0) > 0 ? 1.0 : 0.0;
         vector.push(percentageUsed, criticalWarning, mediaErrors);
 
+        // Utilization of this disk's own I/O counters (the collector tags them with smart_device)
         let busyPct = 0;
         const diskIo = systemMetrics?.disk_io || {};
-        const firstDisk = Object.values(diskIo)[0];
-        if (firstDisk) {
-            busyPct = Math.min((firstDisk.busy_time || 0) / 1000.0, 1.0);
+        const ownIo = Object.values(diskIo).find(io => io.smart_device === deviceId);
+        if (ownIo) {
+            busyPct = Math.min(Math.max((ownIo.busy_percent || 0) / 100.0, 0), 1.0);
         }
         vector.push(busyPct);
 
@@ -120,13 +196,27 @@ class HardwareMonitor {
         return new Float32Array(vector);
     }
 
-    async getReport() {
-        try {
-            const output = execSync(`"${this.pythonPath}" "${this.scriptPath}"`, { encoding: 'utf8' });
-            return JSON.parse(output);
-        } catch (err) {
-            throw new Error(`Failed to run hardware monitor script: ${err.message}`);
+    getReport() {
+        if (this.daemon && this.latest && this.latest.disks) {
+            return Promise.resolve(this.latest);
         }
+        // Async so a slow disk never blocks the event loop; the collector queries disks in parallel.
+        // While the daemon runs (before its first SMART poll) this run is read-only: the daemon
+        // owns the health store and the store has no lock for a second writer.
+        const storeArgs = this.daemon ? [] : ['--store', this.storePath];
+        const args = [this.scriptPath, '--timeout', String(this.smartTimeout), ...storeArgs, ...this._scoreArgs()];
+        return new Promise((resolve, reject) => {
+            execFile(this.pythonPath, args, { encoding: 'utf8', timeout: this.reportTimeoutMs, maxBuffer: 16 * 1024 * 1024 }, (err, stdout) => {
+                if (err) {
+                    return reject(new Error(`Failed to run hardware monitor script: ${err.message}`));
+                }
+                try {
+                    resolve(JSON.parse(stdout));
+                } catch (e) {
+                    reject(new Error(`Failed to parse hardware monitor output: ${e.message}`));
+                }
+            });
+        });
     }
 
     async predict(smartTable, nvmeData, systemMetrics, deviceId = "unknown", smartPassed = null) {
@@ -171,25 +261,33 @@ class HardwareMonitor {
         const report = await this.getReport();
         const results = [];
 
+        // Disks the collector could not score (no numpy/onnxruntime there) go through predict()
+        if (report.disks.some(disk => disk.prediction)) this.history = this._loadHistory();
         for (const disk of report.disks) {
-            const prediction = await this.predict(
+            const prediction = disk.prediction || await this.predict(
                 disk.smart_attributes,
                 disk.nvme_attributes,
                 report.metrics,
                 disk.device || "unknown_disk",
                 disk.smart_status
             );
+            // Per-device load over the last interval (IOPS, throughput, utilization, latency)
+            const io = Object.values(report.metrics?.disk_io || {}).find(entry => entry.smart_device === disk.device) || disk.io || null;
             results.push({
                 device: disk.device,
                 model: disk.model,
-                prediction
+                prediction,
+                io
             });
         }
 
         return {
             timestamp: new Date().toISOString(),
             metrics: report.metrics,
-            disks: results
+            disks: results,
+            timed_out_devices: report.timed_out_devices || [],
+            // Spun-down disks are not woken; their entry (if any) is their last sample
+            standby_devices: report.standby_devices || []
         };
     }
 }
@@ -0,0 +1,155 @@
+import collections
+import os
+
+# Linux system metrics straight from /proc and /sys, without psutil or subprocesses.
+#
+# The /proc files are opened once and re-read in place (seek to 0, readinto a
+# buffer that is reused across samples), and only the lines that are needed are
+# parsed. Block device queue attributes from /sys/block/<disk>/queue are read
+# once per disk. Disk counters use psutil's field names so both sources can be
+# used interchangeably.
+
+PROC_STAT = "/proc/stat"
+PROC_MEMINFO = "/proc/meminfo"
+PROC_DISKSTATS = "/proc/diskstats"
+SYS_BLOCK = "/sys/block"
+# /proc/diskstats counts 512-byte sectors whatever the device's block size
+SECTOR_SIZE = 512
+# The aggregate "cpu" line is the first line of /proc/stat; the rest (per-CPU
+# lines, the interrupt table) can be several KB and is not needed
+CPU_LINE_BYTES = 256
+QUEUE_ATTRIBUTES = ("rotational", "logical_block_size", "physical_block_size", "nr_requests")
+
+DiskCounters = collections.namedtuple("DiskCounters", [
+    "read_count", "write_count", "read_bytes", "write_bytes",
+    "read_time", "write_time", "busy_time", "weighted_time", "in_flight",
+])
+
+def available():
+    return all(os.path.exists(path) for path in (PROC_STAT, PROC_MEMINFO, PROC_DISKSTATS))
+
+class ProcFile:
+    """A /proc file kept open and re-read into the same buffer."""
+
+    def __init__(self, path, size=4096, limit=None):
+        self.file = open(path, "rb", buffering=0)
+        self.limit = limit
+        self.buffer = bytearray(limit or size)
+
+    def read(self):
+        """Current content (up to limit bytes) as a memoryview into the buffer."""
+        self.file.seek(0)
+        view = memoryview(self.buffer)
+        length = 0
+        while True:
+            n = self.file.readinto(view[length:])
+            if not n:
+                break
+            length += n
+            if length == len(self.buffer):
+                if self.limit:
+                    break
+                # File outgrew the buffer (e.g. a disk was added): double it and keep reading
+                view.release()
+                self.buffer.extend(bytes(len(self.buffer)))
+                view = memoryview(self.buffer)
+        return view[:length]
+
+    def close(self):
+        self.file.close()
+
+def read_attribute(path):
+    try:
+        with open(path, "rb") as f:
+            value = f.read().strip()
+        return int(value) if value.isdigit() else value.decode("ascii", "replace")
+    except OSError:
+        return None
+
+class ProcCollector:
+    """CPU, memory and per-disk I/O counters for Linux, cheap enough to sample every second."""
+
+    def __init__(self):
+        self.stat = ProcFile(PROC_STAT, limit=CPU_LINE_BYTES)
+        self.meminfo = ProcFile(PROC_MEMINFO)
+        self.diskstats = ProcFile(PROC_DISKSTATS, size=16384)
+        self.prev_cpu = None
+        # Whole disks (names under /sys/block) with their queue attributes; partitions are skipped
+        self.queues = {}
+        self.partitions = set()
+
+    def close(self):
+        for proc_file in (self.stat, self.meminfo, self.diskstats):
+            proc_file.close()
+
+    def cpu_times(self):
+        """(busy, total) jiffies of the aggregate cpu line, counted the way psutil does."""
+        line = bytes(self.stat.read()).split(b"\n", 1)[0]
+        values = [int(v) for v in line.split()[1:]]
+        # user nice system idle iowait irq softirq steal guest guest_nice; guest time is already in user/nice
+        total = sum(values[:8])
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return total - idle, total
+
+    def cpu_percent(self):
+        """Utilization since the previous call (0.0 on the first), like psutil.cpu_percent(interval=None)."""
+        busy, total = self.cpu_times()
+        prev, self.prev_cpu = self.prev_cpu, (busy, total)
+        if prev is None or total <= prev[1]:
+            return 0.0
+        return round(100.0 * max(0, busy - prev[0]) / (total - prev[1]), 1)
+
+    def memory_percent(self):
+        """Used share of RAM as (MemTotal - MemAvailable) / MemTotal, like psutil.virtual_memory().percent."""
+        fields = {}
+        for line in bytes(self.meminfo.read()).split(b"\n"):
+            key, _, rest = line.partition(b":")
+            if key in (b"MemTotal", b"MemAvailable", b"MemFree", b"Buffers", b"Cached"):
+                fields[key] = int(rest.split()[0])
+                if b"MemTotal" in fields and b"MemAvailable" in fields:
+                    break
+        total = fields.get(b"MemTotal", 0)
+        if not total:
+            return 0.0
+        # Kernels before 3.14 have no MemAvailable
+        available = fields.get(b"MemAvailable", fields.get(b"MemFree", 0) + fields.get(b"Buffers", 0) + fields.get(b"Cached", 0))
+        return round(100.0 * (total - available) / total, 1)
+
+    def _is_disk(self, name):
+        if name in self.queues:
+            return True
+        if name in self.partitions:
+            return False
+        queue_dir = os.path.join(SYS_BLOCK, name, "queue")
+        if not os.path.isdir(queue_dir):
+            self.partitions.add(name)
+            return False
+        self.queues[name] = {attr: read_attribute(os.path.join(queue_dir, attr)) for attr in QUEUE_ATTRIBUTES}
+        return True
+
+    def disk_counters(self):
+        """{disk name: DiskCounters} for whole disks, in /proc/diskstats order."""
+        counters = {}
+        for line in bytes(self.diskstats.read()).split(b"\n"):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            name = fields[2].decode("ascii", "replace")
+            if not self._is_disk(name):
+                continue
+            counters[name] = DiskCounters(
+                read_count=int(fields[3]),
+                write_count=int(fields[7]),
+                read_bytes=int(fields[5]) * SECTOR_SIZE,
+                write_bytes=int(fields[9]) * SECTOR_SIZE,
+                read_time=int(fields[6]),
+                write_time=int(fields[10]),
+                in_flight=int(fields[11]),
+                busy_time=int(fields[12]),
+                weighted_time=int(fields[13]),
+            )
+        return counters
+
+    def queue_info(self, name):
+        """Attributes from /sys/block/<name>/queue (rotational, block sizes, nr_requests)."""
+        return self.queues.get(name)
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Memory use of concurrent model workers with and without shared weights
+# (NAS_ORT_SHARED_WEIGHTS, see python/ort_session.py).
+#
+# For each mode the installed (or given) Flan-T5 and BLIP models are loaded by
+# 1..N workers, laid out two ways:
+#   processes  N worker processes with one set of sessions each (several
+#              inference_worker.py / bridge.py processes)
+#   sessions   one process with N sets of sessions (flan_bridge's parallel map phase,
+#              concurrent caption workers in one process)
+# Every worker runs one inference first so lazily touched weights are counted.
+# While all workers are alive their memory is read and summed:
+#   rss_mb  resident memory; pages shared between processes are counted once per process
+#   pss_mb  proportional set size, shared pages split between their users (Linux only):
+#           the actual RAM the workers cost together
+#   uss_mb  memory private to the workers
+# Graph optimization and externalization run once in a warm-up worker beforehand,
+# so build-time garbage is not measured.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BLIP_DIR = os.path.join(BASE_DIR, "blip")
+PYTHON_DIR = os.path.join(BASE_DIR, "python")
+sys.path.insert(0, PYTHON_DIR)
+sys.path.insert(0, BLIP_DIR)
+
+MODES = ("normal", "shared")
+LAYOUTS = ("processes", "sessions")
+MODELS = ("flan", "blip")
+WORKERS = [1, 2, 3]
+DEFAULT_FLAN_DIR = os.path.join(PYTHON_DIR, "flan_t5_onnx")
+DOCUMENT_CHARS = 2000
+
+def log(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def process_memory(pid):
+    """{"rss_mb", "pss_mb", "uss_mb"} of one process; pss_mb is None where the OS does not report it."""
+    try:
+        fields = {}
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+        return {
+            "rss_mb": fields["Rss"] / 1024,
+            "pss_mb": fields["Pss"] / 1024,
+            "uss_mb": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+        }
+    except (OSError, KeyError):
+        pass
+    import psutil
+    info = psutil.Process(pid).memory_full_info()
+    pss = getattr(info, "pss", None)
+    return {
+        "rss_mb": info.rss / 2**20,
+        "pss_mb": pss / 2**20 if pss is not None else None,
+        "uss_mb": info.uss / 2**20,
+    }
+
+def blip_files(blip_dir):
+    return {
+        "vision": os.path.join(blip_dir, "vision_model.onnx"),
+        "text": os.path.join(blip_dir, "text_decoder_model.onnx"),
+        "init": os.path.join(blip_dir, "text_decoder_init.onnx"),
+        "past": os.path.join(blip_dir, "text_decoder_with_past.onnx"),
+    }
+
+# --- Worker (child process) ---
+
+def load_workers(models, sessions, flan_dir, blip_dir):
+    """Loads sessions sets of each model and runs one inference on every set."""
+    import numpy as np
+    loaded = []
+    if "flan" in models:
+        import flan_bridge
+        import bench_summarize
+        flan_models, tokenizer = flan_bridge.load_models(flan_dir, sessions)
+        text = bench_summarize.synthetic_document(DOCUMENT_CHARS)
+        chunk_ids = [flan_bridge.chunk_text(text, tokenizer)[0]["input_ids"]]
+        for model in flan_models:
+            flan_bridge.generate_summaries(chunk_ids, model, tokenizer)
+        loaded.append((flan_models, tokenizer))
+    if "blip" in models:
+        import bridge
+        from transformers import BlipProcessor
+        has_processor = os.path.exists(os.path.join(blip_dir, "preprocessor_config.json"))
+        processor = BlipProcessor.from_pretrained(blip_dir if has_processor else bridge.MODEL_ID)
+        pixel_values = np.zeros((1, 3, bridge.IMAGE_SIZE, bridge.IMAGE_SIZE), dtype=np.float32)
+        blip_models = [bridge.load_models(files=blip_files(blip_dir), processor=processor) for _ in range(sessions)]
+        for worker in blip_models:
+            bridge.caption_batch(worker, pixel_values)
+        loaded.append(blip_models)
+    return loaded
+
+def run_worker(args):
+    import ort_session
+    ort_session.configure(workers=args.sessions, shared_weights=args.mode == "shared")
+    loaded = load_workers(args.models, args.sessions, args.flan_dir, args.blip_dir)
+    print("ready", flush=True)
+    # Stay alive (and keep the models) until the parent has measured every worker
+    sys.stdin.read()
+    del loaded
+
+# --- Measurement (parent process) ---
+
+def spawn_workers(mode, processes, sessions, args, env):
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--mode", mode, "--sessions", str(sessions),
+               "--models", *args.models, "--flan_dir", args.flan_dir, "--blip_dir", args.blip_dir]
+    children = [subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                for _ in range(processes)]
+    try:
+        for child in children:
+            if child.stdout.readline().strip() != "ready":
+                raise RuntimeError(f"{mode} worker failed to load (exit code {child.wait()})")
+        usage = [process_memory(child.pid) for child in children]
+    finally:
+        for child in children:
+            child.stdin.close()
+            child.wait()
+    total = {}
+    for key in ("rss_mb", "pss_mb", "uss_mb"):
+        values = [u[key] for u in usage]
+        total[key] = round(sum(values), 1) if None not in values else None
+    return total
+
+def savings(normal, shared):
+    """Percentage of PSS (RSS where the OS has no PSS) saved by shared weights."""
+    key = "pss_mb" if normal["pss_mb"] is not None else "rss_mb"
+    return round(100.0 * (normal[key] - shared[key]) / normal[key], 1)
+
+def run_benchmark(args):
+    optimized_dir = tempfile.mkdtemp(prefix="nas-ai-memory-")
+    env = dict(os.environ, NAS_ORT_OPTIMIZED_DIR=optimized_dir)
+    results = {mode: {layout: {} for layout in LAYOUTS} for mode in MODES}
+    try:
+        for mode in MODES:
+            log(f"Preparing {mode} graphs...")
+            spawn_workers(mode, 1, 1, args, env)
+            for n in args.workers:
+                for layout in LAYOUTS:
+                    log(f"Measuring {mode}, {n} worker(s) as {layout}...")
+                    processes, sessions = (n, 1) if layout == "processes" else (1, n)
+                    results[mode][layout][str(n)] = spawn_workers(mode, processes, sessions, args, env)
+    finally:
+        shutil.rmtree(optimized_dir, ignore_errors=True)
+    saved = {
+        layout: {n: savings(results["normal"][layout][n], results["shared"][layout][n]) for n in results["normal"][layout]}
+        for layout in LAYOUTS
+    }
+    return results, saved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of concurrent model workers with and without shared weights")
+    parser.add_argument("--models", type=str, nargs="+", default=list(MODELS), choices=MODELS, help="Models every worker loads")
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKERS, help="Worker counts to measure")
+    parser.add_argument("--flan_dir", type=str, default=DEFAULT_FLAN_DIR, help="Flan-T5 ONNX folder")
+    parser.add_argument("--blip_dir", type=str, default=BLIP_DIR, help="Folder with the BLIP ONNX files (and optionally its processor)")
+    parser.add_argument("--output", type=str, default=None, help="Also write the report to this JSON file")
+    # Internal: load the models in this process and wait for the parent to measure it
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--mode", type=str, default="normal", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--sessions", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        sys.exit(0)
+
+    try:
+        results, saved = run_benchmark(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "models": {"flan": os.path.abspath(args.flan_dir) if "flan" in args.models else None,
+                   "blip": os.path.abspath(args.blip_dir) if "blip" in args.models else None},
+        "results": results,
+        "saved_percent": saved,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
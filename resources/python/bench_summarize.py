@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import flan_bridge
+
+# Compares the chunk-at-a-time generate loop (batch size 1) against batched
+# generation for documents of several sizes. Documents are synthetic unless
+# files are given; each configuration runs once after a warm-up call.
+
+WORDS = (
+    "storage disk photo backup folder network share drive file user server "
+    "temperature sector report schedule access archive volume cluster system"
+).split()
+
+def synthetic_document(chars, seed=0):
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < chars:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 20))]
+        sentence = " ".join(words).capitalize() + "."
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)[:chars]
+
+def time_summarize(text, model, tokenizer, batch_size):
+    chunk_ids = [chunk["input_ids"] for chunk in flan_bridge.chunk_text(text, tokenizer)]
+    start = time.perf_counter()
+    summaries = flan_bridge.generate_summaries(chunk_ids, model, tokenizer, batch_size)
+    return time.perf_counter() - start, len(chunk_ids), summaries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of batched vs one-chunk-at-a-time Flan-T5 generation")
+    parser.add_argument("files", type=str, nargs="*", help="Documents to summarize (synthetic if omitted)")
+    parser.add_argument("--model_dir", type=str, default="flan_t5_onnx", help="Directory containing the ONNX model")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000, 200000], help="Synthetic document sizes (chars)")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[2, 4, 8], help="Batch sizes to compare with 1")
+    args = parser.parse_args()
+
+    model_dir = args.model_dir
+    if not os.path.isabs(model_dir):
+        model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), model_dir)
+    if not os.path.exists(model_dir):
+        print(f"Error: model not found at {model_dir}. Run setup_models.py first.", file=sys.stderr)
+        sys.exit(1)
+
+    model, tokenizer = flan_bridge.load_model(model_dir)
+    if args.files:
+        documents = [(os.path.basename(path), flan_bridge.read_file(path)) for path in args.files]
+    else:
+        documents = [(f"synthetic_{size}", synthetic_document(size)) for size in args.sizes]
+
+    # Warm up the sessions once
+    time_summarize(synthetic_document(1000), model, tokenizer, 1)
+
+    report = []
+    for name, text in documents:
+        loop_seconds, chunks, loop_summaries = time_summarize(text, model, tokenizer, 1)
+        entry = {
+            "document": name,
+            "chars": len(text),
+            "chunks": chunks,
+            "loop": {"seconds": round(loop_seconds, 3), "chunks_per_s": round(chunks / loop_seconds, 3)},
+            "batched": [],
+        }
+        for batch_size in args.batch_sizes:
+            seconds, _, summaries = time_summarize(text, model, tokenizer, batch_size)
+            entry["batched"].append({
+                "batch_size": batch_size,
+                "seconds": round(seconds, 3),
+                "chunks_per_s": round(chunks / seconds, 3),
+                "speedup": round(loop_seconds / seconds, 2),
+                # Padding can shift beam scores by float rounding; report how often the text changed
+                "identical_summaries": sum(a == b for a, b in zip(summaries, loop_summaries)),
+            })
+        report.append(entry)
+        flan_bridge.log(f"{name}: {chunks} chunks done.")
+
+    print(json.dumps(report, indent=2))
@@ -1,73 +1,456 @@
 import argparse
+import bisect
+import heapq
+import itertools
+import math
 import os
+import re
 import sys
 import json
-from optimum.onnxruntime import ORTModelForSeq2SeqLM
-from transformers import AutoTokenizer
-import docx
+import zipfile
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+import result_cache
+import model_manifest
+import ort_session
+
+MODEL_ID = "google/flan-t5-small"
+MAX_INPUT_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 0
+PROMPT_PREFIX = "summarize: "
+# Chunks per generate call. bench_summarize.py, 60000-char document (19 chunks), 1 vCPU:
+# 0.30 chunks/s at 1, 0.39 at 2, 0.49 at 4, 0.47 at 8 (identical summaries)
+SUMMARY_BATCH_SIZE = 4
+SUMMARY_MODES = ("flat", "hierarchical")
+FAN_IN = 4
+# Sentence ends (punctuation plus closing quotes/brackets, before whitespace) and line breaks
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*(?=\s)|\n")
+# Output budget: rough size of one chunk summary, and the bonus for chunks near the start of the document
+CHARS_PER_TOKEN = 4
+LEAD_WEIGHT = 0.5
+# Rounds' worth of best-ranked chunks kept while streaming a document for the output budget
+BUDGET_ROUNDS = 4
+KEYWORD = re.compile(r"[a-z]{4,}")
+# Streaming readers: read size for .txt, and how much text the chunker tokenizes at a time
+TEXT_BLOCK_SIZE = 64 * 1024
+STREAM_BUFFER_CHARS = 256 * 1024
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+GENERATION_KWARGS = {
+    "max_length": 75,
+    "min_length": 20,
+    "length_penalty": 2.0,
+    "num_beams": 4,
+    "early_stopping": True,
+    "no_repeat_ngram_size": 3,
+    "repetition_penalty": 1.2,
+}
 
 # Redirect stderr for logging
 def log(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
-def read_file(file_path):
+def iter_txt(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(TEXT_BLOCK_SIZE), ""):
+            yield block
+
+def iter_docx(file_path):
+    """Paragraph text from word/document.xml, parsed incrementally instead of building the whole document model."""
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        parts = []
+        for event, elem in ElementTree.iterparse(xml, events=("end",)):
+            if elem.tag == WORD_NS + "t":
+                parts.append(elem.text or "")
+            elif elem.tag == WORD_NS + "tab":
+                parts.append("\t")
+            elif elem.tag in (WORD_NS + "br", WORD_NS + "cr"):
+                parts.append("\n")
+            elif elem.tag == WORD_NS + "p":
+                yield "".join(parts) + "\n"
+                parts = []
+                elem.clear()
+
+def iter_pdf(file_path):
+    """Extracts one page at a time."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("PDF support requires the pypdf package (pip install pypdf).")
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        text = page.extract_text() or ""
+        if text:
+            yield text + "\n"
+
+READERS = {".txt": iter_txt, ".docx": iter_docx, ".pdf": iter_pdf}
+
+def iter_document(file_path):
+    """Yields the document text in blocks, so memory tracks the block size rather than the file size."""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
-        
+
     ext = os.path.splitext(file_path)[1].lower()
-    if ext == ".txt":
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
-    elif ext == ".docx":
-        doc = docx.Document(file_path)
-        return "\n".join([para.text for para in doc.paragraphs])
-    else:
-        raise ValueError(f"Unsupported file extension: {ext}. Only .txt and .docx are supported.")
+    if ext not in READERS:
+        raise ValueError(f"Unsupported file extension: {ext}. Only .txt, .docx and .pdf are supported.")
+    return READERS[ext](file_path)
+
+def read_file(file_path):
+    return "".join(iter_document(file_path))
+
+def sentence_token_bounds(text, offsets):
+    """Token indices where a sentence or paragraph starts, plus the end of the text."""
+    starts = [start for start, _ in offsets]
+    bounds = [0]
+    for match in SENTENCE_END.finditer(text):
+        index = bisect.bisect_left(starts, match.end())
+        if bounds[-1] < index < len(offsets):
+            bounds.append(index)
+    bounds.append(len(offsets))
+    return bounds
+
+def chunk_text(text, tokenizer, max_tokens=MAX_INPUT_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Packs whole sentences into chunks that fill the model's input window.
+
+    The text is tokenized once; chunks carry ready-made input IDs (prompt prefix
+    and EOS included), so nothing is truncated later. Sentences longer than the
+    window are split at token boundaries. With overlap_tokens, each chunk repeats
+    the trailing sentences of the previous one that fit in that many tokens.
+    """
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    ids = encoding["input_ids"]
+    offsets = encoding["offset_mapping"]
+    if not ids:
+        return []
+
+    prefix_ids = tokenizer(PROMPT_PREFIX, add_special_tokens=False)["input_ids"]
+    budget = max_tokens - len(prefix_ids) - 1
+    overlap_tokens = min(overlap_tokens, budget // 2)
+
+    bounds = sentence_token_bounds(text, offsets)
+    pieces = []
+    for start, end in zip(bounds, bounds[1:]):
+        for piece_start in range(start, end, budget):
+            pieces.append((piece_start, min(piece_start + budget, end)))
 
-def chunk_text(text, chunk_size=2000):
     chunks = []
-    for i in range(0, len(text), chunk_size):
-        chunks.append(text[i:i+chunk_size])
+    i = 0
+    while i < len(pieces):
+        start = pieces[i][0]
+        j = i + 1
+        while j < len(pieces) and pieces[j][1] - start <= budget:
+            j += 1
+        end = pieces[j - 1][1]
+        chunks.append({
+            "start": offsets[start][0],
+            "text": text[offsets[start][0]:offsets[end - 1][1]],
+            "input_ids": prefix_ids + ids[start:end] + [tokenizer.eos_token_id],
+        })
+        if j == len(pieces):
+            break
+        # Step back over trailing sentences that fit the overlap and still leave room for the next one
+        next_size = pieces[j][1] - pieces[j][0]
+        k = j
+        while k > i + 1 and end - pieces[k - 1][0] <= overlap_tokens and end - pieces[k - 1][0] + next_size <= budget:
+            k -= 1
+        i = k
     return chunks
 
-def summarize(text, model_path):
+def iter_chunks(blocks, tokenizer, max_tokens=MAX_INPUT_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Chunks a stream of text blocks as it arrives.
+
+    Text is buffered up to STREAM_BUFFER_CHARS and chunked; every chunk but the
+    last is emitted. The last one may stop at the buffer edge mid-sentence, so
+    its text is carried over and chunked again with what follows; only that
+    tail is ever tokenized twice.
+    """
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        if len(buffer) < STREAM_BUFFER_CHARS:
+            continue
+        chunks = chunk_text(buffer, tokenizer, max_tokens, overlap_tokens)
+        if not chunks:
+            buffer = ""
+        elif len(chunks) > 1:
+            yield from chunks[:-1]
+            buffer = buffer[chunks[-1]["start"]:]
+    yield from chunk_text(buffer, tokenizer, max_tokens, overlap_tokens)
+
+def variant_dir(model_dir, precision="fp32"):
+    """Quantized exports live in a sibling folder, e.g. flan_t5_onnx_int8."""
+    return model_dir if precision == "fp32" else f"{model_dir}_{precision}"
+
+def resolve_model_dir(model_dir, precision="fp32"):
+    """Falls back to fp32 unless the requested variant exists and passed setup's accuracy gate."""
+    if precision == "fp32":
+        return model_dir
+    path = variant_dir(model_dir, precision)
+    if model_manifest.is_enabled("flan", precision) and os.path.exists(os.path.join(path, "encoder_model.onnx")):
+        return path
+    log(f"Flan-T5 {precision} variant is not available or not enabled, using fp32.")
+    return model_dir
+
+def load_model(model_path):
+    """Loads the ONNX model and tokenizer once so they can be reused across documents."""
     log(f"Loading model from {model_path}...")
+    # Imported here so cache hits never pay for loading the ML stack
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
     try:
-        model = ORTModelForSeq2SeqLM.from_pretrained(model_path)
+        model = load_shared_model(model_path) if ort_session.shared_weights() else None
+        if model is None:
+            # Graphs are optimized once and cached; the session then skips the optimization pass
+            optimized_path = ort_session.optimized_model_dir(model_path)
+            opt_level = "disable" if optimized_path != model_path else None
+            model = ORTModelForSeq2SeqLM.from_pretrained(
+                optimized_path, session_options=ort_session.session_options(opt_level)
+            )
         tokenizer = AutoTokenizer.from_pretrained(model_path)
     except Exception as e:
         log(f"Error loading model: {e}")
         raise e
+    return model, tokenizer
 
-    chunks = chunk_text(text)
-    log(f"Document length: {len(text)} chars. Splitting into {len(chunks)} chunks.")
-    
-    summaries = []
-    for i, chunk in enumerate(chunks):
-        log(f"Processing chunk {i+1}/{len(chunks)}...")
-        input_text = "summarize: " + chunk
-        inputs = tokenizer(input_text, return_tensors="pt", max_length=512, truncation=True)
-        
-        outputs = model.generate(
-            **inputs, 
-            max_length=75, 
-            min_length=20, 
-            length_penalty=2.0, 
-            num_beams=4, 
-            early_stopping=True,
-            no_repeat_ngram_size=3,
-            repetition_penalty=1.2
+def load_shared_model(model_path):
+    """Builds the model from ort_session.shared_session sessions, whose weights are memory-mapped
+    and shared with every other session of the same graphs; None if that fails.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoConfig, GenerationConfig
+    try:
+        shared_dir = ort_session.shared_model_dir(model_path)
+        sessions = {}
+        for name in ("encoder_model", "decoder_model", "decoder_with_past_model"):
+            path = os.path.join(shared_dir, f"{name}.onnx")
+            sessions[name] = ort_session.shared_session(path) if os.path.exists(path) else None
+        config = AutoConfig.from_pretrained(model_path)
+        try:
+            generation_config = GenerationConfig.from_pretrained(model_path)
+        except OSError:
+            generation_config = GenerationConfig.from_model_config(config)
+        return ORTModelForSeq2SeqLM(
+            config=config,
+            encoder_session=sessions["encoder_model"],
+            decoder_session=sessions["decoder_model"],
+            decoder_with_past_session=sessions["decoder_with_past_model"],
+            generation_config=generation_config,
+            model_save_dir=shared_dir,
         )
-        chunk_summary = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        summaries.append(chunk_summary)
-        
-    final_summary = " ".join(summaries)
-    return final_summary
+    except Exception as e:
+        log(f"Loading {model_path} without shared weights: {e}")
+        return None
+
+def load_models(model_path, count):
+    """Loads count independent sessions of the model for the parallel map phase.
+
+    Call ort_session.configure(workers=count) first so the sessions split the
+    thread budget instead of each taking every core.
+    """
+    models = []
+    for _ in range(count):
+        model, tokenizer = load_model(model_path)
+        models.append(model)
+    return models, tokenizer
+
+def generate_summaries(chunk_ids, model, tokenizer, batch_size=SUMMARY_BATCH_SIZE):
+    """Runs generate over padded batches of chunks; results come back in input order.
+
+    model may also be a list of separately loaded models: batches are then
+    shared out between them, one thread per model (ORT releases the GIL).
+    """
+    models = model if isinstance(model, list) else [model]
+    # Batch chunks of similar length so little work goes to padding; the sort is stable, so deterministic
+    order = sorted(range(len(chunk_ids)), key=lambda i: len(chunk_ids[i]))
+    batches = deque(enumerate(order[start:start + batch_size] for start in range(0, len(order), batch_size)))
+    total = len(batches)
+    summaries = [None] * len(chunk_ids)
+
+    def work(worker_model):
+        while True:
+            try:
+                n, batch = batches.popleft()
+            except IndexError:
+                return
+            log(f"Processing batch {n+1}/{total} ({len(batch)} chunks)...")
+            inputs = tokenizer.pad({"input_ids": [chunk_ids[i] for i in batch]}, return_tensors="pt")
+            outputs = worker_model.generate(**inputs, **GENERATION_KWARGS)
+            for i, summary in zip(batch, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                summaries[i] = summary
+
+    if len(models) == 1:
+        work(models[0])
+    else:
+        with ThreadPoolExecutor(max_workers=len(models)) as pool:
+            for future in [pool.submit(work, m) for m in models]:
+                future.result()
+    return summaries
+
+def chunk_score(words, document_counts, seen, position):
+    """How representative a chunk (given as a keyword set) looks; higher is better.
+
+    The average share of the chunks seen so far that contain each of its words,
+    plus a bonus that decays with position (openings usually state the topic).
+    Cheap word counting only; no model calls.
+    """
+    centrality = sum(document_counts[word] for word in words) / (len(words) * seen) if words else 0.0
+    return centrality + LEAD_WEIGHT / (1 + position)
+
+def select_chunks(chunks, limit):
+    """Streams chunks and keeps the limit most representative ones; returns [(position, input_ids)] best first
+    and the number of chunks read.
+
+    Only the candidates in a bounded min-heap (keywords and compact token IDs)
+    and the document's word counts are held, never the whole document. A chunk
+    is admitted on its score against the words seen so far; the survivors are
+    re-scored against the whole document before ranking.
+    """
+    document_counts = {}
+    heap = []
+    seen = 0
+    for position, chunk in enumerate(chunks):
+        words = set(KEYWORD.findall(chunk["text"].lower()))
+        for word in words:
+            document_counts[word] = document_counts.get(word, 0) + 1
+        seen += 1
+        score = chunk_score(words, document_counts, seen, position)
+        # Ties go to the earlier chunk, so the lowest entry is the latest of the weakest
+        entry = (score, -position, position, words, array("i", chunk["input_ids"]))
+        if len(heap) < limit:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    ranked = sorted(heap, key=lambda entry: (-chunk_score(entry[3], document_counts, seen, entry[2]), entry[2]))
+    return [(entry[2], entry[4]) for entry in ranked], seen
+
+def summarize_within_budget(chunks, model, tokenizer, batch_size, max_chars):
+    """Summarizes the best-ranked chunks until the joined summary reaches max_chars."""
+    # Only as many chunks per round as the budget is likely to need
+    per_chunk = GENERATION_KWARGS["min_length"] * CHARS_PER_TOKEN
+    round_size = max(1, min(batch_size, math.ceil(max_chars / per_chunk)))
+    selected, total = select_chunks(chunks, round_size * BUDGET_ROUNDS)
+
+    summaries = {}
+    for start in range(0, len(selected), round_size):
+        batch = selected[start:start + round_size]
+        results = generate_summaries([list(input_ids) for _, input_ids in batch], model, tokenizer, batch_size)
+        summaries.update(zip((position for position, _ in batch), results))
+        if len(" ".join(summaries.values())) >= max_chars:
+            break
+    log(f"Output budget of {max_chars} chars met after {len(summaries)}/{total} chunks.")
+    # Keep document order in the output
+    return [summaries[i] for i in sorted(summaries)]
+
+def map_chunks(chunks, model, tokenizer, batch_size):
+    """Summarizes a chunk stream a window of batches at a time, keeping only the summaries."""
+    # Windows of a few batches still let generate_summaries group chunks by length
+    window_size = batch_size * 4 * (len(model) if isinstance(model, list) else 1)
+    summaries = []
+    window = []
+    for chunk in chunks:
+        window.append(chunk["input_ids"])
+        if len(window) == window_size:
+            summaries.extend(generate_summaries(window, model, tokenizer, batch_size))
+            window = []
+    if window:
+        summaries.extend(generate_summaries(window, model, tokenizer, batch_size))
+    log(f"Summarized {len(summaries)} chunks.")
+    return summaries
+
+def summarize_hierarchical(chunks, model, tokenizer, batch_size, fan_in):
+    """Map-reduce: summarizes every chunk, then groups of fan_in summaries, until one window holds the rest."""
+    summaries = map_chunks(chunks, model, tokenizer, batch_size)
+    rounds = 0
+    while len(summaries) > 1:
+        groups = chunk_text(" ".join(summaries), tokenizer)
+        if len(groups) > 1:
+            groups = [
+                group
+                for start in range(0, len(summaries), fan_in)
+                for group in chunk_text(" ".join(summaries[start:start + fan_in]), tokenizer)
+            ]
+            if len(groups) >= len(summaries):
+                log("Reduce round would not shrink the summaries; stopping.")
+                break
+        summaries = generate_summaries([group["input_ids"] for group in groups], model, tokenizer, batch_size)
+        rounds += 1
+        log(f"Reduce round {rounds}: {len(summaries)} summaries left.")
+    return summaries
+
+def summarize(text, model, tokenizer, overlap_tokens=CHUNK_OVERLAP_TOKENS, batch_size=SUMMARY_BATCH_SIZE,
+              max_chars=None, mode="flat", fan_in=FAN_IN):
+    """Summarizes a string or an iterable of text blocks (e.g. from iter_document)."""
+    blocks = [text] if isinstance(text, str) else text
+    chunks = iter_chunks(blocks, tokenizer, overlap_tokens=overlap_tokens)
+
+    if mode == "hierarchical":
+        summaries = summarize_hierarchical(chunks, model, tokenizer, batch_size, fan_in)
+    elif max_chars:
+        summaries = summarize_within_budget(chunks, model, tokenizer, batch_size, max_chars)
+    else:
+        summaries = map_chunks(chunks, model, tokenizer, batch_size)
+    return " ".join(summaries)
+
+def summary_params(overlap_tokens=CHUNK_OVERLAP_TOKENS, max_chars=None, mode="flat", fan_in=FAN_IN):
+    """Everything that changes the summary for a given file; part of the result cache key."""
+    return {
+        "chunker": "sentence_tokens",
+        "max_input_tokens": MAX_INPUT_TOKENS,
+        "overlap_tokens": overlap_tokens,
+        "mode": mode,
+        "fan_in": fan_in if mode == "hierarchical" else None,
+        "max_chars": max_chars if mode == "flat" else None,
+        "budget_rounds": BUDGET_ROUNDS if mode == "flat" and max_chars else None,
+        **GENERATION_KWARGS,
+    }
+
+def summarize_file(file_path, model_path, get_model, cache=None, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                   batch_size=SUMMARY_BATCH_SIZE, max_chars=None, mode="flat", fan_in=FAN_IN):
+    """Summarizes a file, serving duplicates from the cache without loading the model."""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    key = None
+    if cache is not None:
+        identity = result_cache.model_fingerprint(MODEL_ID, [
+            os.path.join(model_path, "encoder_model.onnx"),
+            os.path.join(model_path, "decoder_model.onnx"),
+        ])
+        key = result_cache.make_key(result_cache.hash_file(file_path), identity,
+                                     summary_params(overlap_tokens, max_chars, mode, fan_in))
+        cached = cache.get(key)
+        if cached is not None:
+            log("Summary served from cache.")
+            return cached
+
+    # Text is streamed into the chunker; only peek far enough to skip loading the model for empty files
+    blocks = iter_document(file_path)
+    first = next((block for block in blocks if block.strip()), None)
+    if first is None:
+        log("File is empty.")
+        return ""
+
+    model, tokenizer = get_model()
+    summary = summarize(itertools.chain([first], blocks), model, tokenizer, overlap_tokens, batch_size, max_chars, mode, fan_in)
+    if cache is not None:
+        cache.put(key, "summarize", summary)
+    return summary
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Summarize document for Node.js integration")
-    parser.add_argument("file_path", type=str, help="Path to .txt or .docx file")
+    parser.add_argument("file_path", type=str, help="Path to .txt, .docx or .pdf file")
     parser.add_argument("--model_dir", type=str, default="flan_t5_onnx", help="Directory containing the ONNX model")
+    parser.add_argument("--cache", type=str, default=None, help="Result cache database (default: per-user cache dir)")
+    parser.add_argument("--no_cache", action="store_true", help="Always run inference, never read or write the cache")
+    parser.add_argument("--precision", type=str, default="fp32", choices=model_manifest.PRECISIONS, help="Model variant to run")
+    parser.add_argument("--overlap_tokens", type=int, default=CHUNK_OVERLAP_TOKENS, help="Tokens of context repeated between consecutive chunks")
+    parser.add_argument("--batch_size", type=int, default=SUMMARY_BATCH_SIZE, help="Chunks per generate call")
+    parser.add_argument("--max_chars", type=int, default=None, help="Output budget; stop once the summary is this long (flat mode)")
+    parser.add_argument("--mode", type=str, default="flat", choices=SUMMARY_MODES,
+                        help="flat: join the chunk summaries; hierarchical: summarize them again until one remains")
+    parser.add_argument("--fan_in", type=int, default=FAN_IN, help="Summaries combined per reduce step (hierarchical mode)")
+    parser.add_argument("--workers", type=int, default=1, help="Model sessions generating chunk summaries in parallel")
     args = parser.parse_args()
 
     # Determine absolute path to model dir relative to script location if not provided purely absolute
@@ -75,17 +458,22 @@ if __name__ == "__main__":
     model_dir = args.model_dir
     if not os.path.isabs(model_dir):
         model_dir = os.path.join(script_dir, model_dir)
+    model_dir = resolve_model_dir(model_dir, args.precision)
+
+    if args.fan_in < 2:
+        log("Error: --fan_in must be at least 2.")
+        sys.exit(1)
+    if args.workers > 1:
+        ort_session.configure(workers=args.workers)
 
     try:
-        content = read_file(args.file_path)
-        if not content.strip():
-            log("File is empty.")
-            print("") # Empty output
-        else:
-            summary = summarize(content, model_dir)
-            # Output ONLY the summary to stdout
-            print(summary)
-            sys.stdout.flush()
+        cache = None if args.no_cache else result_cache.ResultCache(args.cache)
+        get_model = lambda: load_models(model_dir, args.workers) if args.workers > 1 else load_model(model_dir)
+        summary = summarize_file(args.file_path, model_dir, get_model, cache, args.overlap_tokens,
+                                 args.batch_size, args.max_chars, args.mode, args.fan_in)
+        # Output ONLY the summary to stdout
+        print(summary)
+        sys.stdout.flush()
             
     except Exception as e:
         log(f"Error: {e}")
@@ -0,0 +1,216 @@
+import argparse
+import base64
+import importlib.util
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# The BLIP bridge ships in a sibling resources folder
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BLIP_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "blip")
+sys.path.insert(0, BLIP_DIR)
+
+import flan_bridge
+import result_cache
+import model_manifest
+import ort_session
+import embedding_index
+
+# Redirect stderr for logging
+def log(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class InferenceWorker:
+    """Keeps the BLIP and Flan-T5 models loaded and serves caption/summarize jobs."""
+
+    def __init__(self, model_dir, cache=None, precision="fp32", dedup_threshold=None, dedup_index=None):
+        self.precision = precision
+        self.model_dir = flan_bridge.resolve_model_dir(model_dir, precision)
+        self.blip_precision = None
+        self.cache = cache
+        self.blip_models = None
+        self.flan_model = None
+        self.dedup_threshold = dedup_threshold
+        self.dedup_index = dedup_index
+        self.embedding_index = None
+        self.load_lock = threading.Lock()
+
+    def get_blip(self):
+        with self.load_lock:
+            if self.blip_models is None:
+                import bridge as blip_bridge
+                log("Loading BLIP models...")
+                self.blip_models = blip_bridge.load_models(self.get_blip_precision())
+            return self.blip_models
+
+    def get_blip_precision(self):
+        if self.blip_precision is None:
+            import bridge as blip_bridge
+            self.blip_precision = blip_bridge.resolve_precision(self.precision)
+        return self.blip_precision
+
+    def get_index(self):
+        """Near-duplicate caption index, or None when disabled."""
+        if self.dedup_threshold is None:
+            return None
+        with self.load_lock:
+            if self.embedding_index is None:
+                import bridge as blip_bridge
+                self.embedding_index = blip_bridge.open_index(
+                    self.dedup_index, self.get_blip_precision(), self.dedup_threshold
+                )
+            return self.embedding_index
+
+    def get_flan(self):
+        with self.load_lock:
+            if self.flan_model is None:
+                self.flan_model = flan_bridge.load_model(self.model_dir)
+            return self.flan_model
+
+    def caption(self, job):
+        import bridge as blip_bridge
+        # A job may carry a whole batch of images; the result is then a list in the same order
+        if "data" in job:
+            # In-memory image (base64) from a caller that already holds the bytes
+            paths = [base64.b64decode(job["data"])]
+        elif "shm" in job:
+            paths = [blip_bridge.read_shm_image(job["shm"], job["size"])]
+        else:
+            paths = job["paths"] if "paths" in job else [job["path"]]
+        captions = blip_bridge.caption_files(
+            paths, self.get_blip, self.cache, job.get("batch_size", 8), self.get_blip_precision(), self.get_index()
+        )
+        return captions if "paths" in job else captions[0]
+
+    def summarize(self, job):
+        return flan_bridge.summarize_file(
+            job["path"], self.model_dir, self.get_flan, self.cache,
+            batch_size=job.get("batch_size", flan_bridge.SUMMARY_BATCH_SIZE),
+            max_chars=job.get("max_chars"),
+            mode=job.get("mode", "flat"),
+            fan_in=job.get("fan_in", flan_bridge.FAN_IN)
+        )
+
+    def handle(self, job):
+        """Runs a single job and returns the response tagged with its ID."""
+        job_id = job.get("id")
+        task = job.get("task")
+        try:
+            if task == "caption":
+                result = self.caption(job)
+            elif task == "summarize":
+                result = self.summarize(job)
+            elif task == "cache_stats":
+                result = self.cache.stats() if self.cache is not None else None
+            elif task == "ping":
+                result = "pong"
+            else:
+                raise ValueError(f"Unknown task: {task}")
+            return {"id": job_id, "ok": True, "result": result}
+        except Exception as e:
+            log(f"Job {job_id} ({task}) failed: {e}")
+            return {"id": job_id, "ok": False, "error": str(e)}
+
+    def handle_line(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError as e:
+            return {"id": None, "ok": False, "error": f"Invalid JSON: {e}"}
+        return self.handle(job)
+
+def serve_stdio(worker, jobs=1):
+    # Model libraries occasionally print to stdout, so keep the real stdout for responses only
+    out = sys.stdout
+    sys.stdout = sys.stderr
+    write_lock = threading.Lock()
+
+    def respond(line):
+        response = worker.handle_line(line)
+        if response is not None:
+            with write_lock:
+                out.write(json.dumps(response) + "\n")
+                out.flush()
+
+    # Up to jobs run at once (ONNX Runtime releases the GIL), so a long summary does not
+    # hold up the captions queued behind it; responses carry the job ID and may arrive out of order
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for line in sys.stdin:
+            pool.submit(respond, line)
+    log("stdin closed, shutting down worker.")
+
+def serve_socket(worker, socket_path):
+    import socketserver
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                response = worker.handle_line(raw.decode("utf-8"))
+                if response is not None:
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    sys.stdout = sys.stderr
+    with Server(socket_path, JobHandler) as server:
+        log(f"Listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived caption/summarize worker (newline-delimited JSON)")
+    parser.add_argument("--model_dir", type=str, default="flan_t5_onnx", help="Directory containing the Flan-T5 ONNX model")
+    parser.add_argument("--socket", type=str, default=None, help="Serve on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--preload", action="store_true", help="Load all models at startup instead of on first use")
+    parser.add_argument("--jobs", type=int, default=1, help="Jobs served at once over stdin/stdout (also the default --workers)")
+    parser.add_argument("--cache", type=str, default=None, help="Result cache database (default: per-user cache dir)")
+    parser.add_argument("--no_cache", action="store_true", help="Always run inference, never read or write the cache")
+    parser.add_argument("--precision", type=str, default="fp32", choices=model_manifest.PRECISIONS, help="Model variant to run")
+    parser.add_argument("--dedup", action="store_true", help="Reuse captions of near-duplicate images instead of decoding (lossy, off by default)")
+    parser.add_argument("--dedup_threshold", type=float, default=embedding_index.DEFAULT_THRESHOLD, help="With --dedup: minimum cosine similarity of the embeddings")
+    parser.add_argument("--dedup_index", type=str, default=None, help="Near-duplicate index directory (default: per-user cache dir)")
+    parser.add_argument("--thread_budget", type=int, default=None, help="Total ONNX Runtime threads across all workers")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent workers sharing the thread budget")
+    parser.add_argument("--opt_level", type=str, default=None, choices=ort_session.OPT_LEVELS, help="Graph optimization level")
+    parser.add_argument("--execution_mode", type=str, default=None, choices=ort_session.EXECUTION_MODES, help="ONNX Runtime execution mode")
+    parser.add_argument("--shared_weights", action="store_true", help="Memory-map model weights read-only so concurrent workers share them (less RAM, slower decoding)")
+    args = parser.parse_args()
+
+    # Concurrent jobs split the thread budget instead of each taking every core
+    workers = args.workers if args.workers is not None else (args.jobs if args.jobs > 1 else None)
+    ort_session.configure(args.thread_budget, workers, args.opt_level, args.execution_mode,
+                          shared_weights=args.shared_weights or None)
+
+    model_dir = args.model_dir
+    if not os.path.isabs(model_dir):
+        model_dir = os.path.join(SCRIPT_DIR, model_dir)
+
+    cache = None if args.no_cache else result_cache.ResultCache(args.cache)
+    dedup_threshold = args.dedup_threshold if args.dedup else None
+    # HEIC decoding needs pillow-heif, which the downloaded python_env does not include
+    if importlib.util.find_spec("pillow_heif") is None:
+        log("Warning: pillow-heif is not installed, so HEIC images cannot be decoded here; "
+            "the app falls back to converting them to JPEG (heic-convert) and retrying.")
+
+    worker = InferenceWorker(model_dir, cache, args.precision, dedup_threshold, args.dedup_index)
+    if args.preload:
+        worker.get_blip()
+        worker.get_flan()
+
+    if args.socket:
+        serve_socket(worker, args.socket)
+    else:
+        serve_stdio(worker, max(1, args.jobs))
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+
+# Records which model files setup_models.py produced ("artifacts": size, mtime
+# and SHA-256 of every file plus the source model and revision) and which model
+# variants exist and whether each one passed its accuracy gate ("models"). Lives
+# at the root of the resources folder, next to setup_models.py, so both bridges
+# find it in dev and packaged layouts.
+
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models_manifest.json")
+
+PRECISIONS = ("fp32", "int8")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {"models": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {"models": {}}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    # Write to a temp file first so readers never see a half-written manifest
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def get_variant(model, precision, manifest=None):
+    manifest = manifest or load_manifest()
+    return manifest.get("models", {}).get(model, {}).get("variants", {}).get(precision)
+
+def set_variant(manifest, model, precision, info):
+    variants = manifest.setdefault("models", {}).setdefault(model, {}).setdefault("variants", {})
+    variants[precision] = info
+    return manifest
+
+def is_enabled(model, precision):
+    """fp32 is always usable; other variants only once setup has enabled them."""
+    if precision == "fp32":
+        return True
+    variant = get_variant(model, precision)
+    return bool(variant and variant.get("enabled"))
+
+def remove_variant(manifest, model, precision):
+    manifest.get("models", {}).get(model, {}).get("variants", {}).pop(precision, None)
+    return manifest
+
+def get_artifact(name, manifest=None):
+    manifest = manifest or load_manifest()
+    return manifest.get("artifacts", {}).get(name)
+
+def set_artifact(manifest, name, info):
+    manifest.setdefault("artifacts", {})[name] = info
+    return manifest
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_record(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ms": st.st_mtime_ns // 1000000, "sha256": file_sha256(path)}
+
+def verify_files(files, base_dir, deep=False):
+    """Checks recorded files ({relative path: file_record}) against disk: "ok", "missing" or "changed".
+
+    Only size and mtime are compared, so this takes a few stat calls. A file
+    whose mtime moved (copied, restored from a backup), or every file with
+    deep=True, is hashed instead; a matching hash refreshes the recorded mtime
+    in place so the next check is stat-only again.
+    """
+    for name, info in files.items():
+        path = os.path.join(base_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "missing"
+        if st.st_size != info["size"]:
+            return "changed"
+        mtime_ms = st.st_mtime_ns // 1000000
+        if mtime_ms == info["mtime_ms"] and not deep:
+            continue
+        if file_sha256(path) != info["sha256"]:
+            return "changed"
+        info["mtime_ms"] = mtime_ms
+    return "ok"
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import shutil
+import sys
+
+import result_cache
+
+# Shared ONNX Runtime session configuration for the caption, summarization and
+# health models.
+#
+# Every InferenceSession defaults to an intra-op pool sized to all cores, so a
+# few concurrent workers oversubscribe the CPU badly. Sessions created here split
+# one global thread budget across the concurrent workers instead, and persist the
+# optimized graph so later loads skip the optimization pass.
+#
+# Environment (all optional):
+#   NAS_ORT_THREAD_BUDGET   total intra-op threads for all workers (default: CPU count)
+#   NAS_ORT_WORKERS         number of workers sharing the budget (default: 1)
+#   NAS_ORT_OPT_LEVEL       disable | basic | extended | all (default: all)
+#   NAS_ORT_EXECUTION_MODE  sequential | parallel (default: sequential)
+#   NAS_ORT_OPTIMIZED_DIR   where optimized graphs are stored (default: per-user cache dir)
+#   NAS_ORT_SHARED_WEIGHTS  1 to memory-map weights and share them between sessions (default: 0)
+#
+# Shared weights: each graph is rewritten once with its weights in an external
+# data file (every tensor aligned to WEIGHT_ALIGNMENT). Sessions map that file
+# read-only and hand the tensors to ONNX Runtime as ready-made initializers, so
+# sessions in one process use the same mapping and worker processes share its
+# pages through the OS page cache instead of each holding a private copy.
+# Weight prepacking is turned off in this mode: the packed copy would again be
+# private to every session, and the Python API cannot share a prepacked-weights
+# container between sessions. Without it small-batch MatMuls repack their
+# weights on every call (Flan-T5 generation ran about 2x slower on an AVX2
+# CPU), so the mode is opt-in, for hosts where RAM is the limit.
+
+OPT_LEVELS = ("disable", "basic", "extended", "all")
+EXECUTION_MODES = ("sequential", "parallel")
+# Windows' mapping granularity; a multiple of the page size everywhere else
+WEIGHT_ALIGNMENT = 64 * 1024
+# Smaller tensors (shapes, scales, biases of tiny layers) stay inside the graph
+EXTERNAL_MIN_BYTES = 1024
+
+_config = {
+    "thread_budget": None,
+    "workers": None,
+    "opt_level": None,
+    "execution_mode": None,
+    "shared_weights": None,
+}
+# Weight file path -> {initializer name: OrtValue over the mapping}, shared by every session of the process
+_mapped_weights = {}
+
+def configure(thread_budget=None, workers=None, opt_level=None, execution_mode=None, shared_weights=None):
+    """Overrides the environment defaults for sessions created after this call."""
+    for name, value in (("thread_budget", thread_budget), ("workers", workers),
+                        ("opt_level", opt_level), ("execution_mode", execution_mode),
+                        ("shared_weights", shared_weights)):
+        if value is not None:
+            _config[name] = value
+
+def _setting(name, env_name, default):
+    if _config[name] is not None:
+        return _config[name]
+    return os.environ.get(env_name, default)
+
+def threads_per_worker():
+    budget = int(_setting("thread_budget", "NAS_ORT_THREAD_BUDGET", os.cpu_count() or 1))
+    workers = int(_setting("workers", "NAS_ORT_WORKERS", 1))
+    return max(1, budget // max(1, workers))
+
+def shared_weights():
+    return str(_setting("shared_weights", "NAS_ORT_SHARED_WEIGHTS", "0")).lower() in ("1", "true", "yes")
+
+def optimized_dir():
+    return os.environ.get("NAS_ORT_OPTIMIZED_DIR") or os.path.join(
+        os.path.dirname(result_cache.default_cache_path()), "ort_optimized"
+    )
+
+def optimized_path(model_path, opt_level):
+    """Cache location of the optimized graph; changes whenever the model file or ORT version changes."""
+    import onnxruntime
+    st = os.stat(model_path)
+    tag = f"{os.path.abspath(model_path)}|{st.st_size}|{int(st.st_mtime)}|{opt_level}|{onnxruntime.__version__}"
+    digest = hashlib.sha256(tag.encode("utf-8")).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(optimized_dir(), f"{name}.{digest}.onnx")
+
+def session_options(opt_level=None):
+    import onnxruntime
+    levels = {
+        "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    modes = {
+        "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+        "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+    }
+    opt_level = opt_level or _setting("opt_level", "NAS_ORT_OPT_LEVEL", "all")
+    execution_mode = _setting("execution_mode", "NAS_ORT_EXECUTION_MODE", "sequential")
+
+    options = onnxruntime.SessionOptions()
+    threads = threads_per_worker()
+    options.intra_op_num_threads = threads
+    # Only the parallel execution mode uses the inter-op pool
+    options.inter_op_num_threads = threads if execution_mode == "parallel" else 1
+    options.execution_mode = modes[execution_mode]
+    options.graph_optimization_level = levels[opt_level]
+    return options
+
+def create_session(model_path, providers=("CPUExecutionProvider",), shared=None):
+    """Creates an InferenceSession with the shared thread budget, reusing a saved optimized graph.
+
+    shared defaults to the shared_weights setting; see shared_session.
+    """
+    if shared is None:
+        shared = shared_weights()
+    if shared:
+        try:
+            return shared_session(shared_path(model_path), providers)
+        except Exception as e:
+            print(f"Loading {model_path} without shared weights: {e}", file=sys.stderr)
+
+    import onnxruntime
+    opt_level = _setting("opt_level", "NAS_ORT_OPT_LEVEL", "all")
+    if opt_level == "disable":
+        return onnxruntime.InferenceSession(model_path, session_options("disable"), providers=list(providers))
+
+    cached = optimized_path(model_path, opt_level)
+    if os.path.exists(cached):
+        # Already optimized offline: skip the optimization pass entirely
+        try:
+            return onnxruntime.InferenceSession(cached, session_options("disable"), providers=list(providers))
+        except Exception as e:
+            print(f"Discarding unusable optimized graph {cached}: {e}", file=sys.stderr)
+            os.remove(cached)
+
+    options = session_options(opt_level)
+    try:
+        os.makedirs(optimized_dir(), exist_ok=True)
+        # ORT writes to this path while building the session; publish it only once complete.
+        # Per-process name: concurrent workers may optimize the same graph at once.
+        tmp_path = f"{cached}.{os.getpid()}.tmp.onnx"
+        options.optimized_model_filepath = tmp_path
+        session = onnxruntime.InferenceSession(model_path, options, providers=list(providers))
+        os.replace(tmp_path, cached)
+        return session
+    except OSError as e:
+        print(f"Could not persist optimized graph for {model_path}: {e}", file=sys.stderr)
+        return onnxruntime.InferenceSession(model_path, session_options(opt_level), providers=list(providers))
+
+def _model_dir_cache_path(model_dir, variant):
+    """Cache folder for a derived copy of a multi-file export; changes whenever any of its graphs does."""
+    import onnxruntime
+    onnx_files = sorted(n for n in os.listdir(model_dir) if n.endswith(".onnx"))
+    tag = "|".join(
+        f"{n}:{os.path.getsize(os.path.join(model_dir, n))}:{int(os.path.getmtime(os.path.join(model_dir, n)))}"
+        for n in onnx_files
+    )
+    digest = hashlib.sha256(f"{os.path.abspath(model_dir)}|{tag}|{variant}|{onnxruntime.__version__}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(optimized_dir(), f"{os.path.basename(os.path.normpath(model_dir))}.{digest}")
+
+def _publish_dir(tmp_target, target):
+    """Moves a finished cache folder into place, unless another process already published one."""
+    if os.path.exists(os.path.join(target, ".complete")):
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        return
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp_target, target)
+
+def optimized_model_dir(model_dir):
+    """Optimizes every graph of a multi-file export (e.g. Optimum's Flan-T5 folder) once.
+
+    Returns a folder with the same layout whose .onnx files are already optimized,
+    so it can be loaded with session_options("disable").
+    """
+    opt_level = _setting("opt_level", "NAS_ORT_OPT_LEVEL", "all")
+    if opt_level == "disable":
+        return model_dir
+
+    import onnxruntime
+    target = _model_dir_cache_path(model_dir, opt_level)
+    if os.path.exists(os.path.join(target, ".complete")):
+        return target
+
+    try:
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        os.makedirs(tmp_target)
+        for name in os.listdir(model_dir):
+            src = os.path.join(model_dir, name)
+            if name.endswith(".onnx"):
+                options = session_options(opt_level)
+                options.optimized_model_filepath = os.path.join(tmp_target, name)
+                onnxruntime.InferenceSession(src, options, providers=["CPUExecutionProvider"])
+            elif os.path.isfile(src):
+                shutil.copy2(src, tmp_target)
+        open(os.path.join(tmp_target, ".complete"), "w").close()
+        _publish_dir(tmp_target, target)
+        return target
+    except Exception as e:
+        print(f"Could not persist optimized graphs for {model_dir}: {e}", file=sys.stderr)
+        return model_dir
+
+def externalize(src, dst):
+    """Writes the graph src as dst plus dst + ".data", moving every initializer of at least
+    EXTERNAL_MIN_BYTES into the data file at a WEIGHT_ALIGNMENT boundary.
+
+    The data file is published before the graph, so an existing dst is always complete.
+    """
+    import numpy as np
+    import onnx
+    from onnx import numpy_helper
+    model = onnx.load(src)
+    data_name = os.path.basename(dst) + ".data"
+    tmp_data = f"{dst}.data.{os.getpid()}.tmp"
+    tmp_graph = f"{dst}.{os.getpid()}.tmp"
+    with open(tmp_data, "wb") as f:
+        for tensor in model.graph.initializer:
+            array = numpy_helper.to_array(tensor)
+            if array.dtype == object or array.nbytes < EXTERNAL_MIN_BYTES:
+                continue
+            f.write(b"\0" * (-f.tell() % WEIGHT_ALIGNMENT))
+            offset = f.tell()
+            f.write(np.ascontiguousarray(array).tobytes())
+            external = onnx.TensorProto(name=tensor.name, data_type=tensor.data_type, dims=tensor.dims,
+                                        data_location=onnx.TensorProto.EXTERNAL)
+            for key, value in (("location", data_name), ("offset", str(offset)), ("length", str(array.nbytes))):
+                external.external_data.add(key=key, value=value)
+            tensor.CopyFrom(external)
+    onnx.save(model, tmp_graph)
+    os.replace(tmp_data, dst + ".data")
+    os.replace(tmp_graph, dst)
+
+def shared_path(model_path):
+    """Externalized copy of the model's optimized graph, built once next to the optimized graphs."""
+    opt_level = _setting("opt_level", "NAS_ORT_OPT_LEVEL", "all")
+    cached = optimized_path(model_path, opt_level)
+    target = os.path.splitext(cached)[0] + ".shared.onnx"
+    if os.path.exists(target):
+        return target
+    source = model_path
+    if opt_level != "disable":
+        if not os.path.exists(cached):
+            # Builds and saves the optimized graph
+            create_session(model_path, shared=False)
+        source = cached
+    os.makedirs(optimized_dir(), exist_ok=True)
+    externalize(source, target)
+    return target
+
+def shared_model_dir(model_dir):
+    """Like optimized_model_dir, with every graph externalized for shared_session."""
+    opt_level = _setting("opt_level", "NAS_ORT_OPT_LEVEL", "all")
+    target = _model_dir_cache_path(model_dir, f"{opt_level}.shared")
+    if os.path.exists(os.path.join(target, ".complete")):
+        return target
+
+    source = optimized_model_dir(model_dir)
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_target, ignore_errors=True)
+    os.makedirs(tmp_target)
+    for name in os.listdir(source):
+        src = os.path.join(source, name)
+        if name.endswith(".onnx"):
+            externalize(src, os.path.join(tmp_target, name))
+        elif os.path.isfile(src) and name != ".complete" and not name.endswith(("onnx_data", ".onnx.data")):
+            # The export's own external data is already inside the externalized graphs
+            shutil.copy2(src, tmp_target)
+    open(os.path.join(tmp_target, ".complete"), "w").close()
+    _publish_dir(tmp_target, target)
+    return target
+
+def map_weights(path):
+    """Initializers of an externalized graph as OrtValues over a read-only mapping of its data files.
+
+    Cached per process, so every session of the same graph uses the same mapping.
+    """
+    if path in _mapped_weights:
+        return _mapped_weights[path]
+    import numpy as np
+    import onnx
+    import onnxruntime
+    from onnx.helper import tensor_dtype_to_np_dtype
+    model = onnx.load(path, load_external_data=False)
+    files = {}
+    values = {}
+    for tensor in model.graph.initializer:
+        if tensor.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        info = {entry.key: entry.value for entry in tensor.external_data}
+        location = os.path.join(os.path.dirname(path), info["location"])
+        if location not in files:
+            files[location] = np.memmap(location, dtype=np.uint8, mode="r")
+        offset = int(info.get("offset", 0))
+        dtype = np.dtype(tensor_dtype_to_np_dtype(tensor.data_type))
+        length = int(info.get("length", int(np.prod(tensor.dims, dtype=np.int64)) * dtype.itemsize))
+        array = files[location][offset:offset + length].view(dtype).reshape(tuple(tensor.dims))
+        values[tensor.name] = onnxruntime.OrtValue.ortvalue_from_numpy(array)
+    _mapped_weights[path] = values
+    return values
+
+def shared_session(path, providers=("CPUExecutionProvider",)):
+    """Session over an externalized graph whose weights stay in the shared read-only mapping.
+
+    The graph was optimized before it was externalized, so the optimization
+    pass is skipped here too.
+    """
+    import onnxruntime
+    options = session_options("disable")
+    for name, value in map_weights(path).items():
+        options.add_initializer(name, value)
+    # Prepacked copies of the weights would be private to this session
+    options.add_session_config_entry("session.disable_prepacking", "1")
+    return onnxruntime.InferenceSession(path, options, providers=list(providers))
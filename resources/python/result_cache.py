@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Persistent, content-addressed cache for caption/summary results.
+# Keys combine a hash of the file content with the model identity and the
+# generation parameters, so a duplicate upload costs one hash instead of one inference.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 180
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def default_cache_path():
+    """Per-user cache location (overridable with NAS_AI_CACHE)."""
+    if os.environ.get("NAS_AI_CACHE"):
+        return os.environ["NAS_AI_CACHE"]
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "nas-ai", "results.sqlite")
+
+def hash_file(path):
+    """SHA-256 of the file content, read in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def hash_bytes(data):
+    """SHA-256 of in-memory content (same digest as hash_file for the same bytes)."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_source(source):
+    """Hashes a file path or raw bytes."""
+    if isinstance(source, str):
+        return hash_file(source)
+    return hash_bytes(source)
+
+def model_fingerprint(model_id, paths):
+    """Identifies a model export by its ID plus the size/mtime of its files, so re-exports invalidate."""
+    parts = [model_id]
+    for path in sorted(paths):
+        if os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{st.st_size}:{int(st.st_mtime)}")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def make_key(content_hash, model_identity, params):
+    payload = json.dumps({"content": content_hash, "model": model_identity, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """SQLite-backed result store with size/age eviction and hit/miss counters."""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, task TEXT, value TEXT, size INTEGER, "
+            "created REAL, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER)")
+        self.conn.commit()
+
+    def _bump(self, name):
+        self.conn.execute(
+            "INSERT INTO stats(name, count) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET count = count + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM results WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age:
+                self._bump("misses")
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._bump("hits")
+            self.conn.commit()
+            return json.loads(row[0])
+
+    def put(self, key, task, value):
+        encoded = json.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results(key, task, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, task, encoded, len(encoded), now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        # Age first, then least recently used until under the size budget
+        self.conn.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._bump("evictions")
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT name, count FROM stats").fetchall())
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        hits = counts.get("hits", 0)
+        misses = counts.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counts.get("evictions", 0),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.execute("DELETE FROM stats")
+            self.conn.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the caption/summary result cache")
+    parser.add_argument("--cache", type=str, default=None, help="Cache database path")
+    parser.add_argument("--clear", action="store_true", help="Remove every cached result and reset the counters")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
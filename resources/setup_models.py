@@ -1,11 +1,12 @@
 import os
 import sys
-import torch
-import numpy as np
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration, AutoTokenizer
-from optimum.onnxruntime import ORTModelForSeq2SeqLM
-import onnxruntime
+import json
+import time
+import shutil
+import argparse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Force UTF-8 for Windows console
 if sys.platform == "win32":
@@ -16,158 +17,470 @@ if sys.platform == "win32":
 BLIP_MODEL_ID = "Salesforce/blip-image-captioning-base"
 FLAN_MODEL_ID = "google/flan-t5-small"
 HEALTH_MODEL_URL = "https://github.com/Jinnmy/ai_things/raw/main/health_model.onnx"
+# Source revisions (commit hashes) to export from; None follows the hub's main branch.
+# Pinning one re-exports every part recorded from a different revision.
+BLIP_REVISION = None
+FLAN_REVISION = None
 
 # Paths (Relative to this script)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BLIP_DIR = os.path.join(BASE_DIR, "blip")
 FLAN_DIR = os.path.join(BASE_DIR, "python", "flan_t5_onnx")
 HW_MONITOR_DIR = os.path.join(BASE_DIR, "hardware-monitor")
+FLAN_INT8_DIR = FLAN_DIR + "_int8"
+
+# Shared helpers and the bridges themselves (used by the quantization gate)
+sys.path.insert(0, os.path.join(BASE_DIR, "python"))
+sys.path.insert(0, BLIP_DIR)
+import model_manifest
 
 # Expected Files
 BLIP_VISION_ONNX = os.path.join(BLIP_DIR, "vision_model.onnx")
 BLIP_TEXT_ONNX = os.path.join(BLIP_DIR, "text_decoder_model.onnx")
+BLIP_TEXT_INIT_ONNX = os.path.join(BLIP_DIR, "text_decoder_init.onnx") # KV-cached decoder, first step
+BLIP_TEXT_PAST_ONNX = os.path.join(BLIP_DIR, "text_decoder_with_past.onnx") # KV-cached decoder, later steps
 FLAN_ENCODER_ONNX = os.path.join(FLAN_DIR, "encoder_model.onnx")
 FLAN_DECODER_ONNX = os.path.join(FLAN_DIR, "decoder_model.onnx") # Optimum exports multiple files
 HEALTH_MODEL_ONNX = os.path.join(HW_MONITOR_DIR, "health_model.onnx")
 
-def check_blip_status():
-    return os.path.exists(BLIP_VISION_ONNX) and os.path.exists(BLIP_TEXT_ONNX)
+# --- Provisioning ---
+# Each part below is exported (or downloaded) as a unit and recorded in
+# models_manifest.json under "artifacts": size, mtime and SHA-256 of every file,
+# the source model and revision, and the export recipe version. Files are
+# written to a staging location and renamed into place, and the record is only
+# written once every file is in place, so an interrupted run never looks
+# complete. Later runs compare sizes and mtimes with the record (see
+# model_manifest.verify_files) and redo only the parts that are missing or stale.
 
-def check_flan_status():
-    # Only checking for encoder as a proxy for now, but ideally check all
-    return os.path.exists(FLAN_ENCODER_ONNX)
+# Bump a part's version when its export code changes so existing exports are redone
+PART_VERSIONS = {"blip": 1, "blip_cache": 1, "flan": 1, "health": 1}
+PART_SOURCES = {
+    "blip": (BLIP_MODEL_ID, BLIP_REVISION),
+    "blip_cache": (BLIP_MODEL_ID, BLIP_REVISION),
+    "flan": (FLAN_MODEL_ID, FLAN_REVISION),
+    "health": (HEALTH_MODEL_URL, None),
+}
+# Files that must exist for a part to be usable at all
+PART_REQUIRED = {
+    "blip": [BLIP_VISION_ONNX, BLIP_TEXT_ONNX],
+    "blip_cache": [BLIP_TEXT_INIT_ONNX, BLIP_TEXT_PAST_ONNX],
+    "flan": [FLAN_ENCODER_ONNX, FLAN_DECODER_ONNX],
+    "health": [HEALTH_MODEL_ONNX],
+}
+# Independent exports, run concurrently; the two BLIP parts share one loaded model
+TASKS = {"blip": ("blip", "blip_cache"), "flan": ("flan",), "health": ("health",)}
 
-def setup_blip():
-    print(f"Setting up BLIP model in {BLIP_DIR}...")
-    
-    if not os.path.exists(BLIP_DIR):
-        os.makedirs(BLIP_DIR)
+def part_paths(part):
+    """Every file of a part. Optimum decides the Flan-T5 file set, so that is the whole folder."""
+    if part == "flan":
+        if not os.path.isdir(FLAN_DIR):
+            return []
+        return [os.path.join(FLAN_DIR, n) for n in sorted(os.listdir(FLAN_DIR)) if os.path.isfile(os.path.join(FLAN_DIR, n))]
+    if part == "health":
+        # Some exports keep their weights in a .data file next to the graph
+        return [HEALTH_MODEL_ONNX] + [p for p in (HEALTH_MODEL_ONNX + ".data",) if os.path.exists(p)]
+    return PART_REQUIRED[part]
 
-    if check_blip_status():
-        print("BLIP models already exist.")
-        return
+def record_part(part, paths, revision, adopted=False):
+    source, _ = PART_SOURCES[part]
+    record = {
+        "version": PART_VERSIONS[part],
+        "source": source,
+        "revision": revision,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "files": {os.path.relpath(p, BASE_DIR): model_manifest.file_record(p) for p in paths},
+    }
+    if adopted:
+        record["adopted"] = True
+    return record
+
+def part_status(part, manifest, deep=False):
+    """ok, missing, stale, or unrecorded (files from before the manifest existed)."""
+    record = model_manifest.get_artifact(part, manifest)
+    if record is None:
+        return "unrecorded" if all(os.path.exists(p) for p in PART_REQUIRED[part]) else "missing"
+    _, pinned = PART_SOURCES[part]
+    if record.get("version") != PART_VERSIONS[part] or (pinned and record.get("revision") != pinned):
+        return "stale"
+    status = model_manifest.verify_files(record["files"], BASE_DIR, deep)
+    return "stale" if status == "changed" else status
+
+def check_blip_status(manifest=None):
+    return part_status("blip", manifest or model_manifest.load_manifest()) == "ok"
 
+def check_blip_cache_status(manifest=None):
+    return part_status("blip_cache", manifest or model_manifest.load_manifest()) == "ok"
+
+def check_flan_status(manifest=None):
+    return part_status("flan", manifest or model_manifest.load_manifest()) == "ok"
+
+def check_health_status(manifest=None):
+    return part_status("health", manifest or model_manifest.load_manifest()) == "ok"
+
+def adopt(part):
+    """Records the files of an install that predates the manifest, provided every graph in them loads."""
+    import onnxruntime
+    paths = part_paths(part)
+    try:
+        for path in paths:
+            if path.endswith(".onnx"):
+                onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+    except Exception as e:
+        print(f"Existing {part} files are unusable ({e}); exporting again.")
+        return None
+    return record_part(part, paths, None, adopted=True)
+
+def source_revision(model_id, revision, config=None):
+    """Commit the weights came from: transformers records it on the config, else ask the hub."""
+    commit = getattr(config, "_commit_hash", None)
+    if commit:
+        return commit
+    try:
+        from huggingface_hub import HfApi
+        return HfApi().model_info(model_id, revision=revision).sha
+    except Exception:
+        return revision
+
+def staging_dir(path):
+    # Same filesystem as the target, so publishing is a rename; leftovers of an interrupted run are discarded
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+def provision_blip(parts):
+    """Exports the requested BLIP parts ("blip", "blip_cache"); returns their manifest records."""
+    # Imported here so checking an up-to-date install never pays for loading the ML stack
+    from PIL import Image
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    import export_blip_onnx
+
+    print(f"Setting up BLIP model in {BLIP_DIR}...")
     print(f"Loading base model {BLIP_MODEL_ID}...")
-    processor = BlipProcessor.from_pretrained(BLIP_MODEL_ID)
-    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_ID)
+    processor = BlipProcessor.from_pretrained(BLIP_MODEL_ID, revision=BLIP_REVISION)
+    model = BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_ID, revision=BLIP_REVISION)
     model.eval()
+    revision = source_revision(BLIP_MODEL_ID, BLIP_REVISION, model.config)
 
     # Create dummy input
     dummy_image = Image.new('RGB', (384, 384))
     inputs = processor(images=dummy_image, return_tensors="pt")
     pixel_values = inputs["pixel_values"]
 
-    # 1. Export Vision Model
-    print("Exporting Vision Model to ONNX...")
-    with torch.no_grad():
-        torch.onnx.export(
-            model.vision_model, 
-            pixel_values, 
-            BLIP_VISION_ONNX, 
-            input_names=["pixel_values"],
-            output_names=["last_hidden_state", "pooler_output"],
-            dynamic_axes={"pixel_values": {0: "batch_size"}},
-            opset_version=18
-        )
-
-    # 2. Export Text Decoder
-    print("Exporting Text Decoder to ONNX...")
-    text_decoder = model.text_decoder
-    text_decoder.config.use_cache = False
-    
-    # Dummy inputs for decoder
-    vision_outputs = model.vision_model(pixel_values)
-    image_embeds = vision_outputs[0]
-    image_attention_mask = torch.ones(image_embeds.size()[:-1], dtype=torch.long)
-    image_attention_mask = torch.ones(image_embeds.size()[:-1], dtype=torch.long)
-    # Trace with a sequence length > 1 to avoid hardcoding shapes for length 1
-    input_ids = torch.tensor([[30522, 101, 102, 103, 104]], dtype=torch.long) # Length 5
-    attention_mask = torch.ones(input_ids.shape, dtype=torch.long)
-    
-    # Wrapper for export
-    class TextDecoderWrapper(torch.nn.Module):
-        def __init__(self, decoder):
-            super().__init__()
-            self.decoder = decoder
-        
-        def forward(self, input_ids, attention_mask, encoder_hidden_states, encoder_attention_mask):
-            return self.decoder(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-                encoder_hidden_states=encoder_hidden_states,
-                encoder_attention_mask=encoder_attention_mask
-            )
-    
-    wrapper = TextDecoderWrapper(text_decoder)
-    
-    with torch.no_grad():
-        torch.onnx.export(
-            wrapper,
-            (input_ids, attention_mask, image_embeds, image_attention_mask),
-            BLIP_TEXT_ONNX,
-            input_names=["input_ids", "attention_mask", "encoder_hidden_states", "encoder_attention_mask"],
-            output_names=["logits"],
-            dynamic_axes={
-                "input_ids": {0: "batch_size", 1: "seq_len"},
-                "attention_mask": {0: "batch_size", 1: "seq_len"},
-                "encoder_hidden_states": {0: "batch_size", 1: "seq_len_img"},
-                "encoder_attention_mask": {0: "batch_size", 1: "seq_len_img"}
-            },
-            opset_version=18
-        )
-    print("BLIP export complete.")
-
-def setup_flan():
-    print(f"Setting up Flan-T5 model in {FLAN_DIR}...")
+    exports = {
+        "blip": export_blip_onnx.export_blip_base,
+        "blip_cache": export_blip_onnx.export_blip_cached_decoder,
+    }
+    staging = staging_dir(os.path.join(BLIP_DIR, ".staging"))
+    records = {}
+    try:
+        for part in parts:
+            targets = PART_REQUIRED[part]
+            staged = [os.path.join(staging, os.path.basename(p)) for p in targets]
+            exports[part](model, pixel_values, *staged)
+            for src, dst in zip(staged, targets):
+                os.replace(src, dst)
+            records[part] = record_part(part, targets, revision)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
 
-    if not os.path.exists(FLAN_DIR):
-        os.makedirs(FLAN_DIR)
+    print("BLIP export complete.")
+    return records
 
-    if check_flan_status():
-        print("Flan-T5 models already exist.")
-        return
+def provision_flan(parts):
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
 
+    print(f"Setting up Flan-T5 model in {FLAN_DIR}...")
     print(f"Loading and exporting model {FLAN_MODEL_ID}...")
+    staging = staging_dir(FLAN_DIR + ".staging")
     # Optimum handles the export automatically
-    model = ORTModelForSeq2SeqLM.from_pretrained(FLAN_MODEL_ID, export=True)
-    tokenizer = AutoTokenizer.from_pretrained(FLAN_MODEL_ID)
-    
-    model.save_pretrained(FLAN_DIR)
-    tokenizer.save_pretrained(FLAN_DIR)
+    model = ORTModelForSeq2SeqLM.from_pretrained(FLAN_MODEL_ID, revision=FLAN_REVISION, export=True)
+    tokenizer = AutoTokenizer.from_pretrained(FLAN_MODEL_ID, revision=FLAN_REVISION)
+    model.save_pretrained(staging)
+    tokenizer.save_pretrained(staging)
+    revision = source_revision(FLAN_MODEL_ID, FLAN_REVISION, model.config)
+
+    # Swap the finished folder in; the previous one is deleted only after that
+    previous = FLAN_DIR + ".old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(FLAN_DIR):
+        os.replace(FLAN_DIR, previous)
+    os.replace(staging, FLAN_DIR)
+    shutil.rmtree(previous, ignore_errors=True)
+
     print("Flan-T5 export complete.")
+    return {"flan": record_part("flan", part_paths("flan"), revision)}
 
-def setup_health_model():
-    print(f"Setting up Health Model in {HW_MONITOR_DIR}...")
-    if not os.path.exists(HW_MONITOR_DIR):
-        os.makedirs(HW_MONITOR_DIR)
+def download(url, path):
+    """Downloads next to path and renames the file into place once it is complete."""
+    tmp_path = path + ".part"
+    try:
+        urllib.request.urlretrieve(url, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    if os.path.exists(HEALTH_MODEL_ONNX):
-        print("Health model already exists.")
-        return
+def provision_health(parts):
+    print(f"Setting up Health Model in {HW_MONITOR_DIR}...")
+    os.makedirs(HW_MONITOR_DIR, exist_ok=True)
 
     print("Downloading health model...")
-    import urllib.request
     try:
-        # Download ONNX
-        urllib.request.urlretrieve(HEALTH_MODEL_URL, HEALTH_MODEL_ONNX)
-        print("Health model ONNX downloaded successfully.")
-        
-        # Check for associated .data file (some exports use external data)
-        # We try to download it if it exists. If it doesn't (404), we assume it's not needed.
-        data_url = HEALTH_MODEL_URL + ".data"
-        data_path = HEALTH_MODEL_ONNX + ".data"
-        try:
-            print(f"Checking for associated data file at {data_url}...")
-            urllib.request.urlretrieve(data_url, data_path)
-            print("Associated health model data file downloaded.")
-        except Exception:
-            # If 404 or other error, we assume no .data file is required for this model
-            print("No associated data file found (standard for small models).")
-            if os.path.exists(data_path):
-                os.remove(data_path)
+        download(HEALTH_MODEL_URL, HEALTH_MODEL_ONNX)
     except Exception as e:
         print(f"Failed to download health model: {e}")
         raise e
+    print("Health model ONNX downloaded successfully.")
+
+    # Check for associated .data file (some exports use external data)
+    # We try to download it if it exists. If it doesn't (404), we assume it's not needed.
+    data_url = HEALTH_MODEL_URL + ".data"
+    data_path = HEALTH_MODEL_ONNX + ".data"
+    try:
+        print(f"Checking for associated data file at {data_url}...")
+        download(data_url, data_path)
+        print("Associated health model data file downloaded.")
+    except Exception:
+        # If 404 or other error, we assume no .data file is required for this model
+        print("No associated data file found (standard for small models).")
+        if os.path.exists(data_path):
+            os.remove(data_path)
+
+    return {"health": record_part("health", part_paths("health"), None)}
+
+PROVISIONERS = {"blip": provision_blip, "flan": provision_flan, "health": provision_health}
+
+def int8_path(path):
+    # Same naming as bridge.model_files
+    return path[:-len(".onnx")] + ".int8.onnx"
+
+def discard_int8(manifest, part):
+    """A re-exported part invalidates its quantized copy; the next --quantize run rebuilds and re-gates it."""
+    if part == "flan":
+        shutil.rmtree(FLAN_INT8_DIR, ignore_errors=True)
+        model_manifest.remove_variant(manifest, "flan", "int8")
+    elif part in ("blip", "blip_cache"):
+        for path in PART_REQUIRED[part]:
+            if os.path.exists(int8_path(path)):
+                os.remove(int8_path(path))
+        model_manifest.remove_variant(manifest, "blip", "int8")
+
+def check_parts(manifest, deep=False):
+    return {part: part_status(part, manifest, deep) for part in PART_VERSIONS}
+
+def provision(jobs=len(TASKS), deep=False):
+    """Brings every part up to date, running the independent exports in parallel processes."""
+    manifest = model_manifest.load_manifest()
+    statuses = check_parts(manifest, deep)
+    for part, status in statuses.items():
+        if status == "unrecorded":
+            record = adopt(part)
+            if record:
+                model_manifest.set_artifact(manifest, part, record)
+            statuses[part] = "ok" if record else "stale"
+        print(f"{part}: {statuses[part]}")
+    # Keeps adopted parts and any mtimes refreshed by verification
+    model_manifest.save_manifest(manifest)
+
+    todo = {task: [p for p in parts if statuses[p] != "ok"] for task, parts in TASKS.items()}
+    todo = {task: parts for task, parts in todo.items() if parts}
+    if not todo:
+        print("All models are up to date.")
+        return
+
+    failures = []
+
+    def finish(task, run):
+        try:
+            records = run()
+        except Exception as e:
+            print(f"Setting up {task} failed: {e}", file=sys.stderr)
+            failures.append(task)
+            return
+        # Recorded as each task finishes, so a later failure does not lose finished work
+        for part, record in records.items():
+            discard_int8(manifest, part)
+            model_manifest.set_artifact(manifest, part, record)
+        model_manifest.save_manifest(manifest)
+
+    if jobs <= 1 or len(todo) == 1:
+        for task in todo:
+            finish(task, lambda: PROVISIONERS[task](todo[task]))
+    else:
+        # Processes rather than threads: torch.onnx.export keeps global state, and each
+        # export gets its own interpreter for the CPU-heavy tracing
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            futures = {pool.submit(PROVISIONERS[task], parts): task for task, parts in todo.items()}
+            for future in as_completed(futures):
+                finish(futures[future], future.result)
+
+    if failures:
+        raise RuntimeError(f"could not set up {', '.join(failures)}")
+
+# --- Quantized variants ---
+# A quantized variant is only enabled when its outputs agree with fp32 at least this much
+# (mean token F1 between the fp32 and int8 captions/summaries over the gate inputs).
+MIN_AGREEMENT = {"blip": 0.8, "flan": 0.7}
+GATE_IMAGE_COUNT = 8
+# The BLIP gate only means something on real photos (captions of synthetic noise agree or
+# disagree regardless of quality), so without this many it is not run and int8 stays off
+MIN_GATE_IMAGES = 4
+
+# Short built-in passages for the Flan-T5 gate
+GATE_TEXTS = [
+    "The city council met on Tuesday to discuss the new budget. Members agreed to increase funding for "
+    "public parks and libraries, while cutting spending on road resurfacing. The mayor said the changes "
+    "reflect residents' priorities, and a final vote is expected next month after a public hearing.",
+    "Solid state drives store data in flash memory cells that wear out after a limited number of write "
+    "cycles. Drive firmware spreads writes across cells and keeps spare blocks in reserve. When the spare "
+    "pool runs low, SMART attributes such as percentage used and available spare begin to warn the owner.",
+    "The hiking trail climbs steadily through pine forest for about four kilometres before reaching an "
+    "alpine lake. Visitors are advised to carry water, start early to avoid afternoon storms, and stay on "
+    "marked paths to protect fragile meadows. Camping is only allowed at the designated site near the shore.",
+]
+
+def token_f1(reference, candidate):
+    ref_tokens = reference.lower().split()
+    cand_tokens = candidate.lower().split()
+    if not ref_tokens and not cand_tokens:
+        return 1.0
+    overlap = sum((Counter(ref_tokens) & Counter(cand_tokens)).values())
+    if overlap == 0:
+        return 0.0
+    precision = overlap / len(cand_tokens)
+    recall = overlap / len(ref_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+def files_size(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+def quantize_file(src, dst):
+    """INT8 dynamic quantization: weights stored as int8, activations quantized per batch at run time."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    print(f"Quantizing {os.path.basename(src)}...")
+    # Renamed into place when done: an existing int8 file is always a complete one
+    tmp_path = dst[:-len(".onnx")] + ".tmp.onnx"
+    try:
+        quantize_dynamic(src, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, dst)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def compare_variants(run_fp32, run_variant, inputs):
+    """Runs both variants over the gate inputs and reports latency and output agreement."""
+    # Warm up both so session initialization does not count as latency
+    run_fp32(inputs[0])
+    run_variant(inputs[0])
+
+    fp32_time = 0.0
+    variant_time = 0.0
+    scores = []
+    for item in inputs:
+        start = time.perf_counter()
+        reference = run_fp32(item)
+        fp32_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidate = run_variant(item)
+        variant_time += time.perf_counter() - start
+
+        scores.append(token_f1(reference, candidate))
+
+    return {
+        "fp32_latency_ms": round(1000 * fp32_time / len(inputs), 1),
+        "latency_ms": round(1000 * variant_time / len(inputs), 1),
+        "agreement": round(sum(scores) / len(scores), 4),
+    }
+
+def gate_images(calibration_dir):
+    """Up to GATE_IMAGE_COUNT photos from calibration_dir; empty when there is no folder."""
+    if not calibration_dir:
+        return []
+    exts = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+    names = sorted(n for n in os.listdir(calibration_dir) if n.lower().endswith(exts))
+    return [os.path.join(calibration_dir, n) for n in names[:GATE_IMAGE_COUNT]]
+
+def record_variant(model, precision, files, comparison=None, min_agreement=None):
+    manifest = model_manifest.load_manifest()
+    info = {
+        "files": [os.path.relpath(p, BASE_DIR) for p in files if os.path.exists(p)],
+        "size_bytes": files_size(files),
+        "enabled": True,
+    }
+    if comparison is not None:
+        info.update(comparison)
+        info["min_agreement"] = min_agreement
+        info["enabled"] = comparison["agreement"] >= min_agreement
+    model_manifest.set_variant(manifest, model, precision, info)
+    model_manifest.save_manifest(manifest)
+    return info
+
+def report_variant(name, fp32_size, info):
+    print(f"{name} int8: {info['size_bytes'] / 1e6:.1f} MB (fp32 {fp32_size / 1e6:.1f} MB), "
+          f"{info['latency_ms']} ms vs {info['fp32_latency_ms']} ms, agreement {info['agreement']:.2f}")
+    if info["enabled"]:
+        print(f"{name} int8 variant enabled.")
+    else:
+        print(f"{name} int8 variant NOT enabled: agreement below {info['min_agreement']}.")
+
+def setup_blip_int8(calibration_dir=None, min_agreement=MIN_AGREEMENT["blip"]):
+    import bridge
+    print("Setting up BLIP int8 variant...")
+    images = gate_images(calibration_dir)
+    if len(images) < MIN_GATE_IMAGES:
+        # An existing variant keeps whatever an earlier gated run decided
+        print(f"BLIP int8 variant NOT set up: the accuracy gate needs at least {MIN_GATE_IMAGES} real photos "
+              f"(--calibration_dir), found {len(images)}.")
+        return
+    fp32_files = bridge.model_files("fp32")
+    int8_files = bridge.model_files("int8")
+    for name, src in fp32_files.items():
+        if os.path.exists(src) and not os.path.exists(int8_files[name]):
+            quantize_file(src, int8_files[name])
+
+    fp32_models = bridge.load_models("fp32")
+    int8_models = bridge.load_models("int8")
+    comparison = compare_variants(
+        lambda path: bridge.caption_image(fp32_models, path),
+        lambda path: bridge.caption_image(int8_models, path),
+        images
+    )
+
+    record_variant("blip", "fp32", list(fp32_files.values()))
+    info = record_variant("blip", "int8", list(int8_files.values()), comparison, min_agreement)
+    report_variant("BLIP", files_size(fp32_files.values()), info)
+
+def setup_flan_int8(min_agreement=MIN_AGREEMENT["flan"]):
+    import flan_bridge
+    print("Setting up Flan-T5 int8 variant...")
+    os.makedirs(FLAN_INT8_DIR, exist_ok=True)
+    for name in os.listdir(FLAN_DIR):
+        src = os.path.join(FLAN_DIR, name)
+        dst = os.path.join(FLAN_INT8_DIR, name)
+        if os.path.exists(dst) or not os.path.isfile(src):
+            continue
+        if name.endswith(".onnx"):
+            quantize_file(src, dst)
+        else:
+            # Config and tokenizer files are shared with fp32
+            shutil.copy2(src, dst)
+
+    fp32_model, tokenizer = flan_bridge.load_model(FLAN_DIR)
+    int8_model, _ = flan_bridge.load_model(FLAN_INT8_DIR)
+    comparison = compare_variants(
+        lambda text: flan_bridge.summarize(text, fp32_model, tokenizer),
+        lambda text: flan_bridge.summarize(text, int8_model, tokenizer),
+        GATE_TEXTS
+    )
+
+    def onnx_files(directory):
+        return [os.path.join(directory, n) for n in sorted(os.listdir(directory)) if n.endswith(".onnx")]
+
+    record_variant("flan", "fp32", onnx_files(FLAN_DIR))
+    info = record_variant("flan", "int8", onnx_files(FLAN_INT8_DIR), comparison, min_agreement)
+    report_variant("Flan-T5", files_size(onnx_files(FLAN_DIR)), info)
 
 def check_smartctl_status():
     """Checks if smartctl is available."""
@@ -190,11 +503,31 @@ def check_smartctl_status():
     return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download and export the AI models")
+    parser.add_argument("--quantize", action="store_true", help="Also produce INT8 variants and gate them against fp32")
+    parser.add_argument("--calibration_dir", type=str, default=None, help=f"Real photos for the BLIP int8 gate (at least {MIN_GATE_IMAGES}; BLIP int8 is skipped without them)")
+    parser.add_argument("--min_agreement", type=float, default=None, help="Override the minimum fp32/int8 output agreement (0-1)")
+    parser.add_argument("--jobs", type=int, default=len(TASKS), help="Exports to run at the same time (1 = one after another)")
+    parser.add_argument("--verify", action="store_true", help="Check every file's SHA-256 instead of only its size and mtime")
+    parser.add_argument("--check", action="store_true", help="Only report the status of each part (exit code 1 unless all are ok)")
+    args = parser.parse_args()
+
+    if args.check:
+        manifest = model_manifest.load_manifest()
+        statuses = check_parts(manifest, args.verify)
+        if manifest.get("artifacts"):
+            # Keeps mtimes refreshed by verification
+            model_manifest.save_manifest(manifest)
+        print(json.dumps(statuses, indent=2))
+        sys.exit(0 if all(status == "ok" for status in statuses.values()) else 1)
+
     print("Starting AI Model Setup...")
     try:
-        setup_blip()
-        setup_flan()
-        setup_health_model()
+        provision(args.jobs, args.verify)
+
+        if args.quantize:
+            setup_blip_int8(args.calibration_dir, args.min_agreement or MIN_AGREEMENT["blip"])
+            setup_flan_int8(args.min_agreement or MIN_AGREEMENT["flan"])
         
         print("\nChecking system dependencies...")
         if check_smartctl_status():
@@ -13,6 +13,8 @@ const iconPath = path.join(__dirname, '../ui/public/assets/logo.ico');
 const icon = nativeImage.createFromPath(iconPath);
 
 const { startServer } = require('../server/server');
+const { systemController } = require('../server/controllers/systemController');
+const InferenceWorker = require('../server/services/inferenceWorker');
 
 // Handle creating/removing shortcuts on Windows when installing/uninstalling.
 if (require('electron-squirrel-startup')) {
@@ -164,5 +166,12 @@ app.on('window-all-closed', () => {
   }
 });
 
+// Stop the hardware monitor daemon so its last health store write finishes cleanly,
+// and the inference worker so it does not outlive the app
+app.on('before-quit', () => {
+  systemController.stopHealthDaemon();
+  InferenceWorker.stop();
+});
+
 // In this file you can include the rest of your app's specific main process
 // code. You can also put them in separate files and import them here.
@@ -80,20 +80,46 @@ const BLIP_DIR = path.join(__dirname, '../../../resources/blip');
 const FLAN_DIR = path.join(__dirname, '../../../resources/python/flan_t5_onnx');
 const HW_MONITOR_DIR = path.join(__dirname, '../../../resources/hardware-monitor');
 const SETUP_SCRIPT = path.join(__dirname, '../../../resources/setup_models.py');
+const MODELS_MANIFEST = path.join(__dirname, '../../../resources/models_manifest.json');
 
-exports.getAiStatus = (req, res) => {
+const readModelsManifest = () => {
     try {
-        const settings = readSettings();
-
-        // Check for key files
-        const blipReady = fs.existsSync(path.join(BLIP_DIR, 'vision_model.onnx')) &&
-            fs.existsSync(path.join(BLIP_DIR, 'text_decoder_model.onnx'));
+        return JSON.parse(fs.readFileSync(MODELS_MANIFEST, 'utf8'));
+    } catch (e) {
+        return {};
+    }
+};
 
-        // Check for Flan (checking encoder as proxy)
-        const flanReady = fs.existsSync(path.join(FLAN_DIR, 'encoder_model.onnx'));
+// A part setup_models.py recorded is ready when every file it wrote is there at full size
+// (an interrupted export never gets a record); installs from before the manifest fall back
+// to checking that the key files exist.
+const partReady = (manifest, part, keyFiles) => {
+    const record = manifest.artifacts?.[part];
+    if (!record) return keyFiles.every(file => fs.existsSync(file));
+    const base = path.dirname(MODELS_MANIFEST);
+    return Object.entries(record.files || {}).every(([name, info]) => {
+        try {
+            return fs.statSync(path.join(base, name)).size === info.size;
+        } catch (e) {
+            return false;
+        }
+    });
+};
 
-        // Check for Health Model
-        const healthReady = fs.existsSync(path.join(HW_MONITOR_DIR, 'health_model.onnx'));
+exports.getAiStatus = (req, res) => {
+    try {
+        const settings = readSettings();
+        const manifest = readModelsManifest();
+
+        const blipReady = partReady(manifest, 'blip', [
+            path.join(BLIP_DIR, 'vision_model.onnx'),
+            path.join(BLIP_DIR, 'text_decoder_model.onnx')
+        ]);
+        const flanReady = partReady(manifest, 'flan', [
+            path.join(FLAN_DIR, 'encoder_model.onnx'),
+            path.join(FLAN_DIR, 'decoder_model.onnx')
+        ]);
+        const healthReady = partReady(manifest, 'health', [path.join(HW_MONITOR_DIR, 'health_model.onnx')]);
 
         // Check for Python environment
         let pythonReady = true;
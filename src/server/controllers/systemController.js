@@ -15,6 +15,21 @@ const setElectronApp = (app) => {
 
 const getElectronApp = () => electronApp;
 
+// Shared HardwareMonitor, created on first use with the bundled Python when there is one
+const getMonitor = () => {
+    if (!monitorInstance) {
+        const bundledPython = path.join(__dirname, '../../../resources/python_env/python.exe');
+        const isPackaged = electronApp && electronApp.isPackaged;
+
+        monitorInstance = new HardwareMonitor({
+            pythonPath: (isPackaged || fs.existsSync(bundledPython))
+                ? (isPackaged ? path.join(process.resourcesPath, 'python_env/python.exe') : bundledPython)
+                : 'python'
+        });
+    }
+    return monitorInstance;
+};
+
 const runPowerShell = (command, asAdmin = false) => {
     return new Promise((resolve, reject) => {
         const tempFilePath = path.join(os.tmpdir(), `ps_script_${Date.now()}_${Math.random().toString(36).substring(7)}.ps1`);
@@ -213,18 +228,7 @@ const systemController = {
                     if (fs.existsSync(settingsPath)) {
                         const settings = JSON.parse(fs.readFileSync(settingsPath, 'utf8'));
                         if (settings.aiEnabled) {
-                            if (!monitorInstance) {
-                                const bundledPython = path.join(__dirname, '../../../resources/python_env/python.exe');
-                                const isPackaged = electronApp && electronApp.isPackaged;
-
-                                monitorInstance = new HardwareMonitor({
-                                    pythonPath: (isPackaged || fs.existsSync(bundledPython))
-                                        ? (isPackaged ? path.join(process.resourcesPath, 'python_env/python.exe') : bundledPython)
-                                        : 'python'
-                                });
-                            }
-
-                            const fullReport = await monitorInstance.runFullCheck();
+                            const fullReport = await getMonitor().runFullCheck();
                             mappedDisks.forEach(disk => {
                                 // 1. Try matching by Model Name (Reliable)
                                 const predictionByModel = fullReport.disks.find(d =>
@@ -252,6 +256,7 @@ const systemController = {
                                 if (prediction) {
                                     disk.aiHealthStatus = prediction.prediction.status;
                                     disk.anomalyScore = prediction.prediction.anomaly_score;
+                                    disk.ioLoad = prediction.io || null;
                                 }
                             });
                         }
@@ -288,13 +293,7 @@ const systemController = {
                         const settings = JSON.parse(fs.readFileSync(settingsPath, 'utf8'));
                         if (!settings.aiEnabled) return; // Don't run if disabled
 
-                        const bundledPython = path.join(__dirname, '../../../resources/python_env/python.exe');
-                        const isPackaged = electronApp && electronApp.isPackaged;
-                        monitorInstance = new HardwareMonitor({
-                            pythonPath: (isPackaged || fs.existsSync(bundledPython))
-                                ? (isPackaged ? path.join(process.resourcesPath, 'python_env/python.exe') : bundledPython)
-                                : 'python'
-                        });
+                        getMonitor();
                     } else {
                         return;
                     }
@@ -319,6 +318,29 @@ const systemController = {
         setInterval(runJob, INTERVAL_MS);
     },
 
+    // Keeps hardware_monitor.py running in daemon mode so reports come from its latest
+    // samples, and it is the only writer of the health store (see monitor.js getReport)
+    startHealthDaemon: () => {
+        try {
+            const settingsPath = electronApp && electronApp.isPackaged
+                ? path.join(electronApp.getPath('userData'), 'settings.json')
+                : path.join(__dirname, '../config/settings.json');
+
+            if (!fs.existsSync(settingsPath)) return;
+            const settings = JSON.parse(fs.readFileSync(settingsPath, 'utf8'));
+            if (!settings.aiEnabled) return; // Don't run if disabled
+
+            getMonitor().startDaemon();
+            console.log("AI hardware monitor daemon started.");
+        } catch (err) {
+            console.error("Failed to start AI hardware monitor daemon:", err);
+        }
+    },
+
+    stopHealthDaemon: () => {
+        if (monitorInstance) monitorInstance.stopDaemon();
+    },
+
     getAiStats: async (req, res) => {
         try {
             const settingsPath = electronApp && electronApp.isPackaged
@@ -334,16 +356,7 @@ const systemController = {
                 return res.json({ enabled: false });
             }
 
-            if (!monitorInstance) {
-                const bundledPython = path.join(__dirname, '../../../resources/python_env/python.exe');
-                const isPackaged = electronApp && electronApp.isPackaged;
-
-                monitorInstance = new HardwareMonitor({
-                    pythonPath: (isPackaged || fs.existsSync(bundledPython))
-                        ? (isPackaged ? path.join(process.resourcesPath, 'python_env/python.exe') : bundledPython)
-                        : 'python'
-                });
-            }
+            getMonitor();
 
             // Try loading cached report first
             const cached = monitorInstance.loadCachedReport();
@@ -734,6 +747,7 @@ const systemController = {
 
                     // Stop Background Services
                     TransferService.stop();
+                    systemController.stopHealthDaemon();
 
                     // 2. Delete Files
                     const filesToDelete = [
@@ -81,6 +81,9 @@ function startServer(electronAppInstance) {
     // Start AI Hardware Scheduler (Runs every 3 hours)
     systemController.startAiScheduler();
 
+    // Start AI Hardware Monitor Daemon (the scheduler reads its latest samples)
+    systemController.startHealthDaemon();
+
     return new Promise((resolve, reject) => {
         let currentPort = 3000;
 
@@ -1,23 +1,21 @@
-const { spawn } = require('child_process');
 const path = require('path');
+const InferenceWorker = require('./inferenceWorker');
 
 const { app } = require('electron');
 
 // Configure paths
 let PYTHON_PATH = 'python'; // Assumes python is in system PATH for dev
-let SCRIPT_PATH = path.join(__dirname, '../../../resources/python/flan_bridge.py');
-let MODEL_DIR = path.join(__dirname, '../../../resources/python/flan_t5_onnx');
 
 if (app.isPackaged) {
     PYTHON_PATH = path.join(process.resourcesPath, 'python_env/python.exe');
-    SCRIPT_PATH = path.join(process.resourcesPath, 'python/flan_bridge.py');
-    MODEL_DIR = path.join(process.resourcesPath, 'python/flan_t5_onnx');
 }
 
+const SUMMARY_MAX_CHARS = 150;
+
 class SummarizationService {
     /**
      * Generates a summary for the given document path.
-     * @param {string} filePath - Absolute path to the .txt or .docx file.
+     * @param {string} filePath - Absolute path to the .txt, .docx or .pdf file.
      * @returns {Promise<string>} - The generated summary.
      */
     static generateSummary(filePath) {
@@ -44,87 +42,48 @@ class SummarizationService {
                 return reject(new Error('Python environment not found. Please setup AI features first.'));
             }
 
-            // PDF Handling
-            let inputPath = filePath;
-            let tempPath = null;
-
-            const processSubprocess = () => {
-                const pythonProcess = spawn(PYTHON_PATH, [
-                    SCRIPT_PATH,
-                    inputPath,
-                    '--model_dir', MODEL_DIR
-                ], {
-                    env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
-                });
-
-                let outputData = '';
-                let errorData = '';
-
-                pythonProcess.stdout.on('data', (data) => {
-                    outputData += data.toString();
-                });
-
-                pythonProcess.stderr.on('data', (data) => {
-                    errorData += data.toString();
-                });
-
-                pythonProcess.on('close', (code) => {
-                    // Cleanup temp file
-                    if (tempPath && require('fs').existsSync(tempPath)) {
-                        require('fs').unlinkSync(tempPath);
+            const isPdf = path.extname(filePath).toLowerCase() === '.pdf';
+
+            // .txt, .docx and .pdf are all read (streamed) by the worker itself
+            InferenceWorker.run('summarize', { path: filePath, max_chars: SUMMARY_MAX_CHARS })
+                .catch((error) => {
+                    // The bundled python_env may lack pypdf; extract the text here and summarize that instead
+                    if (!isPdf || !/pypdf/.test(error.message)) throw error;
+                    console.warn(`Worker could not read PDF (${error.message}), extracting text with pdf-parse...`);
+                    return SummarizationService.summarizePdfText(filePath);
+                })
+                .then((result) => {
+                    let summary = result.trim();
+                    if (summary.length > SUMMARY_MAX_CHARS) {
+                        summary = summary.substring(0, SUMMARY_MAX_CHARS - 3) + '...';
                     }
-
-                    if (code !== 0) {
-                        console.error(`Summarization failed with code ${code}. Error: ${errorData}`);
-                        reject(new Error(`Process exited with code ${code}: ${errorData}`));
-                    } else {
-                        let summary = outputData.trim();
-                        if (summary.length > 150) {
-                            summary = summary.substring(0, 147) + '...';
-                        }
-                        console.log(`Summary generated successfully.`);
-                        resolve(summary);
-                    }
-                });
-
-                pythonProcess.on('error', (err) => {
-                    // Cleanup temp file
-                    if (tempPath && require('fs').existsSync(tempPath)) {
-                        require('fs').unlinkSync(tempPath);
-                    }
-                    console.error('Failed to start subprocess.', err);
+                    console.log(`Summary generated successfully.`);
+                    resolve(summary);
+                })
+                .catch((err) => {
+                    console.error(`Summarization failed. Error: ${err.message}`);
                     reject(err);
                 });
-            };
-
-            const ext = path.extname(filePath).toLowerCase();
-            if (ext === '.pdf') {
-                console.log('Detected PDF, extracting text...');
-                const pdf = require('pdf-parse');
-                const fs = require('fs');
-
-                fs.readFile(filePath, (err, dataBuffer) => {
-                    if (err) return reject(err);
-
-                    pdf(dataBuffer).then(data => {
-                        const text = data.text;
-                        // Write to temp file
-                        tempPath = filePath + '.temp.txt';
-                        fs.writeFile(tempPath, text, (err) => {
-                            if (err) return reject(err);
-                            inputPath = tempPath;
-                            processSubprocess();
-                        });
-                    }).catch(err => {
-                        console.error('PDF parsing error:', err);
-                        reject(err);
-                    });
-                });
-            } else {
-                processSubprocess();
-            }
         });
     }
+
+    /**
+     * Extracts the PDF text with pdf-parse into a temp .txt file and summarizes that.
+     * @param {string} filePath - Absolute path to the .pdf file.
+     * @returns {Promise<string>} - The worker's summary.
+     */
+    static async summarizePdfText(filePath) {
+        const fs = require('fs');
+        const pdf = require('pdf-parse');
+        const data = await pdf(await fs.promises.readFile(filePath));
+        const tempPath = path.join(require('os').tmpdir(), `nas_pdf_${Date.now()}_${Math.random().toString(36).substring(7)}.txt`);
+        await fs.promises.writeFile(tempPath, data.text);
+        try {
+            return await InferenceWorker.run('summarize', { path: tempPath, max_chars: SUMMARY_MAX_CHARS });
+        } finally {
+            fs.promises.unlink(tempPath).catch(() => {});
+        }
+    }
 }
 
 module.exports = SummarizationService;
@@ -3,6 +3,7 @@ const SummarizationService = require('./SummarizationService');
 const FileModel = require('../models/fileModel');
 const path = require('path');
 
+// Also the number of jobs the inference worker runs at once (WORKER_JOBS in inferenceWorker.js)
 const CONCURRENCY_LIMIT = 3;
 
 class CaptionQueue {
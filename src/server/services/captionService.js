@@ -1,16 +1,14 @@
-const { execFile } = require('child_process');
 const path = require('path');
 const nlp = require('compromise');
+const InferenceWorker = require('./inferenceWorker');
 
 const { app } = require('electron');
 
 // Configure paths
 let PYTHON_PATH = 'python';
-let SCRIPT_PATH = path.join(__dirname, '../../../resources/blip/bridge.py');
 
 if (app.isPackaged) {
     PYTHON_PATH = path.join(process.resourcesPath, 'python_env/python.exe');
-    SCRIPT_PATH = path.join(process.resourcesPath, 'blip/bridge.py');
 }
 
 class CaptionService {
@@ -20,7 +18,7 @@ class CaptionService {
      * @returns {Promise<{caption: string, tags: string[]}>} - The generated caption and tags
      */
     static generateCaption(imagePath) {
-        return new Promise(async (resolve, reject) => {
+        return new Promise((resolve, reject) => {
             // Check settings
             let settings = { aiEnabled: false };
             try {
@@ -37,70 +35,58 @@ class CaptionService {
                 return resolve({ caption: null, tags: [] });
             }
 
-            // Set PYTHONIOENCODING to utf-8 to avoid encoding issues on Windows
-            const options = {
-                env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
-            };
-
-            let inferencePath = imagePath;
-            let tempPath = null;
             const fs = require('fs');
 
-            // HEIC Handling
-            if (path.extname(imagePath).toLowerCase() === '.heic') {
-                try {
-                    console.log('Detected HEIC file, converting for captioning...');
-                    const heicConvert = require('heic-convert');
-                    const inputBuffer = await fs.promises.readFile(imagePath);
-                    const outputBuffer = await heicConvert({
-                        buffer: inputBuffer,
-                        format: 'JPEG',
-                        quality: 0.8
-                    });
-
-                    // Create temp file
-                    const uniqueId = Math.random().toString(36).substring(7);
-                    tempPath = path.join(path.dirname(imagePath), `temp_caption_${uniqueId}.jpg`);
-                    await fs.promises.writeFile(tempPath, outputBuffer);
-                    inferencePath = tempPath;
-                } catch (err) {
-                    console.error('Failed to convert HEIC for captioning:', err);
-                    return resolve({ caption: null, tags: [] });
-                }
-            }
-
-            console.log(`Generating caption for: ${inferencePath}...`);
+            // HEIC files are decoded natively by the Python side (pillow-heif), so no temp JPEG is written
+            console.log(`Generating caption for: ${imagePath}...`);
+            const isHeic = /\.hei[cf]$/i.test(imagePath);
 
             if (!fs.existsSync(PYTHON_PATH) && PYTHON_PATH.includes('python_env')) {
                 console.warn('Python environment not found. Skipping caption generation.');
-                if (tempPath) fs.unlink(tempPath, () => { });
                 return resolve({ caption: null, tags: [] });
             }
 
-            execFile(PYTHON_PATH, [SCRIPT_PATH, inferencePath], options, (error, stdout, stderr) => {
-                // Cleanup temp file
-                if (tempPath) {
-                    fs.unlink(tempPath, (err) => {
-                        if (err) console.error('Failed to clean up temp file:', err);
-                    });
-                }
-
-                if (error) {
-                    console.error('Inference Error:', stderr);
+            InferenceWorker.run('caption', { path: imagePath })
+                .catch((error) => {
+                    // Python environments set up before pillow-heif was required cannot open HEIC:
+                    // convert it here, in memory, and send the JPEG bytes instead
+                    if (!isHeic) throw error;
+                    console.warn(`Worker could not caption HEIC (${error.message}), converting it first...`);
+                    return CaptionService.heicToJpegBase64(imagePath)
+                        .then((data) => InferenceWorker.run('caption', { data }));
+                })
+                .then((result) => {
+                    // The worker returns ONLY the caption text
+                    const caption = result.trim();
+                    const tags = CaptionService.generateTags(caption);
+
+                    console.log(`Caption: "${caption}"`);
+
+                    resolve({ caption, tags });
+                })
+                .catch((error) => {
+                    console.error('Inference Error:', error.message);
                     // Don't fail the upload if captioning fails, just resolve null
                     console.warn('Captioning failed, proceeding without caption.');
-                    return resolve({ caption: null, tags: [] });
-                }
-
-                // The script prints ONLY the caption to stdout (as per user instruction)
-                const caption = stdout.trim();
-                const tags = CaptionService.generateTags(caption);
-
-                console.log(`Caption: "${caption}"`);
+                    resolve({ caption: null, tags: [] });
+                });
+        });
+    }
 
-                resolve({ caption, tags });
-            });
+    /**
+     * Converts a HEIC image to JPEG without touching the disk.
+     * @param {string} imagePath
+     * @returns {Promise<string>} - The JPEG bytes, base64-encoded for a worker 'data' job
+     */
+    static async heicToJpegBase64(imagePath) {
+        const heicConvert = require('heic-convert');
+        const inputBuffer = await require('fs').promises.readFile(imagePath);
+        const outputBuffer = await heicConvert({
+            buffer: inputBuffer,
+            format: 'JPEG',
+            quality: 0.8
         });
+        return Buffer.from(outputBuffer).toString('base64');
     }
 
     /**
@@ -0,0 +1,169 @@
+const { spawn } = require('child_process');
+const path = require('path');
+const fs = require('fs');
+const readline = require('readline');
+
+const { app } = require('electron');
+
+// Configure paths
+let PYTHON_PATH = 'python';
+let SCRIPT_PATH = path.join(__dirname, '../../../resources/python/inference_worker.py');
+let MODEL_DIR = path.join(__dirname, '../../../resources/python/flan_t5_onnx');
+
+if (app.isPackaged) {
+    PYTHON_PATH = path.join(process.resourcesPath, 'python_env/python.exe');
+    SCRIPT_PATH = path.join(process.resourcesPath, 'python/inference_worker.py');
+    MODEL_DIR = path.join(process.resourcesPath, 'python/flan_t5_onnx');
+}
+
+// Jobs the worker runs at once; matches CONCURRENCY_LIMIT in captionQueue.js so a
+// long summarization does not hold up the captions queued behind it
+const WORKER_JOBS = 3;
+
+// Longest a job may take (the first one includes loading the models); a job that runs
+// past it is failed and the worker restarted, so a hung job cannot hold a slot forever
+const JOB_TIMEOUT_MS = {
+    caption: 5 * 60 * 1000,
+    summarize: 20 * 60 * 1000
+};
+const DEFAULT_JOB_TIMEOUT_MS = 5 * 60 * 1000;
+
+/**
+ * Keeps a single Python worker alive so the BLIP and Flan-T5 models are loaded once
+ * instead of once per file. Jobs are sent as newline-delimited JSON and matched
+ * to responses by job ID; up to WORKER_JOBS run concurrently, so responses may
+ * arrive out of order.
+ */
+class InferenceWorker {
+    constructor() {
+        this.process = null;
+        this.pending = new Map();
+        this.nextId = 1;
+    }
+
+    start() {
+        if (this.process) return this.process;
+
+        if (!fs.existsSync(PYTHON_PATH) && PYTHON_PATH.includes('python_env')) {
+            throw new Error('Python environment not found. Please setup AI features first.');
+        }
+
+        // Model variant (fp32/int8) from settings; the worker falls back to fp32 if the variant is not enabled
+        let settings = {};
+        try {
+            const settingsPath = path.join(__dirname, '../config/settings.json');
+            if (fs.existsSync(settingsPath)) {
+                settings = JSON.parse(fs.readFileSync(settingsPath, 'utf8'));
+            }
+        } catch (e) {
+            console.error("Failed to read settings in InferenceWorker", e);
+        }
+        const precision = settings.aiPrecision || 'fp32';
+        const args = [SCRIPT_PATH, '--model_dir', MODEL_DIR, '--precision', precision, '--jobs', String(WORKER_JOBS)];
+        // Near-duplicate caption reuse is lossy, so it only runs when the user turned it on
+        if (settings.aiCaptionDedup) args.push('--dedup');
+        // Memory-mapped weights: several workers on the same models share one copy in RAM
+        if (settings.aiSharedWeights) args.push('--shared_weights');
+
+        console.log(`[InferenceWorker] Starting persistent inference worker (${precision})...`);
+        const child = spawn(PYTHON_PATH, args, {
+            env: { ...process.env, PYTHONIOENCODING: 'utf-8' }
+        });
+
+        const rl = readline.createInterface({ input: child.stdout });
+        rl.on('line', (line) => this._onResponse(line));
+
+        child.stderr.on('data', (data) => {
+            console.log(`[InferenceWorker] ${data.toString().trim()}`);
+        });
+
+        const onExit = (reason) => {
+            if (this.process !== child) return;
+            this.process = null;
+            console.warn(`[InferenceWorker] Worker stopped: ${reason}`);
+            // Fail anything still in flight; the next job restarts the worker
+            for (const { reject } of this.pending.values()) {
+                reject(new Error(`Inference worker stopped: ${reason}`));
+            }
+            this.pending.clear();
+        };
+
+        child.on('close', (code) => onExit(`exit code ${code}`));
+        child.on('error', (err) => onExit(err.message));
+
+        this.process = child;
+        return child;
+    }
+
+    _onResponse(line) {
+        let response;
+        try {
+            response = JSON.parse(line);
+        } catch (e) {
+            console.error('[InferenceWorker] Ignoring malformed response:', line);
+            return;
+        }
+
+        const job = this.pending.get(response.id);
+        if (!job) return;
+        this.pending.delete(response.id);
+
+        if (response.ok) job.resolve(response.result);
+        else job.reject(new Error(response.error));
+    }
+
+    /**
+     * Queues a job on the worker.
+     * @param {string} task - 'caption' or 'summarize'
+     * @param {object} payload - Job fields, e.g. { path }
+     * @returns {Promise<string>} - The job result
+     */
+    run(task, payload) {
+        return new Promise((resolve, reject) => {
+            let child;
+            try {
+                child = this.start();
+            } catch (err) {
+                return reject(err);
+            }
+
+            const id = String(this.nextId++);
+            const timeoutMs = JOB_TIMEOUT_MS[task] || DEFAULT_JOB_TIMEOUT_MS;
+            const timer = setTimeout(() => {
+                if (!this.pending.has(id)) return;
+                this.pending.delete(id);
+                reject(new Error(`Inference job ${id} (${task}) timed out after ${timeoutMs / 1000}s`));
+                this._restart(`job ${id} (${task}) timed out`);
+            }, timeoutMs);
+            this.pending.set(id, {
+                resolve: (result) => { clearTimeout(timer); resolve(result); },
+                reject: (err) => { clearTimeout(timer); reject(err); }
+            });
+            child.stdin.write(JSON.stringify({ id, task, ...payload }) + '\n');
+        });
+    }
+
+    /**
+     * Kills a stuck worker and fails the jobs it still had; the next job starts a fresh one.
+     * @param {string} reason - Why the worker is being restarted
+     */
+    _restart(reason) {
+        const child = this.process;
+        if (!child) return;
+        console.warn(`[InferenceWorker] Restarting worker: ${reason}`);
+        this.process = null;
+        for (const { reject } of this.pending.values()) {
+            reject(new Error(`Inference worker restarted: ${reason}`));
+        }
+        this.pending.clear();
+        child.kill();
+    }
+
+    stop() {
+        if (this.process) {
+            this.process.stdin.end();
+        }
+    }
+}
+
+module.exports = new InferenceWorker();
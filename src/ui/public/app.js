@@ -252,7 +252,7 @@ async function fetchSystemData() {
                         </div>
                         <div class="disk-info">
                             <div class="disk-name">${disk.name || disk.device}</div>
-                             <div class="disk-sub">${disk.mediaType} • ${formatBytes(disk.size)}</div>
+                             <div class="disk-sub">${disk.mediaType} • ${formatBytes(disk.size)}${disk.ioLoad ? ` • ${disk.ioLoad.busy_percent ?? 0}% busy • ${Math.round((disk.ioLoad.read_iops || 0) + (disk.ioLoad.write_iops || 0))} IOPS` : ''}</div>
                         </div>
                         <div class="disk-status">
                             <span class="status-badge ${isHealthy ? 'good' : 'bad'}">${disk.healthStatus || 'Healthy'}</span>